@@ -0,0 +1,58 @@
+# Usage (from the repository root): python aggregate_history.py weekly|monthly|balance OUTPUT.csv [--memory-mb 256]
+#
+# Aggregates the whole stored history out of core: the history is read in chunks that fit the
+# memory budget, and the partial sums, counts and first/last days of every chunk are combined,
+# so histories larger than the available memory give the same rows as the in-memory path.
+#   weekly   per employee and ISO week (as build_weekly_history)
+#   monthly  the employee-month cube (as build_history_cube)
+#   balance  per employee and month, the cumulative hour balance (as build_balance_ledger)
+
+import argparse
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: the peak memory is not reported
+    resource = None
+
+from attendance import (
+    HISTORY_MEMORY_BUDGET_MB,
+    aggregate_history_cube,
+    aggregate_weekly_history,
+    build_balance_ledger,
+    write_csv_atomically,
+)
+
+logger = logging.getLogger(__name__)
+
+# Function to aggregate the history into one of the views above
+def aggregate_history(view, memory_budget_mb=HISTORY_MEMORY_BUDGET_MB):
+    if view == 'weekly':
+        return aggregate_weekly_history(memory_budget_mb)
+    cube = aggregate_history_cube(memory_budget_mb)
+    return cube if view == 'monthly' else build_balance_ledger(cube)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aggregate the attendance history in chunks that fit a memory budget")
+    parser.add_argument('view', choices=['weekly', 'monthly', 'balance'])
+    parser.add_argument('output', help="destination CSV file")
+    parser.add_argument('--memory-mb', type=int, default=HISTORY_MEMORY_BUDGET_MB, help=f"memory budget of one chunk (default: {HISTORY_MEMORY_BUDGET_MB})")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    start = time.perf_counter()
+    result = aggregate_history(args.view, args.memory_mb)
+    write_csv_atomically(result, args.output)
+
+    elapsed = time.perf_counter() - start
+    if resource is None:
+        logger.info("%d rânduri %s scrise în %s în %.2f s", len(result), args.view, args.output, elapsed)
+    else:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+        logger.info("%d rânduri %s scrise în %s în %.2f s (memorie maximă %.0f MB)",
+                    len(result), args.view, args.output, elapsed, peak_rss)
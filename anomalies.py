@@ -0,0 +1,188 @@
+import logging
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from attendance import STANDARD_START_MINUTES, get_scheduled_hours
+
+logger = logging.getLogger(__name__)
+
+# History columns the detection reads
+ANOMALY_INPUT_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Data_Obiect', 'Ora Sosire', 'Ora Plecare', 'Durata (Ore)']
+ANOMALY_COLUMNS = ['Angajat', 'Departament', 'Data_Obiect', 'Anomalie', 'Valoare', 'Detalii']
+
+# Chronic lateness: at least LATE_MIN_COUNT late arrivals within the last LATE_WINDOW_DAYS days with an arrival
+LATE_WINDOW_DAYS = 20
+LATE_MIN_COUNT = 5
+
+# Worked days outside [SHORT_DAY_HOURS, LONG_DAY_HOURS] are implausible
+SHORT_DAY_HOURS = 2
+LONG_DAY_HOURS = 16
+
+# A worked day deviates from the employee's baseline when it is more than BASELINE_Z standard
+# deviations from the mean of the previous BASELINE_WINDOW_DAYS worked days (once at least
+# BASELINE_MIN_DAYS are known). The deviation never goes below BASELINE_MIN_STD hours, so a
+# very regular employee is not flagged for a few minutes of change.
+BASELINE_WINDOW_DAYS = 20
+BASELINE_MIN_DAYS = 10
+BASELINE_Z = 3.0
+BASELINE_MIN_STD = 0.5
+
+# Results of the last run with the fingerprint of every employee's rows, shared by all callers
+_anomaly_cache = {'fingerprints': {}, 'anomalies': pd.DataFrame(columns=ANOMALY_COLUMNS)}
+_anomaly_lock = threading.Lock()
+
+# Function to convert "HH:MM" cells to minutes since midnight (NaN when empty). The distinct
+# values are parsed once (there are at most a few thousand) and mapped back through their codes.
+def clock_column_minutes(values):
+    codes, uniques = pd.factorize(values.astype(str))
+    minutes = np.full(len(uniques) + 1, np.nan)
+    for index, value in enumerate(uniques):
+        match = re.match(r'^\s*(\d{1,2}):(\d{2})', value)
+        if match:
+            minutes[index] = int(match.group(1)) * 60 + int(match.group(2))
+    return minutes[codes]
+
+# Function to return, for rows sorted by group, the position of the first row of each row's group
+def get_group_starts(group_codes):
+    positions = np.arange(len(group_codes))
+    new_group = np.ones(len(group_codes), dtype=bool)
+    new_group[1:] = group_codes[1:] != group_codes[:-1]
+    return np.maximum.accumulate(np.where(new_group, positions, 0))
+
+# Function to sum values over the last `window` rows of each group, through a single cumulative sum.
+# With include_current=False the window ends at the previous row. Returns the sums and row counts.
+def rolling_group_sum(values, group_starts, window, include_current=True):
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype='float64')])
+    end = np.arange(1, len(values) + 1) if include_current else np.arange(len(values))
+    begin = np.maximum(end - window, group_starts)
+    return cumulative[end] - cumulative[begin], end - begin
+
+# Function to select the history columns used by the detection, sorted by employee and day,
+# with the scheduled shift start of every day (minutes, 08:30 on days without a shift)
+def prepare_anomaly_input(daily_df):
+    frame = daily_df[ANOMALY_INPUT_COLUMNS].sort_values(['Angajat', 'Data_Obiect'], kind='mergesort', ignore_index=True)
+    _, shift_start = get_scheduled_hours(frame['Data_Obiect'], frame['Departament'], frame['ID Legitimație'])
+    frame['Început Program'] = np.where(np.isnan(shift_start), STANDARD_START_MINUTES, shift_start)
+    return frame
+
+# Function to fingerprint the rows of each employee (changes whenever any of their days, or the
+# schedule applied to them, changes)
+def get_employee_fingerprints(frame):
+    row_hashes = pd.util.hash_pandas_object(frame, index=False)
+    return row_hashes.groupby(frame['Angajat'], observed=True, sort=False).sum().to_dict()
+
+# Function to build anomaly rows for the flagged days of a frame; `describe` is called with the
+# positions of the flagged rows only, so the detail texts are built just for them
+def make_anomaly_rows(frame, flagged, label, values, describe):
+    rows = np.flatnonzero(flagged)
+    return pd.DataFrame({
+        'Angajat': frame['Angajat'].iloc[rows].astype(str).to_numpy(),
+        'Departament': frame['Departament'].iloc[rows].astype(str).to_numpy(),
+        'Data_Obiect': frame['Data_Obiect'].to_numpy()[rows],
+        'Anomalie': label,
+        'Valoare': np.round(values[rows], 2),
+        'Detalii': describe(rows),
+    })
+
+# Function to detect anomalies in a prepared frame (see prepare_anomaly_input)
+def find_anomalies(frame):
+    if frame.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    frame = frame.reset_index(drop=True)
+    group_codes = pd.factorize(frame['Angajat'])[0]
+    hours = frame['Durata (Ore)'].to_numpy(dtype='float64')
+    arrival = clock_column_minutes(frame['Ora Sosire'])
+    departure = clock_column_minutes(frame['Ora Plecare'])
+    arrival_labels = frame['Ora Sosire'].to_numpy()
+    present = ~np.isnan(arrival)
+    worked = hours > 0
+
+    found = []
+
+    # Chronic lateness, counted over the days with an arrival. It is reported once per episode,
+    # on the day the count reaches LATE_MIN_COUNT, instead of on every late day that follows.
+    late = present & (arrival > frame['Început Program'].to_numpy())
+    present_rows = np.flatnonzero(present)
+    present_starts = get_group_starts(group_codes[present_rows])
+    present_late_counts, _ = rolling_group_sum(late[present_rows].astype('float64'), present_starts, LATE_WINDOW_DAYS)
+    previous_late_counts = np.concatenate([[0.0], present_late_counts[:-1]])
+    previous_late_counts[present_starts == np.arange(len(present_rows))] = 0
+    late_counts = np.zeros(len(frame))
+    late_counts[present_rows] = present_late_counts
+    chronic = np.zeros(len(frame), dtype=bool)
+    chronic[present_rows] = (present_late_counts >= LATE_MIN_COUNT) & (previous_late_counts < LATE_MIN_COUNT)
+    found.append(make_anomaly_rows(
+        frame, chronic, "Întârzieri repetate", late_counts,
+        lambda rows: [f"{int(late_counts[row])} întârzieri în ultimele {LATE_WINDOW_DAYS} zile cu prezență" for row in rows],
+    ))
+
+    # An entry without a separate exit: no exit time, or first and last card reading at the same minute
+    missing_exit = present & (np.isnan(departure) | (departure == arrival))
+    found.append(make_anomaly_rows(
+        frame, missing_exit, "Lipsă ieșire", hours,
+        lambda rows: [f"Sosire {arrival_labels[row]} fără ieșire" for row in rows],
+    ))
+
+    # Function to describe the worked hours of the flagged days
+    def describe_hours(rows):
+        return [f"{hours[row]:.2f} ore" for row in rows]
+
+    too_short = worked & ~missing_exit & (hours < SHORT_DAY_HOURS)
+    found.append(make_anomaly_rows(frame, too_short, "Durată prea scurtă", hours, describe_hours))
+    too_long = worked & (hours > LONG_DAY_HOURS)
+    found.append(make_anomaly_rows(frame, too_long, "Durată prea lungă", hours, describe_hours))
+
+    # Sudden change against the previous plausible worked days of the same employee
+    worked_rows = np.flatnonzero(worked & ~missing_exit & ~too_short & ~too_long)
+    worked_hours = hours[worked_rows]
+    worked_starts = get_group_starts(group_codes[worked_rows])
+    window_sum, window_days = rolling_group_sum(worked_hours, worked_starts, BASELINE_WINDOW_DAYS, include_current=False)
+    window_squares, _ = rolling_group_sum(worked_hours ** 2, worked_starts, BASELINE_WINDOW_DAYS, include_current=False)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = window_sum / window_days
+        variance = (window_squares - window_sum * mean) / (window_days - 1)
+        deviation = np.maximum(np.sqrt(np.clip(variance, 0, None)), BASELINE_MIN_STD)
+    outlier = (window_days >= BASELINE_MIN_DAYS) & (np.abs(worked_hours - mean) > BASELINE_Z * deviation)
+
+    baseline_shift = np.zeros(len(frame), dtype=bool)
+    baseline_shift[worked_rows] = outlier
+    baseline_mean = np.full(len(frame), np.nan)
+    baseline_mean[worked_rows] = mean
+    found.append(make_anomaly_rows(
+        frame, baseline_shift, "Abatere de la medie", hours,
+        lambda rows: [f"{hours[row]:.2f} ore față de media de {baseline_mean[row]:.2f} ore a ultimelor "
+                      f"{BASELINE_WINDOW_DAYS} zile lucrate" for row in rows],
+    ))
+
+    return pd.concat(found, ignore_index=True)[ANOMALY_COLUMNS]
+
+# Function to return the anomaly report of the whole history. Only employees whose rows changed
+# since the previous call are analysed again; the report of the others is reused.
+def get_anomalies(daily_df):
+    if daily_df.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    frame = prepare_anomaly_input(daily_df)
+    fingerprints = get_employee_fingerprints(frame)
+
+    with _anomaly_lock:
+        cached_fingerprints = _anomaly_cache['fingerprints']
+        unchanged = [employee for employee, fingerprint in fingerprints.items() if cached_fingerprints.get(employee) == fingerprint]
+
+        cached_anomalies = _anomaly_cache['anomalies']
+        kept = cached_anomalies[cached_anomalies['Angajat'].isin(unchanged)]
+        fresh = find_anomalies(frame[~frame['Angajat'].isin(unchanged)])
+        logger.info("Anomalii recalculate pentru %d din %d angajați", len(fingerprints) - len(unchanged), len(fingerprints))
+
+        if kept.empty or fresh.empty:
+            anomalies = fresh if kept.empty else kept
+        else:
+            anomalies = pd.concat([kept, fresh], ignore_index=True)
+        anomalies = anomalies.sort_values(['Angajat', 'Data_Obiect'], kind='mergesort', ignore_index=True)
+        _anomaly_cache['fingerprints'] = fingerprints
+        _anomaly_cache['anomalies'] = anomalies
+    return anomalies
@@ -0,0 +1,444 @@
+# Usage (from the repository root): python api.py [--host 127.0.0.1] [--port 8502]
+#
+# HTTP service on top of the processing core, for systems that need the attendance data
+# without the Streamlit page:
+#   POST /upload?kind=report|events[&sheet=NAME]   body: the export file (CSV, or Excel with sheet=)
+#                                                  processed and upserted into the history
+#   GET  /daily | /weekly | /monthly | /anomalies  filters: employee=, department= (repeatable),
+#                                                  start=YYYY-MM-DD, end=YYYY-MM-DD, format=json|arrow
+#   GET  /balance?as_of=YYYY-MM-DD[&since=]        cumulative hour balance per employee at the end of as_of
+#                                                  (employee=, department=, format= as above)
+#   GET  /export?format=parquet|arrow|csv          ZIP bundle (daily, weekly, monthly + manifest.json), streamed
+#                                                  in chunks; same employee/department/start/end filters
+#   GET  /version                                  current history version
+# Query responses are cached per history version, so repeated queries are served from memory
+# until the next upload; the anomaly report is detected once per version and only filtered per
+# query. Requests run in their own threads over keep-alive connections.
+#
+# The API has no user accounts. It listens on 127.0.0.1 by default and refuses any other --host
+# unless a token is set (--token or the ATTENDANCE_API_TOKEN variable); with a token every request
+# must send the header "Authorization: Bearer <token>".
+
+import argparse
+import hashlib
+import hmac
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+from collections import OrderedDict
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from anomalies import get_anomalies
+from attendance import (
+    BalanceLedger,
+    build_weekly_history,
+    get_history_version,
+    hold_history_write_lock,
+    load_balance_ledger,
+    load_historical_data,
+    load_history_cube,
+)
+from diagnostics import StageRecorder
+from export_bundle import BUNDLE_FORMATS, BUNDLE_MIME_TYPE, write_export_bundle
+from history_queue import get_history_writer
+from jobs import AttendanceJob, process_upload
+from raw_events import get_badge_directory
+
+logger = logging.getLogger(__name__)
+
+# Upload kinds accepted by POST /upload and the upload mode of the app they correspond to
+UPLOAD_KINDS = {'report': "Raport Prezență", 'events': "Evenimente Brute"}
+
+# Same limit as Streamlit's default server.maxUploadSize
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+# Serialized query responses kept in memory, up to RESPONSE_CACHE_MAX_BYTES of bodies in total
+# (least recently used are dropped first); bodies larger than RESPONSE_CACHE_ENTRY_MAX_BYTES
+# (unfiltered views of a large history) are sent without being kept
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+RESPONSE_CACHE_ENTRY_MAX_BYTES = 64 * 1024 * 1024
+
+# Environment variable holding the token that requests must present
+API_TOKEN_ENV = 'ATTENDANCE_API_TOKEN'
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+# History frames of the current version, shared by all request threads (read-only)
+_history_lock = threading.Lock()
+_history = {'version': None, 'daily': None, 'weekly': None, 'cube': None, 'ledger': None}
+
+# Anomaly report of the current version; detected on the first /anomalies query of a version
+_anomalies_lock = threading.Lock()
+_anomalies = {'version': None, 'report': None}
+
+_response_cache = OrderedDict()
+_response_cache_size = {'bytes': 0}
+_response_cache_lock = threading.Lock()
+
+# Function to return the current history version with its daily, weekly and monthly frames and its
+# balance ledger, loading them once per version. The files are loaded and the version is read with the
+# history write lock held, so the frames always belong to the version returned with them. A new
+# version also empties the response cache.
+def get_history_frames():
+    with _history_lock:
+        if _history['version'] != get_history_version():
+            with hold_history_write_lock():
+                version = get_history_version()
+                daily_df = load_historical_data()
+                cube_df = load_history_cube()
+                ledger_df = load_balance_ledger()
+            _history.update(
+                version=version,
+                daily=daily_df,
+                weekly=build_weekly_history(daily_df),
+                cube=cube_df,
+                ledger=BalanceLedger(ledger_df),
+            )
+            with _response_cache_lock:
+                _response_cache.clear()
+                _response_cache_size['bytes'] = 0
+        return _history['version'], _history['daily'], _history['weekly'], _history['cube'], _history['ledger']
+
+# Function to return the anomaly report of a version, detected once from its daily frame and shared
+# by every filter combination; queries of other views are not blocked while it runs
+def get_history_anomalies(version, daily_df):
+    with _anomalies_lock:
+        if _anomalies['version'] != version:
+            _anomalies.update(version=version, report=get_anomalies(daily_df))
+        return _anomalies['report']
+
+# Function to parse an optional YYYY-MM-DD query parameter
+def parse_date_parameter(query, name):
+    values = query.get(name)
+    if not values:
+        return None
+    try:
+        return pd.Timestamp(date.fromisoformat(values[0]))
+    except ValueError:
+        raise ValueError(f"Parametrul {name} trebuie să fie o dată AAAA-LL-ZZ, nu '{values[0]}'")
+
+# Function to filter a view by employee, department and date range
+def filter_view(view, df, query):
+    mask = pd.Series(True, index=df.index)
+    if query.get('employee'):
+        mask &= df['Angajat'].astype(str).isin(query['employee'])
+    if query.get('department'):
+        mask &= df['Departament'].astype(str).isin(query['department'])
+
+    if view == 'balance':
+        return df[mask].reset_index(drop=True)
+
+    start = parse_date_parameter(query, 'start')
+    end = parse_date_parameter(query, 'end')
+    if view in ('daily', 'anomalies'):
+        if start is not None:
+            mask &= df['Data_Obiect'] >= start
+        if end is not None:
+            mask &= df['Data_Obiect'] <= end
+    elif view == 'weekly':
+        # Weeks that overlap the range
+        if start is not None:
+            mask &= df['Sfârșit'] >= start
+        if end is not None:
+            mask &= df['Început'] <= end
+    else:
+        # Months that overlap the range
+        month_number = df['An'].astype(int) * 12 + df['Luna'].astype(int)
+        if start is not None:
+            mask &= month_number >= start.year * 12 + start.month
+        if end is not None:
+            mask &= month_number <= end.year * 12 + end.month
+
+    return df[mask].reset_index(drop=True)
+
+# Function to serialize a frame as a JSON list of records (dates as YYYY-MM-DD)
+def to_json_bytes(df):
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%d')
+    return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+# Function to serialize a frame as an Arrow IPC stream
+def to_arrow_bytes(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# Function to return a cached response body, building and caching it on a miss
+def get_cached_response(key, build):
+    with _response_cache_lock:
+        if key in _response_cache:
+            _response_cache.move_to_end(key)
+            return _response_cache[key]
+
+    body = build()
+    if len(body) > RESPONSE_CACHE_ENTRY_MAX_BYTES:
+        return body
+
+    with _response_cache_lock:
+        if key not in _response_cache:
+            _response_cache[key] = body
+            _response_cache_size['bytes'] += len(body)
+        while _response_cache_size['bytes'] > RESPONSE_CACHE_MAX_BYTES:
+            _, dropped = _response_cache.popitem(last=False)
+            _response_cache_size['bytes'] -= len(dropped)
+    return body
+
+# Function to process an uploaded export and upsert its days into the history (per employee and day)
+def ingest_upload(body, kind, sheet_name):
+    if kind not in UPLOAD_KINDS:
+        raise ValueError(f"Tip de fișier necunoscut '{kind}' (acceptate: {', '.join(UPLOAD_KINDS)})")
+
+    directory = None
+    if kind == 'events':
+        directory = get_badge_directory(get_history_frames()[1])
+
+    recorder = StageRecorder(enabled=False)
+    job = AttendanceJob(
+        ('api-upload', len(body), kind),
+        lambda progress, issues, ingest: process_upload(io.BytesIO(body), UPLOAD_KINDS[kind], sheet_name, recorder, directory, progress, issues, ingest),
+        recorder,
+    )
+    job.run()
+    return job
+
+# Function to tell whether a host name or address accepts local connections only
+def is_loopback_host(host):
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host or None, None)}
+    except socket.gaierror:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_loopback for address in addresses)
+
+# Non-seekable writer that sends what it receives as HTTP/1.1 chunks, buffered up to buffer_size bytes
+# per chunk, so a bundle of unknown length can be streamed while it is built
+class ChunkedWriter:
+    def __init__(self, wfile, buffer_size=1024 * 1024):
+        self.wfile = wfile
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+
+    # Function to queue bytes, sending a chunk once the buffer is full
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+        return len(data)
+
+    # Function to send the buffered bytes as one chunk
+    def flush(self):
+        if self.buffer:
+            self.wfile.write(f"{len(self.buffer):X}\r\n".encode('ascii') + bytes(self.buffer) + b"\r\n")
+            self.buffer.clear()
+
+    # Function to send the last chunk and the end-of-body marker
+    def close(self):
+        self.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+class AttendanceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests (every response has a Content-Length or is chunked)
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AttendanceAPI/1.0'
+
+    # Function to check the bearer token of the request when the server has one; sends 401 otherwise
+    def is_authorized(self):
+        token = getattr(self.server, 'token', None)
+        if not token:
+            return True
+        scheme, _, presented = self.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(presented.strip().encode('utf-8'), token.encode('utf-8')):
+            return True
+        # The body of a POST is not read, so the connection cannot be reused
+        self.close_connection = True
+        self.send_body(401, json.dumps({'error': "Token de acces lipsă sau invalid"}, ensure_ascii=False).encode('utf-8'),
+                       JSON_CONTENT_TYPE, {'WWW-Authenticate': 'Bearer'})
+        return False
+
+    # Function to send a response body with its length
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Function to send a JSON response
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8'), JSON_CONTENT_TYPE)
+
+    # Function to answer a daily/weekly/monthly query from the response cache
+    def send_query(self, view, query):
+        response_format = query.get('format', ['arrow' if ARROW_CONTENT_TYPE in self.headers.get('Accept', '') else 'json'])[0]
+        if response_format not in ('json', 'arrow'):
+            raise ValueError(f"Format necunoscut '{response_format}' (acceptate: json, arrow)")
+
+        # Frames and version from one snapshot, so a body is never cached under another version
+        version, daily_df, weekly_df, cube_df, ledger = get_history_frames()
+        filters = tuple(sorted((name, tuple(sorted(values))) for name, values in query.items() if name != 'format'))
+        key = (version, view, filters, response_format)
+        etag = '"' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:20] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        # Function to filter and serialize the view on a cache miss
+        def build():
+            if view == 'anomalies':
+                view_df = filter_view(view, get_history_anomalies(version, daily_df), query)
+            elif view == 'balance':
+                as_of = parse_date_parameter(query, 'as_of')
+                if as_of is None:
+                    raise ValueError("Parametrul as_of este obligatoriu")
+                view_df = filter_view(view, ledger.balance_as_of(as_of, daily_df, parse_date_parameter(query, 'since')), query)
+            else:
+                view_df = filter_view(view, {'daily': daily_df, 'weekly': weekly_df, 'monthly': cube_df}[view], query)
+            return to_arrow_bytes(view_df) if response_format == 'arrow' else to_json_bytes(view_df)
+
+        body = get_cached_response(key, build)
+        content_type = ARROW_CONTENT_TYPE if response_format == 'arrow' else JSON_CONTENT_TYPE
+        self.send_body(200, body, content_type, {'ETag': etag, 'X-History-Version': version})
+
+    # Function to stream the filtered daily, weekly and monthly history as a ZIP bundle
+    def send_export(self, query):
+        bundle_format = query.get('format', ['parquet'])[0]
+        if bundle_format not in BUNDLE_FORMATS:
+            raise ValueError(f"Format necunoscut '{bundle_format}' (acceptate: {', '.join(BUNDLE_FORMATS)})")
+
+        version, daily_df, weekly_df, cube_df, _ = get_history_frames()
+        frames = {
+            'daily': filter_view('daily', daily_df, query),
+            'weekly': filter_view('weekly', weekly_df, query),
+            'monthly': filter_view('monthly', cube_df, query),
+        }
+
+        self.send_response(200)
+        self.send_header('Content-Type', BUNDLE_MIME_TYPE)
+        self.send_header('Content-Disposition', f'attachment; filename="prezenta_{bundle_format}.zip"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-History-Version', version)
+        self.end_headers()
+
+        writer = ChunkedWriter(self.wfile)
+        try:
+            write_export_bundle(writer, frames, bundle_format, {'source': 'api', 'history_version': version})
+        except Exception:
+            # The status line is already sent; dropping the connection marks the body as incomplete
+            logger.exception("Exportul %s a eșuat", self.path)
+            self.close_connection = True
+            return
+        writer.close()
+
+    def do_GET(self):
+        if not self.is_authorized():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == '/version':
+                self.send_json(200, {'history_version': get_history_version()})
+            elif url.path in ('/daily', '/weekly', '/monthly', '/anomalies', '/balance'):
+                self.send_query(url.path.strip('/'), query)
+            elif url.path == '/export':
+                self.send_export(query)
+            else:
+                self.send_json(404, {'error': f"Resursă necunoscută: {url.path}"})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            logger.exception("Cererea %s a eșuat", self.path)
+            self.send_json(500, {'error': str(e)})
+
+    def do_POST(self):
+        if not self.is_authorized():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path != '/upload':
+            self.close_connection = True
+            self.send_json(404, {'error': f"Resursă necunoscută: {url.path}"})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_UPLOAD_BYTES:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(413 if length > MAX_UPLOAD_BYTES else 411, {'error': "Fișierul lipsește sau depășește limita de încărcare"})
+            return
+        body = self.rfile.read(length)
+
+        try:
+            sheet_name = query.get('sheet', [None])[0]
+            if sheet_name is not None and sheet_name.isdigit():
+                sheet_name = int(sheet_name)
+            job = ingest_upload(body, query.get('kind', ['report'])[0], sheet_name)
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        if job.error is not None:
+            self.send_json(422, {'error': f"Eroare la procesarea fișierului: {job.error}", 'issues': job.issues})
+            return
+        if job.history_error is not None:
+            self.send_json(500, {'error': f"Nu s-a putut salva istoricul: {job.history_error}", 'issues': job.issues})
+            return
+
+        daily_df, weekly_df, monthly_df, date_range, _ = job.result
+        self.send_json(200, {
+            'date_range': date_range,
+            'daily_rows': len(daily_df),
+            'weekly_rows': len(weekly_df),
+            'monthly_rows': len(monthly_df),
+            'history_rows': job.history_rows,
+            'already_imported': job.ingest.file_entry is not None,
+            'blocks': job.ingest.counts(),
+            'closed_periods': job.closed_periods,
+            'history_version': get_history_version(),
+            'seconds': round(job.seconds, 3),
+            'issues': job.issues,
+        })
+
+    # Function to send the access log to the module logger instead of stderr
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP API for attendance uploads and aggregate queries")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on; other than loopback only with a token")
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--token', default=os.environ.get(API_TOKEN_ENV), help=f"bearer token required from every request (default: ${API_TOKEN_ENV})")
+    args = parser.parse_args()
+    if not args.token and not is_loopback_host(args.host):
+        parser.error(f"API-ul nu are autentificare: --host {args.host} este permis doar cu un token (--token sau {API_TOKEN_ENV})")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    # Uploads left in the history queue by a previous run are merged right away
+    get_history_writer()
+    server = ThreadingHTTPServer((args.host, args.port), AttendanceRequestHandler)
+    server.daemon_threads = True
+    server.token = args.token
+    logger.info("API pornit pe http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,499 +1,162 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import io
 import base64
-from datetime import datetime, timedelta, date
-import plotly.express as px
-import plotly.graph_objects as go
-import re
+import io
+from datetime import datetime, date
 import calendar
-import os
+import cProfile
+import logging
+
+from attendance import (
+    BalanceLedger,
+    calculate_standard_monthly_hours,
+    calculate_working_days,
+    get_history_version,
+    get_holiday_descriptions,
+    get_holidays_for_year,
+    load_historical_data,
+    load_balance_ledger,
+    load_history_cube,
+    to_csv_bytes,
+    to_excel_bytes,
+)
+from anomalies import ANOMALY_INPUT_COLUMNS, get_anomalies
+from diagnostics import StageRecorder, profile_summary, profile_to_bytes
+from export_bundle import BUNDLE_FORMATS, BUNDLE_MIME_TYPE, write_export_bundle
+from history_queue import get_history_writer
+from ingest_ledger import BLOCK_CHANGED, BLOCK_NEW, BLOCK_UNCHANGED
+from jobs import BACKGROUND_MIN_BYTES, AttendanceJob, RecomputeJob, process_upload
+from leave import LEAVE_PATH, find_unmatched_employees, load_leave_records, read_leave_records, save_leave_records
+from periods import close_period, list_closed_periods, load_period_snapshot, parse_period_label
+from raw_events import get_badge_directory
+from schedules import SCHEDULES_PATH, get_compiled_schedules, group_weekly_shifts
 
 # Configure page
 st.set_page_config(page_title="Analizor Prezență Angajați", layout="wide")
 
-# Initialize session state variables
-if 'historical_data' not in st.session_state:
-    st.session_state.historical_data = pd.DataFrame()
+# Structured per-stage diagnostics lines are written to the server log
+logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logging.getLogger('diagnostics').setLevel(logging.INFO)
 
-# Ensure data directory exists
-if not os.path.exists('data'):
-    os.makedirs('data', exist_ok=True)
-
-# Romanian holidays by year
-ROMANIAN_HOLIDAYS = {
-    2024: [
-        "2024-01-01", "2024-01-02", "2024-01-24", 
-        "2024-05-01", "2024-05-03", "2024-05-05", "2024-05-06",
-        "2024-06-23", "2024-06-24", "2024-08-15",
-        "2024-11-30", "2024-12-01", "2024-12-25", "2024-12-26"
-    ],
-    2025: [
-        "2025-01-01", "2025-01-02", "2025-01-24",
-        "2025-04-18", "2025-04-20", "2025-04-21",
-        "2025-05-01", "2025-06-08", "2025-06-09",
-        "2025-08-15", "2025-11-30", "2025-12-01",
-        "2025-12-25", "2025-12-26"
-    ]
+# Messages shown when a visualization has no data to plot
+VIZ_EMPTY_MESSAGES = {
+    "Comparație Săptămânală": "Nu există date săptămânale pentru vizualizare.",
+    "Distribuția Orelor de Sosire": "Nu există date de sosire pentru vizualizare.",
+    "Distribuția Orelor de Plecare": "Nu există date de plecare pentru vizualizare.",
+    "Prezența Zilnică": "⚠️ Nu există suficiente date valide pentru generarea graficului zilnic.",
 }
 
-# Function to get holidays for a specific year
-def get_holidays_for_year(year):
-    if year in ROMANIAN_HOLIDAYS:
-        return ROMANIAN_HOLIDAYS[year]
-    
-    # If we don't have data for the requested year, extrapolate from 2025
-    extrapolated_holidays = []
-    for holiday in ROMANIAN_HOLIDAYS[2025]:
-        parts = holiday.split('-')
-        if len(parts) == 3:
-            new_date = f"{year}-{parts[1]}-{parts[2]}"
-            extrapolated_holidays.append(new_date)
-    return extrapolated_holidays
-
-# Function to check if a date is a holiday
-def is_holiday(check_date):
-    year = check_date.year
-    date_str = check_date.strftime("%Y-%m-%d")
-    return date_str in get_holidays_for_year(year)
-
-# Function to calculate working days in a month
-def calculate_working_days(year, month):
-    num_days = calendar.monthrange(year, month)[1]
-    working_days = 0
-    
-    for day in range(1, num_days + 1):
-        current_date = date(year, month, day)
-        if current_date.weekday() < 5:  # 0-4 are Monday-Friday
-            if not is_holiday(current_date):
-                working_days += 1
-    
-    return working_days
-
-# Function to calculate standard monthly hours
-def calculate_standard_monthly_hours(year, month):
-    num_days = calendar.monthrange(year, month)[1]
-    total_hours = 0
-    
-    for day in range(1, num_days + 1):
-        current_date = date(year, month, day)
-        weekday = current_date.weekday()
-        
-        # Skip weekends and holidays
-        if weekday >= 5 or is_holiday(current_date):
-            continue
-        
-        # Add hours based on day of week
-        if weekday == 4:  # Friday
-            total_hours += 6.0
-        else:  # Monday to Thursday
-            total_hours += 8.5
-    
-    return total_hours
-
-# Function to parse time strings
-def parse_time(time_str):
-    if pd.isna(time_str) or time_str == '':
-        return None
-    try:
-        return datetime.strptime(time_str.strip(), '%H:%M')
-    except:
-        return None
-
-# Function to calculate duration between times
-def calculate_duration(entry_time, exit_time):
-    if entry_time is None or exit_time is None:
-        return 0
-    
-    duration = exit_time - entry_time
-    hours = duration.total_seconds() / 3600
-    return round(hours, 2)
-
-# Function to convert date string to datetime
-def convert_date_string(date_str, year=None):
-    if pd.isna(date_str) or not date_str:
-        return None
-    
-    # Clean up the date string
-    date_str = date_str.strip()
-    
-    # Try different date formats
-    formats = ['%d %B %Y', '%d %B', '%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d']
-    
-    for fmt in formats:
-        try:
-            dt = datetime.strptime(date_str, fmt)
-            if '%Y' not in fmt and year:
-                # If year is not in the format, set it
-                dt = dt.replace(year=year)
-            return dt
-        except ValueError:
-            continue
-    
-    return None
-
-# Function to load historical data
-def load_historical_data():
-    try:
-        if os.path.exists('data/attendance_history.csv'):
-            return pd.read_csv('data/attendance_history.csv')
-        return pd.DataFrame()
-    except Exception as e:
-        st.warning(f"Nu s-a putut încărca istoricul: {e}")
-        return pd.DataFrame()
-
-# Function to save data to historical record
-def save_to_historical_data(new_data):
-    try:
-        if new_data.empty:
-            return pd.DataFrame()
-            
-        # Load existing data first
-        historical_df = load_historical_data()
-        
-        if historical_df.empty:
-            historical_df = new_data
-        else:
-            # Remove duplicates based on Employee + Date
-            if 'Angajat' in new_data.columns and 'Data' in new_data.columns:
-                for _, row in new_data.iterrows():
-                    mask = (historical_df['Angajat'] == row['Angajat']) & (historical_df['Data'] == row['Data'])
-                    historical_df = historical_df[~mask]
-                
-                # Add new data
-                historical_df = pd.concat([historical_df, new_data], ignore_index=True)
-        
-        # Save locally
-        historical_df.to_csv('data/attendance_history.csv', index=False)
-        
-        st.session_state.historical_data = historical_df
-        return historical_df
-    except Exception as e:
-        st.warning(f"Nu s-a putut salva istoricul: {e}")
-        return pd.DataFrame()
-
 # Function to create download link
 def get_download_link(df, filename, link_text):
     try:
-        csv = df.to_csv(index=False)
-        b64 = base64.b64encode(csv.encode()).decode()
+        b64 = base64.b64encode(to_csv_bytes(df)).decode()
         href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-link">{link_text}</a>'
         return href
     except Exception as e:
         st.warning(f"Nu s-a putut crea link-ul de descărcare: {e}")
         return ""
 
-# Function to create Excel download link
-def get_excel_download_link(df, filename, link_text):
-    try:
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False, sheet_name='Sheet1')
-        excel_data = output.getvalue()
-        b64 = base64.b64encode(excel_data).decode()
-        href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}" class="download-link">{link_text}</a>'
-        return href
-    except Exception as e:
-        st.warning(f"Nu s-a putut crea link-ul de descărcare Excel: {e}")
-        return ""
+# Function to show an Excel download button; the workbook (and the Excel writer library)
+# is only built when the button is clicked
+def show_excel_download_button(df, filename, label):
+    st.download_button(
+        label,
+        data=lambda: to_excel_bytes(df),
+        file_name=filename,
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key=f"download_{filename}",
+        on_click="ignore"
+    )
+
+# Function to show a download button for a ZIP bundle of the given frames; the bundle is written
+# chunk by chunk only when the button is clicked
+def show_bundle_download_button(frames, bundle_format, details):
+    # Function to write the bundle into memory for the download
+    def build_bundle():
+        buffer = io.BytesIO()
+        write_export_bundle(buffer, frames, bundle_format, details)
+        return buffer.getvalue()
+
+    st.download_button(
+        "📥 Descărcați Pachetul (ZIP)",
+        data=build_bundle,
+        file_name=f"prezenta_{bundle_format}.zip",
+        mime=BUNDLE_MIME_TYPE,
+        key="download_bundle",
+        on_click="ignore"
+    )
+
+# History columns the app reads directly (record count and the badge directory)
+HISTORY_VIEW_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Data_Obiect', 'Diferență']
+
+# Function to load the history and its employee-month cube once per history version.
+# The frames are shared by every session of the process and must be treated as read-only;
+# max_entries=1 drops the previous version as soon as a newer one is loaded.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_shared_history(version):
+    return load_historical_data(columns=HISTORY_VIEW_COLUMNS), load_history_cube()
+
+# Function to index the balance ledger of a history version once per process
+@st.cache_resource(max_entries=1, show_spinner=False)
+def get_balance_ledger(version):
+    return BalanceLedger(load_balance_ledger())
+
+# Function to compute the anomaly report of a history version once per process (only the
+# employees whose rows changed since the previous version are analysed again)
+@st.cache_resource(max_entries=1, show_spinner="Se analizează anomaliile din istoric...")
+def get_history_anomalies(version):
+    return get_anomalies(load_historical_data(columns=ANOMALY_INPUT_COLUMNS))
+
+# Function to build the holiday table of a year once per process
+@st.cache_data(show_spinner=False)
+def get_holiday_table(year):
+    holidays = get_holiday_descriptions(year)
+    return pd.DataFrame({"Data": list(holidays), "Descriere": list(holidays.values())})
+
+# Labels of the processing stages shown while a background job runs
+JOB_STAGE_LABELS = {
+    'decode': "Citire fișier",
+    'parse': "Procesare angajați",
+    'gap_fill': "Completare zile lipsă",
+    'schema': "Normalizare date",
+    'aggregate': "Calcul totaluri săptămânale și lunare",
+    'history_save': "Salvare în istoric",
+}
 
-# Helper function to process employee data entries (removes duplication)
-def process_employee_entry(current_employee, department, badge_id, weekdays, dates, time_range, report_year):
-    data_entries = []
+# Function to show the progress of a background job and the records parsed so far; it reruns
+# every second on its own, and reruns the whole app once the job has finished
+@st.fragment(run_every=1)
+def show_job_progress(job):
+    if job.finished:
+        st.rerun()
     
-    for day_idx, (day, date_str, time_range_val) in enumerate(zip(weekdays, dates, time_range)):
-        if date_str:  # Check if date exists
-            date_obj = convert_date_string(date_str, report_year)
-            weekday_name = day
-            
-            if time_range_val and '-' in time_range_val:
-                entry_time_str, exit_time_str = time_range_val.split(' - ')
-                entry_time = parse_time(entry_time_str)
-                exit_time = parse_time(exit_time_str)
-                
-                if entry_time and exit_time:
-                    duration = calculate_duration(entry_time, exit_time)
-                    standard_duration = 0
-                    
-                    # Calculate standard hours based on weekday
-                    if weekday_name in ['Mon', 'Tue', 'Wed', 'Thu']:
-                        standard_duration = 8.5
-                    elif weekday_name == 'Fri':
-                        standard_duration = 6.0
-                    
-                    # Check if it's a holiday
-                    if date_obj and is_holiday(date_obj):
-                        standard_duration = 0
-                    
-                    data_entries.append({
-                        'Angajat': current_employee,
-                        'Departament': department,
-                        'ID Legitimație': badge_id,
-                        'Zi': weekday_name,
-                        'Data': date_str,
-                        'Data_Obiect': date_obj,
-                        'Ora Sosire': entry_time_str,
-                        'Ora Plecare': exit_time_str,
-                        'Durata (Ore)': duration,
-                        'Ore Standard': standard_duration,
-                        'Diferență': duration - standard_duration
-                    })
-            else:
-                # Date exists but no time range (absent day)
-                standard_duration = 0
-                if weekday_name in ['Mon', 'Tue', 'Wed', 'Thu']:
-                    standard_duration = 8.5
-                elif weekday_name == 'Fri':
-                    standard_duration = 6.0
-                
-                # Check if it's a holiday
-                if date_obj and is_holiday(date_obj):
-                    standard_duration = 0
-                
-                data_entries.append({
-                    'Angajat': current_employee,
-                    'Departament': department,
-                    'ID Legitimație': badge_id,
-                    'Zi': weekday_name,
-                    'Data': date_str,
-                    'Data_Obiect': date_obj,
-                    'Ora Sosire': '',
-                    'Ora Plecare': '',
-                    'Durata (Ore)': 0,
-                    'Ore Standard': standard_duration,
-                    'Diferență': -standard_duration
-                })
+    stage_label = JOB_STAGE_LABELS.get(job.stage, "Pornire procesare")
+    if job.stage == 'parse' and job.total:
+        stage_label += f": {job.done}/{job.total} angajați"
+    elif job.stage == 'parse' and job.done:
+        stage_label += f": {job.done:,} evenimente citite"
+    st.progress(job.progress_fraction(), text=f"⏳ {stage_label}")
     
-    return data_entries
+    # Rows parsed so far, filterable while the rest of the file is processed
+    partial_df = job.partial_frame()
+    if not partial_df.empty:
+        st.markdown(f"#### Înregistrări procesate până acum ({len(partial_df)})")
+        preview_employees = sorted(partial_df['Angajat'].unique())
+        preview_employee = st.selectbox("Selectați Angajatul", ['Toți'] + preview_employees, key="preview_employee")
+        if preview_employee != 'Toți':
+            partial_df = partial_df[partial_df['Angajat'] == preview_employee]
+        st.dataframe(
+            partial_df[['Angajat', 'Zi', 'Data', 'Ora Sosire', 'Ora Plecare', 'Durata (Ore)']],
+            use_container_width=True
+        )
 
-# Function to process attendance data
-def process_attendance_data(file_content):
-    try:
-        # Read CSV content
-        lines = file_content.strip().split('\n')
-        
-        # Extract date range from header
-        date_range_line = lines[1] if len(lines) > 1 else ""
-        date_match = re.search(r'from\s+(\d+\s+\w+\s+\d+)\s+to\s+(\d+\s+\w+\s+\d+)', date_range_line)
-        date_range = f"{date_match.group(1)} - {date_match.group(2)}" if date_match else "N/A"
-        
-        # Extract start and end dates
-        start_date_str = date_match.group(1) if date_match else None
-        end_date_str = date_match.group(2) if date_match else None
-        
-        start_date = convert_date_string(start_date_str)
-        end_date = convert_date_string(end_date_str)
-        report_year = start_date.year if start_date else datetime.now().year
-        
-        data = []
-        current_employee = None
-        department = None
-        badge_id = None
-        days_data = []
-        weekdays = None
-        dates = None
-        
-        for line in lines:
-            line = line.strip()
-            
-            # Skip empty lines
-            if not line:
-                continue
-            
-            # Check if this is an employee header line
-            employee_match = re.search(r',([^,]+\s+[^,]+\s+\d+),([^,]*),', line)
-            if employee_match:
-                # Process previous employee data if it exists
-                if current_employee and days_data:
-                    data_entries = process_employee_entry(current_employee, department, badge_id, weekdays, dates, days_data, report_year)
-                    data.extend(data_entries)
-                
-                # Set new employee data
-                current_employee = employee_match.group(1).strip()
-                department = employee_match.group(2).strip()
-                
-                # Extract badge ID
-                badge_match = re.search(r'(\d{3}[A-Z0-9]+)$', line)
-                badge_id = badge_match.group(1) if badge_match else "N/A"
-                
-                days_data = []
-                continue
-            
-            # Check if this is a weekday header line
-            if line.startswith('Mon,Tue,Wed,Thu,Fri,Sat,Sun'):
-                weekdays = line.split(',')
-                continue
-            
-            # Check if this is a date line
-            date_line_match = re.match(r'\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,', line)
-            if date_line_match:
-                dates = []
-                for date_str in line.split(','):
-                    date_str = date_str.strip()
-                    if date_str and re.match(r'\d+\s+\w+', date_str):
-                        dates.append(date_str)
-                    else:
-                        dates.append(None)
-                continue
-            
-            # Check if this is a time range line
-            time_range_match = re.match(r'(\d{1,2}:\d{2}\s+-\s+\d{1,2}:\d{2})?,(\d{1,2}:\d{2}\s+-\s+\d{1,2}:\d{2})?,', line)
-            if time_range_match:
-                days_data = line.split(',')
-                days_data = [d.strip() if d.strip() else None for d in days_data]
-                
-                # Process current employee data
-                if current_employee and days_data:
-                    data_entries = process_employee_entry(current_employee, department, badge_id, weekdays, dates, days_data, report_year)
-                    data.extend(data_entries)
-                
-                days_data = []
-                continue
-        
-        # Create DataFrame
-        df = pd.DataFrame(data)
-        
-        # Add missing working days for each employee
-        if not df.empty and start_date and end_date:
-            all_employees = df['Angajat'].unique()
-            
-            for employee in all_employees:
-                # Get department and badge ID for this employee
-                emp_df = df[df['Angajat'] == employee]
-                if not emp_df.empty:
-                    department = emp_df['Departament'].iloc[0] if 'Departament' in emp_df.columns else ""
-                    badge_id = emp_df['ID Legitimație'].iloc[0]
-                    
-                    current_date = start_date
-                    while current_date <= end_date:
-                        weekday_num = current_date.weekday()
-                        weekday_name = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'][weekday_num]
-                        date_str = current_date.strftime("%d %B")
-                        
-                        # Skip weekends
-                        if weekday_num < 5:
-                            # Check if this day already exists for this employee
-                            date_exists = False
-                            for _, row in emp_df.iterrows():
-                                row_date = row.get('Data_Obiect')
-                                if row_date and row_date.date() == current_date.date():
-                                    date_exists = True
-                                    break
-                            
-                            if not date_exists:
-                                # Calculate standard hours
-                                standard_duration = 0
-                                if weekday_name in ['Mon', 'Tue', 'Wed', 'Thu']:
-                                    standard_duration = 8.5
-                                elif weekday_name == 'Fri':
-                                    standard_duration = 6.0
-                                
-                                # Check if it's a holiday
-                                if is_holiday(current_date):
-                                    standard_duration = 0
-                                
-                                # Add the missing day
-                                new_row = {
-                                    'Angajat': employee,
-                                    'Departament': department,
-                                    'ID Legitimație': badge_id,
-                                    'Zi': weekday_name,
-                                    'Data': date_str,
-                                    'Data_Obiect': current_date,
-                                    'Ora Sosire': '',
-                                    'Ora Plecare': '',
-                                    'Durata (Ore)': 0,
-                                    'Ore Standard': standard_duration,
-                                    'Diferență': -standard_duration
-                                }
-                                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                        
-                        current_date += timedelta(days=1)
-        
-        # Extract year, month info and add them as columns
-        if not df.empty and 'Data_Obiect' in df.columns:
-            df['An'] = df['Data_Obiect'].apply(lambda x: x.year if x else None)
-            df['Luna'] = df['Data_Obiect'].apply(lambda x: x.month if x else None)
-            df['Luna_Nume'] = df['Data_Obiect'].apply(lambda x: x.strftime('%B') if x else None)
-            df['Săptămână'] = df['Data_Obiect'].apply(lambda x: x.isocalendar()[1] if x else None)
-        
-        # Sort DataFrame by employee and date
-        if 'Data_Obiect' in df.columns and not df.empty:
-            df = df.sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True)
-        
-        # Calculate weekly totals for each employee
-        weekly_data = []
-        
-        if not df.empty and 'Săptămână' in df.columns:
-            for (employee, year, week), week_df in df.groupby(['Angajat', 'An', 'Săptămână']):
-                if pd.isna(year) or pd.isna(week):
-                    continue
-                    
-                total_hours = week_df['Durata (Ore)'].sum()
-                total_standard_hours = week_df['Ore Standard'].sum()
-                
-                # Get department
-                department = week_df['Departament'].iloc[0] if 'Departament' in week_df.columns else ""
-                
-                # Get the first and last date of the week
-                dates = sorted(week_df['Data_Obiect'].dropna())
-                week_start = dates[0].strftime('%d %b') if dates else ""
-                week_end = dates[-1].strftime('%d %b') if dates else ""
-                week_range = f"{week_start} - {week_end}" if week_start and week_end else f"Săpt. {week}"
-                
-                weekly_data.append({
-                    'Angajat': employee,
-                    'Departament': department,
-                    'An': year,
-                    'Săptămână': week,
-                    'Interval': week_range,
-                    'Ore Totale': total_hours,
-                    'Ore Standard': total_standard_hours,
-                    'Diferență': total_hours - total_standard_hours
-                })
-        
-        weekly_df = pd.DataFrame(weekly_data)
-        
-        # Calculate monthly totals
-        monthly_data = []
-        
-        if not df.empty and 'Luna' in df.columns and 'An' in df.columns:
-            for (employee, year, month), month_df in df.groupby(['Angajat', 'An', 'Luna']):
-                if pd.isna(year) or pd.isna(month):
-                    continue
-                    
-                # Calculate actual hours worked
-                total_hours = month_df['Durata (Ore)'].sum()
-                
-                # Calculate standard hours for the month
-                standard_hours = calculate_standard_monthly_hours(int(year), int(month))
-                
-                # Get department
-                department = month_df['Departament'].iloc[0] if 'Departament' in month_df.columns else ""
-                
-                # Get month name
-                month_name = month_df['Luna_Nume'].iloc[0] if not month_df['Luna_Nume'].isna().all() else ""
-                
-                monthly_data.append({
-                    'Angajat': employee,
-                    'Departament': department,
-                    'An': int(year),
-                    'Luna': int(month),
-                    'Luna_Nume': month_name,
-                    'Ore Totale': total_hours,
-                    'Ore Standard': standard_hours,
-                    'Diferență': total_hours - standard_hours,
-                    'Zile Lucrătoare': calculate_working_days(int(year), int(month))
-                })
-        
-        monthly_df = pd.DataFrame(monthly_data)
-        
-        return df, weekly_df, monthly_df, date_range, report_year
-    except Exception as e:
-        st.error(f"Eroare la procesarea datelor: {e}")
-        st.exception(e)
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), "N/A", datetime.now().year
+# Function to show that the history is being recomputed after a leave import; reruns the whole
+# app once the recompute has finished
+@st.fragment(run_every=1)
+def show_recompute_progress(job):
+    if job.finished:
+        st.rerun()
+    st.info("⏳ Se recalculează istoricul cu noile concedii...")
 
 # Custom CSS
 st.markdown("""
@@ -550,39 +213,354 @@ st.markdown("""
 st.title("📊 Analizor Prezență Angajați")
 st.markdown("Încărcați datele de prezență și obțineți o analiză completă")
 
+# Analysis mode: current upload or the accumulated history
+analysis_mode = st.radio("Mod de Analiză", ["Fișier Încărcat", "Istoric"], horizontal=True, key="analysis_mode")
+
 # File upload section
-st.markdown("### Încărcați Datele de Prezență")
-uploaded_file = st.file_uploader("Alegeți un fișier", type=['xlsx', 'csv'])
+if analysis_mode == "Fișier Încărcat":
+    st.markdown("### Încărcați Datele de Prezență")
+    upload_kind = st.radio("Tip Fișier", ["Raport Prezență", "Evenimente Brute"], horizontal=True, key="upload_kind",
+                           help="Evenimente Brute: CSV cu o linie per citire de card (legitimație, marcaj de timp, ușă)")
+    if upload_kind == "Evenimente Brute":
+        uploaded_file = st.file_uploader("Alegeți un fișier", type=['csv'], key="raw_events_file")
+    else:
+        uploaded_file = st.file_uploader("Alegeți un fișier", type=['xlsx', 'csv'])
+    diagnostics_enabled = st.checkbox("🔧 Diagnosticare performanță", key="diagnostics_enabled")
+else:
+    upload_kind = None
+    uploaded_file = None
+    diagnostics_enabled = False
+
+# History writer of this process; on the first run it merges uploads left in the queue by a previous run
+get_history_writer()
 
-# Load historical data
-historical_df = load_historical_data()
+# Shared, read-only history of the current version (reloaded only after a save)
+historical_df, cube_df = get_shared_history(get_history_version())
 
 if not historical_df.empty:
     st.info(f"📊 Istoric disponibil: {len(historical_df)} înregistrări")
 
 # Main application logic
-if uploaded_file is not None:
+if analysis_mode == "Istoric":
+    st.markdown("### Analiză Istoric")
+    
+    if not cube_df.empty:
+        # Period span over the months present in the cube
+        periods = sorted(set(zip(cube_df['An'], cube_df['Luna'])))
+        period_labels = [f"{year}-{month:02d}" for year, month in periods]
+        
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            if len(period_labels) > 1:
+                start_label, end_label = st.select_slider(
+                    "Interval",
+                    options=period_labels,
+                    value=(period_labels[0], period_labels[-1]),
+                    key="history_span"
+                )
+            else:
+                start_label = end_label = period_labels[0]
+        with col2:
+            history_departments = sorted(cube_df['Departament'].unique())
+            selected_departments = st.multiselect("Departamente", history_departments, key="history_departments")
+        with col3:
+            history_employees = cube_df['Angajat']
+            if selected_departments:
+                history_employees = cube_df.loc[cube_df['Departament'].isin(selected_departments), 'Angajat']
+            selected_history_employee = st.selectbox("Selectați Angajatul", ['Toți'] + sorted(history_employees.unique()), key="history_employee")
+        
+        # Slice the cube: period index is year * 12 + month so spans compare as integers
+        period_index = cube_df['An'] * 12 + cube_df['Luna']
+        start_year, start_month = map(int, start_label.split('-'))
+        end_year, end_month = map(int, end_label.split('-'))
+        history_mask = period_index.between(start_year * 12 + start_month, end_year * 12 + end_month)
+        if selected_departments:
+            history_mask &= cube_df['Departament'].isin(selected_departments)
+        if selected_history_employee != 'Toți':
+            history_mask &= cube_df['Angajat'] == selected_history_employee
+        history_slice = cube_df[history_mask]
+        
+        closed_labels = list_closed_periods()
+        
+        if not history_slice.empty:
+            value_columns = ['Ore Totale', 'Ore Standard', 'Diferență', 'Zile Lucrate', 'Absențe', 'Întârzieri']
+            
+            closed_in_span = [label for label in closed_labels if start_label <= label <= end_label]
+            if closed_in_span:
+                st.caption(f"🔒 Luni închise pentru salarizare în interval: {', '.join(closed_in_span)} (valorile lor sunt înghețate)")
+            
+            # Span totals
+            total_hours = history_slice['Ore Totale'].sum()
+            total_standard = history_slice['Ore Standard'].sum()
+            total_difference = total_hours - total_standard
+            
+            col1, col2, col3, col4, col5 = st.columns(5)
+            with col1:
+                st.metric("Total Ore Lucrate", f"{total_hours:.2f}")
+            with col2:
+                st.metric("Total Ore Standard", f"{total_standard:.2f}")
+            with col3:
+                st.metric("Balanță", f"{total_difference:.2f}",
+                        delta=f"{(total_difference/total_standard*100):.1f}%" if total_standard > 0 else None)
+            with col4:
+                st.metric("Absențe", int(history_slice['Absențe'].sum()))
+            with col5:
+                st.metric("Întârzieri", int(history_slice['Întârzieri'].sum()))
+            
+            # Month-by-month trend
+            trend_df = history_slice.groupby(['An', 'Luna'], as_index=False)[value_columns].sum()
+            trend_df['Perioada'] = trend_df['An'].astype(str) + '-' + trend_df['Luna'].map('{:02d}'.format)
+            
+            import plotly.express as px
+            
+            trend_fig = px.bar(
+                trend_df,
+                x='Perioada',
+                y=['Ore Totale', 'Ore Standard'],
+                barmode='group',
+                title="Ore Lunare: Efectiv vs. Standard",
+                labels={"value": "Ore", "variable": "Categorie"},
+                height=450,
+                color_discrete_map={'Ore Totale': '#4CAF50', 'Ore Standard': '#2196F3'}
+            )
+            st.plotly_chart(trend_fig, use_container_width=True)
+            
+            # Totals per employee over the selected span
+            summary_df = history_slice.groupby(['Angajat', 'Departament'], as_index=False)[value_columns].sum()
+            
+            def highlight_history_diff(row):
+                if row['Diferență'] > 0:
+                    return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
+                elif row['Diferență'] < 0:
+                    return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
+                return [''] * len(row)
+            
+            st.markdown("#### Sumar pe Angajați")
+            st.dataframe(summary_df.style.apply(highlight_history_diff, axis=1), use_container_width=True)
+            
+            with st.expander("Detaliu Lunar"):
+                st.dataframe(history_slice.style.apply(highlight_history_diff, axis=1), use_container_width=True)
+            
+            # Download links
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown(get_download_link(history_slice, "istoric_lunar.csv", "📥 Descărcați Istoric Lunar (CSV)"), unsafe_allow_html=True)
+            with col2:
+                show_excel_download_button(summary_df, "istoric_sumar.xlsx", "📥 Descărcați Sumar (Excel)")
+            
+            # Cumulative balance at a date, from the month checkpoints of the ledger
+            st.markdown("#### ⚖️ Sold Cumulat Ore")
+            try:
+                last_history_day = historical_df['Data_Obiect'].max().date()
+                col1, col2 = st.columns(2)
+                with col1:
+                    balance_date = st.date_input("Sold la data", value=last_history_day, key="balance_date")
+                with col2:
+                    balance_since = st.date_input("Începând cu (opțional)", value=None, key="balance_since",
+                                                  help="Fără dată, soldul cuprinde tot istoricul")
+                
+                balance_df = get_balance_ledger(get_history_version()).balance_as_of(balance_date, historical_df, balance_since)
+                if selected_departments:
+                    balance_df = balance_df[balance_df['Departament'].isin(selected_departments)]
+                if selected_history_employee != 'Toți':
+                    balance_df = balance_df[balance_df['Angajat'] == selected_history_employee]
+                
+                st.metric("Sold Total", f"{balance_df['Sold'].sum():.2f}")
+                st.dataframe(balance_df.sort_values('Sold'), use_container_width=True, hide_index=True)
+                st.markdown(get_download_link(balance_df, f"sold_ore_{balance_date}.csv", "📥 Descărcați Soldul (CSV)"), unsafe_allow_html=True)
+            except Exception as e:
+                st.warning(f"Nu s-a putut calcula soldul cumulat: {str(e)}")
+            
+            # Anomalies of the same span, departments and employee
+            st.markdown("#### ⚠️ Anomalii Prezență")
+            try:
+                anomalies_df = get_history_anomalies(get_history_version())
+                anomaly_dates = pd.to_datetime(anomalies_df['Data_Obiect'])
+                anomaly_mask = (anomaly_dates.dt.year * 12 + anomaly_dates.dt.month).between(
+                    start_year * 12 + start_month, end_year * 12 + end_month
+                )
+                if selected_departments:
+                    anomaly_mask &= anomalies_df['Departament'].isin(selected_departments)
+                if selected_history_employee != 'Toți':
+                    anomaly_mask &= anomalies_df['Angajat'] == selected_history_employee
+                anomaly_slice = anomalies_df[anomaly_mask]
+                
+                if anomaly_slice.empty:
+                    st.success("Nu au fost detectate anomalii pentru selecția curentă.")
+                else:
+                    anomaly_counts = anomaly_slice['Anomalie'].value_counts()
+                    for column, (anomaly_type, count) in zip(st.columns(len(anomaly_counts)), anomaly_counts.items()):
+                        with column:
+                            st.metric(anomaly_type, int(count))
+                    
+                    selected_types = st.multiselect("Tipuri de anomalii", list(anomaly_counts.index), key="anomaly_types")
+                    if selected_types:
+                        anomaly_slice = anomaly_slice[anomaly_slice['Anomalie'].isin(selected_types)]
+                    st.dataframe(anomaly_slice, use_container_width=True, hide_index=True)
+                    st.markdown(get_download_link(anomaly_slice, "anomalii_prezenta.csv", "📥 Descărcați Anomaliile (CSV)"), unsafe_allow_html=True)
+            except Exception as e:
+                st.warning(f"Nu s-au putut calcula anomaliile: {str(e)}")
+        else:
+            st.info("Nu există date istorice pentru selecția curentă.")
+        
+        # Months closed for payroll are served from their frozen snapshots
+        st.markdown("#### 🔒 Perioade Închise")
+        open_labels = [label for label in period_labels if label not in closed_labels]
+        if open_labels:
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                close_label = st.selectbox("Lună de închis pentru salarizare", open_labels[::-1], key="close_period_label")
+            with col2:
+                close_confirmed = st.checkbox("Confirm: luna nu va mai putea fi modificată", key="close_period_confirm")
+            with col3:
+                if st.button("🔒 Închide Luna", key="close_period", disabled=not close_confirmed):
+                    try:
+                        with st.spinner(f"Se creează instantaneul lunii {close_label}..."):
+                            close_period(*parse_period_label(close_label))
+                        st.success(f"Luna {close_label} a fost închisă.")
+                        closed_labels = list_closed_periods()
+                    except ValueError as e:
+                        st.error(str(e))
+        
+        if closed_labels:
+            snapshot_label = st.selectbox("Perioadă închisă", closed_labels[::-1], key="snapshot_period")
+            try:
+                snapshot = load_period_snapshot(snapshot_label)
+                manifest = snapshot['manifest']
+                st.caption(f"Închisă la {manifest['closed_at']}. Datele lunii sunt servite din instantaneu; încărcările nu le mai modifică.")
+                
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Angajați", manifest['employees'])
+                with col2:
+                    st.metric("Total Ore Standard", f"{manifest['total_standard_hours']:.2f}")
+                with col3:
+                    st.metric("Total Ore Lucrate", f"{manifest['total_hours']:.2f}")
+                with col4:
+                    st.metric("Diferență", f"{manifest['total_difference']:.2f}")
+                
+                # Schedule of every department at the close (manifests of older closes have none)
+                if 'departments' in manifest:
+                    st.dataframe(pd.DataFrame([
+                        {'Departament': department, 'Zile Lucrătoare': schedule['working_days'],
+                         'Ore Standard / Angajat': schedule['standard_monthly_hours']}
+                        for department, schedule in manifest['departments'].items()
+                    ]), use_container_width=True, hide_index=True)
+                
+                import plotly.express as px
+                
+                snapshot_fig = px.line(
+                    snapshot['chart'],
+                    x='Data',
+                    y=['Ore Totale', 'Ore Standard'],
+                    title=f"Ore Zilnice {snapshot_label}",
+                    labels={"value": "Ore", "variable": "Categorie"},
+                    height=400,
+                    color_discrete_map={'Ore Totale': '#4CAF50', 'Ore Standard': '#2196F3'}
+                )
+                st.plotly_chart(snapshot_fig, use_container_width=True)
+                st.dataframe(snapshot['monthly'], use_container_width=True, hide_index=True)
+                
+                # Export files rendered when the month was closed
+                snapshot_labels = {'daily_csv': "📥 Date Zilnice (CSV)", 'daily_excel': "📥 Date Zilnice (Excel)", 'monthly_excel': "📥 Sumar Lunar (Excel)"}
+                for column, (name, (file_name, content)) in zip(st.columns(len(snapshot['files'])), snapshot['files'].items()):
+                    with column:
+                        st.download_button(
+                            snapshot_labels[name],
+                            data=content,
+                            file_name=file_name,
+                            mime="text/csv" if file_name.endswith('.csv') else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                            key=f"snapshot_{name}",
+                            on_click="ignore"
+                        )
+            except Exception as e:
+                st.warning(f"Nu s-a putut încărca instantaneul lunii {snapshot_label}: {str(e)}")
+    else:
+        st.info("Istoricul este gol. Încărcați un fișier de prezență pentru a-l popula.")
+elif uploaded_file is not None:
+    # Per-stage timings for the diagnostics panel (no-op unless enabled)
+    recorder = StageRecorder(enabled=diagnostics_enabled)
+    
+    # A single run is profiled with cProfile when requested from the diagnostics panel
+    profiler = cProfile.Profile() if st.session_state.pop('profile_next_run', False) else None
+    if profiler:
+        profiler.enable()
+    
     try:
-        # Process the uploaded file
+        # Sheet selection for Excel workbooks
+        sheet_name = None
         if uploaded_file.name.endswith('.xlsx'):
-            # For Excel files
             xls = pd.ExcelFile(uploaded_file)
             sheet_name = st.selectbox("Selectați Foaia", xls.sheet_names)
-            df_raw = pd.read_excel(uploaded_file, sheet_name=sheet_name)
-            file_content = df_raw.to_csv(index=False)
+        
+        # Each upload is processed once; reruns (filters, tabs) reuse the job and its results. The key
+        # is the id of the upload, not its name and size: exports with a fixed name often have the same size
+        job_key = (uploaded_file.file_id, upload_kind, sheet_name, diagnostics_enabled)
+        recompute_job = st.session_state.get('leave_recompute_job')
+        if recompute_job is not None and recompute_job.finished and st.session_state.pop('leave_recompute_pending', False):
+            # The results of the upload are processed again with the leave days of the recomputed history
+            st.session_state.pop('attendance_job', None)
+        job = st.session_state.get('attendance_job')
+        if job is None or job.key != job_key or profiler is not None:
+            run_in_background = uploaded_file.size >= BACKGROUND_MIN_BYTES and profiler is None
+            job_recorder = StageRecorder(enabled=diagnostics_enabled) if run_in_background else recorder
+            directory = get_badge_directory(historical_df)
+            job = AttendanceJob(
+                job_key,
+                lambda progress, issues, ingest: process_upload(uploaded_file, upload_kind, sheet_name, job_recorder, directory, progress, issues, ingest),
+                job_recorder
+            )
+            st.session_state.attendance_job = job
+            if run_in_background:
+                job.start()
+            else:
+                job.run()
+        elif job.finished:
+            # Processing stages of the run that produced the cached results
+            recorder.records.extend(job.recorder.records)
+        
+        daily_df = pd.DataFrame()
+        parse_issues = job.issues
+        if not job.finished:
+            show_job_progress(job)
+        elif job.error is not None:
+            st.error(f"Eroare la procesarea datelor: {job.error}")
+            st.exception(job.error)
         else:
-            # For CSV files
-            file_content = uploaded_file.getvalue().decode('utf-8')
+            daily_df, weekly_df, monthly_df, date_range, report_year = job.result
         
-        # Process the data
-        daily_df, weekly_df, monthly_df, date_range, report_year = process_attendance_data(file_content)
+        # Lines the tokenizer could not place in an employee block
+        if job.finished and parse_issues:
+            if upload_kind == "Evenimente Brute":
+                st.warning(f"⚠️ Fișierul de evenimente conține {len(parse_issues)} probleme (citiri invalide, legitimații necunoscute sau fără ieșire).")
+            else:
+                st.warning(f"⚠️ Fișierul conține {len(parse_issues)} linii sau blocuri cu probleme de structură.")
+            with st.expander("Detalii Probleme Fișier"):
+                st.dataframe(pd.DataFrame(parse_issues), use_container_width=True)
         
         if not daily_df.empty:
-            # Save new data to history
-            updated_history = save_to_historical_data(daily_df)
+            # History was saved by the job
+            if job.history_error is not None:
+                st.warning(f"Nu s-a putut salva istoricul: {job.history_error}")
+            
+            # Days of months closed for payroll are not saved
+            if job.closed_periods:
+                closed_details = ', '.join(f"{label} ({count} zile)" for label, count in job.closed_periods.items())
+                st.warning(f"🔒 Fișierul conține zile din luni închise pentru salarizare, care nu au fost salvate în istoric: {closed_details}")
             
             st.success(f"✅ Date procesate cu succes! Interval de date: {date_range}")
             
+            # Employee blocks found in the ingest ledger were not parsed or saved again
+            if job.ingest.statuses:
+                ingest_counts = job.ingest.counts()
+                if job.ingest.file_entry is not None:
+                    st.info(f"ℹ️ Fișierul a fost deja importat la {job.ingest.file_entry['imported_at']}; datele sunt afișate din istoric.")
+                else:
+                    st.info(f"ℹ️ Blocuri de angajat: {ingest_counts[BLOCK_NEW]} noi, {ingest_counts[BLOCK_CHANGED]} modificate, "
+                            f"{ingest_counts[BLOCK_UNCHANGED]} neschimbate (preluate din istoric).")
+                with st.expander("Detalii Import"):
+                    st.dataframe(job.ingest.to_frame(), use_container_width=True, hide_index=True)
+            
             # Add rounding percentage selector
             col1, col2 = st.columns([1, 3])
             with col1:
@@ -595,204 +573,216 @@ if uploaded_file is not None:
                 if rounding_percentage > 0:
                     st.info(f"Valorile pozitive din coloana 'Durata (Ore)' vor fi rotunjite în sus cu {rounding_percentage}%")
             
+            # Filters shared by all tabs, answered from the row indexes the job built
+            result_indexes = job.indexes
+            result_first_day = pd.Timestamp(result_indexes['daily'].sorted_dates[0]).date()
+            result_last_day = pd.Timestamp(result_indexes['daily'].sorted_dates[-1]).date()
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                selected_result_employees = st.multiselect("Angajați", result_indexes['daily'].employee_names,
+                                                           key="result_employees", placeholder="Toți")
+            with col2:
+                selected_result_departments = st.multiselect("Departamente", result_indexes['daily'].department_names,
+                                                             key="result_departments", placeholder="Toate")
+            with col3:
+                result_dates = st.date_input("Interval", value=(result_first_day, result_last_day),
+                                             min_value=result_first_day, max_value=result_last_day, key="result_dates")
+            
+            # A range being picked has only its first day
+            result_filters = {
+                'employees': selected_result_employees,
+                'departments': selected_result_departments,
+                'start': result_dates[0] if len(result_dates) > 0 else None,
+                'end': result_dates[1] if len(result_dates) > 1 else None,
+            }
+            
             # Create tabs for different views
-            tab1, tab2, tab3, tab4 = st.tabs(["📋 Analiză Zilnică", "📅 Sumar Săptămânal", "📆 Prezentare Lunară", "📊 Vizualizări"])
+            # Only the open tab is rendered: switching tabs reruns the script (on_change="rerun")
+            tab1, tab2, tab3, tab4 = st.tabs(
+                ["📋 Analiză Zilnică", "📅 Sumar Săptămânal", "📆 Prezentare Lunară", "📊 Vizualizări"],
+                key="result_tab",
+                on_change="rerun"
+            )
 
             with tab1:
-                st.markdown("### Înregistrări Zilnice de Prezență")
-                
-                # Filter by employee
-                if 'Angajat' in daily_df.columns:
-                    employees = sorted(daily_df['Angajat'].unique())
-                    selected_employee = st.selectbox("Selectați Angajatul", ['Toți'] + list(employees), key="daily_employee")
-                    
-                    if selected_employee != 'Toți':
-                        filtered_df = daily_df[daily_df['Angajat'] == selected_employee]
-                    else:
-                        filtered_df = daily_df
-                else:
-                    filtered_df = daily_df
-                
-                # Display the DataFrame
-                if not filtered_df.empty:
-                    # Create copy for display, dropping unwanted columns
-                    display_df = filtered_df.drop(columns=['Departament', 'ID Legitimație'])
-                    
-                    # Apply rounding if selected
-                    if rounding_percentage > 0:
-                        display_df['Durata (Ore)'] = display_df.apply(
-                            lambda row: round(row['Durata (Ore)'] * (1 + rounding_percentage/100), 2) if row['Durata (Ore)'] > 0 else row['Durata (Ore)'], 
-                            axis=1
-                        )
-                        # Recalculate difference
-                        display_df['Diferență'] = display_df['Durata (Ore)'] - display_df['Ore Standard']
-                                    
-                    # Highlight differences
-                    def highlight_difference(row):
-                        if pd.isna(row['Ora Sosire']) or row['Ora Sosire'] == '':
-                            return ['background-color: #fff3f3'] * len(row)
-                        if row['Diferență'] > 0:
-                            return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
-                        elif row['Diferență'] < 0:
-                            return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
-                        return [''] * len(row)
-                                    
-                    styled_df = display_df.style.apply(highlight_difference, axis=1)
-                                    
-                    st.dataframe(styled_df, use_container_width=True)
+                if tab1.open:
+                    st.markdown("### Înregistrări Zilnice de Prezență")
                     
-                    # Summary for displayed data
-                    total_presence = display_df['Durata (Ore)'].sum()
-                    total_standard = display_df['Ore Standard'].sum()
-                    total_difference = total_presence - total_standard
-                                    
-                    # Metrics
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Ore Lucrate", f"{total_presence:.2f}")
-                    with col2:
-                        st.metric("Total Ore Standard", f"{total_standard:.2f}")
-                    with col3:
-                        st.metric("Diferență", f"{total_difference:.2f}", 
-                                delta=f"{(total_difference/total_standard*100):.1f}%" if total_standard > 0 else None)
+                    filtered_df = result_indexes['daily'].select(**result_filters)
                     
-                    # Download links
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(get_download_link(filtered_df, "prezenta_zilnica_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
-                    with col2:
-                        st.markdown(get_excel_download_link(display_df, "prezenta_zilnica_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)"), unsafe_allow_html=True)
-                else:
-                    st.info("Nu există date de afișat pentru selecția curentă.")
+                    # Display the DataFrame
+                    if not filtered_df.empty:
+                        # Create copy for display, dropping unwanted columns
+                        display_df = filtered_df.drop(columns=['Departament', 'ID Legitimație'])
+                        
+                        # Apply rounding if selected
+                        if rounding_percentage > 0:
+                            display_df['Durata (Ore)'] = display_df.apply(
+                                lambda row: round(row['Durata (Ore)'] * (1 + rounding_percentage/100), 2) if row['Durata (Ore)'] > 0 else row['Durata (Ore)'], 
+                                axis=1
+                            )
+                            # Recalculate difference
+                            display_df['Diferență'] = display_df['Durata (Ore)'] - display_df['Ore Standard']
+                                        
+                        # Highlight differences
+                        def highlight_difference(row):
+                            if row.get('Concediu', ''):
+                                return ['background-color: #e8f0fe'] * len(row)
+                            if pd.isna(row['Ora Sosire']) or row['Ora Sosire'] == '':
+                                return ['background-color: #fff3f3'] * len(row)
+                            if row['Diferență'] > 0:
+                                return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
+                            elif row['Diferență'] < 0:
+                                return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
+                            return [''] * len(row)
+                                        
+                        styled_df = display_df.style.apply(highlight_difference, axis=1)
+                                        
+                        with recorder.stage('styling_daily') as stage_stats:
+                            st.dataframe(styled_df, use_container_width=True)
+                            stage_stats['rows'] = len(styled_df.data)
+                        
+                        # Summary for displayed data
+                        total_presence = display_df['Durata (Ore)'].sum()
+                        total_standard = display_df['Ore Standard'].sum()
+                        total_difference = total_presence - total_standard
+                                        
+                        # Metrics
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Total Ore Lucrate", f"{total_presence:.2f}")
+                        with col2:
+                            st.metric("Total Ore Standard", f"{total_standard:.2f}")
+                        with col3:
+                            st.metric("Diferență", f"{total_difference:.2f}", 
+                                    delta=f"{(total_difference/total_standard*100):.1f}%" if total_standard > 0 else None)
+                        
+                        # Download links
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown(get_download_link(filtered_df, "prezenta_zilnica_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
+                        with col2:
+                            show_excel_download_button(display_df, "prezenta_zilnica_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)")
+                    else:
+                        st.info("Nu există date de afișat pentru selecția curentă.")
 
             with tab2:
-                st.markdown("### Sumar Săptămânal")
-                
-                # Filter by employee
-                if 'Angajat' in weekly_df.columns:
-                    weekly_employees = sorted(weekly_df['Angajat'].unique())
-                    selected_weekly_employee = st.selectbox("Selectați Angajatul", ['Toți'] + list(weekly_employees), key="weekly_employee")
+                if tab2.open:
+                    st.markdown("### Sumar Săptămânal")
                     
-                    if selected_weekly_employee != 'Toți':
-                        filtered_weekly_df = weekly_df[weekly_df['Angajat'] == selected_weekly_employee]
-                    else:
-                        filtered_weekly_df = weekly_df
-                else:
-                    filtered_weekly_df = weekly_df
-                
-                # Display the DataFrame
-                if not filtered_weekly_df.empty:
-                    # Create copy for display, dropping unwanted columns
-                    display_weekly_df = filtered_weekly_df.drop(columns=['Departament'])
-                    
-                    # Apply rounding if selected
-                    if rounding_percentage > 0:
-                        display_weekly_df['Ore Totale'] = display_weekly_df['Ore Totale'].apply(
-                            lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
-                        )
-                        # Recalculate difference
-                        display_weekly_df['Diferență'] = display_weekly_df['Ore Totale'] - display_weekly_df['Ore Standard']
-                    
-                    # Format the DataFrame for display
-                    def highlight_weekly_diff(row):
-                        if row['Diferență'] > 0:
-                            return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
-                        elif row['Diferență'] < 0:
-                            return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
-                        return [''] * len(row)
-                    
-                    styled_weekly_df = display_weekly_df.style.apply(highlight_weekly_diff, axis=1)
+                    # Weeks that overlap the selected interval
+                    filtered_weekly_df = result_indexes['weekly'].select(**result_filters)
                     
-                    st.dataframe(styled_weekly_df, use_container_width=True)
-                    
-                    # Weekly metrics
-                    week_total_hours = display_weekly_df['Ore Totale'].sum()
-                    week_standard_hours = display_weekly_df['Ore Standard'].sum()
-                    week_diff = week_total_hours - week_standard_hours
-                    
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Ore Săptămânale", f"{week_total_hours:.2f}")
-                    with col2:
-                        st.metric("Standard Săptămânal", f"{week_standard_hours:.2f}")
-                    with col3:
-                        st.metric("Balanță", f"{week_diff:.2f}", 
-                               delta=f"{(week_diff/week_standard_hours*100):.1f}%" if week_standard_hours > 0 else None)
-                    
-                    # Download links
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(get_download_link(filtered_weekly_df, "prezenta_saptamanala_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
-                    with col2:
-                        st.markdown(get_excel_download_link(display_weekly_df, "prezenta_saptamanala_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)"), unsafe_allow_html=True)
-                else:
-                    st.info("Nu există date săptămânale de afișat pentru selecția curentă.")
+                    # Display the DataFrame
+                    if not filtered_weekly_df.empty:
+                        # Create copy for display, dropping unwanted columns
+                        display_weekly_df = filtered_weekly_df.drop(columns=['Departament'])
+                        
+                        # Apply rounding if selected
+                        if rounding_percentage > 0:
+                            display_weekly_df['Ore Totale'] = display_weekly_df['Ore Totale'].apply(
+                                lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
+                            )
+                            # Recalculate difference
+                            display_weekly_df['Diferență'] = display_weekly_df['Ore Totale'] - display_weekly_df['Ore Standard']
+                        
+                        # Format the DataFrame for display
+                        def highlight_weekly_diff(row):
+                            if row['Diferență'] > 0:
+                                return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
+                            elif row['Diferență'] < 0:
+                                return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
+                            return [''] * len(row)
+                        
+                        styled_weekly_df = display_weekly_df.style.apply(highlight_weekly_diff, axis=1)
+                        
+                        with recorder.stage('styling_weekly') as stage_stats:
+                            st.dataframe(styled_weekly_df, use_container_width=True)
+                            stage_stats['rows'] = len(styled_weekly_df.data)
+                        
+                        # Weekly metrics
+                        week_total_hours = display_weekly_df['Ore Totale'].sum()
+                        week_standard_hours = display_weekly_df['Ore Standard'].sum()
+                        week_diff = week_total_hours - week_standard_hours
+                        
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Total Ore Săptămânale", f"{week_total_hours:.2f}")
+                        with col2:
+                            st.metric("Standard Săptămânal", f"{week_standard_hours:.2f}")
+                        with col3:
+                            st.metric("Balanță", f"{week_diff:.2f}", 
+                                   delta=f"{(week_diff/week_standard_hours*100):.1f}%" if week_standard_hours > 0 else None)
+                        
+                        # Download links
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown(get_download_link(filtered_weekly_df, "prezenta_saptamanala_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
+                        with col2:
+                            show_excel_download_button(display_weekly_df, "prezenta_saptamanala_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)")
+                    else:
+                        st.info("Nu există date săptămânale de afișat pentru selecția curentă.")
 
             with tab3:
-                st.markdown("### Prezentare Lunară")
-                
-                # Filter by employee
-                if 'Angajat' in monthly_df.columns:
-                    monthly_employees = sorted(monthly_df['Angajat'].unique())
-                    selected_monthly_employee = st.selectbox("Selectați Angajatul", ['Toți'] + list(monthly_employees), key="monthly_employee")
+                if tab3.open:
+                    st.markdown("### Prezentare Lunară")
                     
-                    if selected_monthly_employee != 'Toți':
-                        filtered_monthly_df = monthly_df[monthly_df['Angajat'] == selected_monthly_employee]
-                    else:
-                        filtered_monthly_df = monthly_df
-                else:
-                    filtered_monthly_df = monthly_df
-                
-                if not filtered_monthly_df.empty:
-                    # Create copy for display, dropping unwanted columns
-                    display_monthly_df = filtered_monthly_df.drop(columns=['Departament'])
-                    
-                    # Apply rounding if selected
-                    if rounding_percentage > 0:
-                        display_monthly_df['Ore Totale'] = display_monthly_df['Ore Totale'].apply(
-                            lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
-                        )
-                        # Recalculate difference
-                        display_monthly_df['Diferență'] = display_monthly_df['Ore Totale'] - display_monthly_df['Ore Standard']
+                    # Months that overlap the selected interval
+                    filtered_monthly_df = result_indexes['monthly'].select(**result_filters)
                     
-                    # Format the DataFrame for display
-                    def highlight_monthly_diff(row):
-                        if row['Diferență'] > 0:
-                            return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
-                        elif row['Diferență'] < 0:
-                            return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
-                        return [''] * len(row)
-                    
-                    styled_monthly_df = display_monthly_df.style.apply(highlight_monthly_diff, axis=1)
-                    
-                    st.dataframe(styled_monthly_df, use_container_width=True)
-                    
-                    # Calculate working days for the selected month-year combination
-                    if 'Luna' in filtered_monthly_df.columns and 'An' in filtered_monthly_df.columns:
-                        # Get unique month-year combinations
-                        month_year_combinations = filtered_monthly_df[['Luna_Nume', 'Luna', 'An']].drop_duplicates()
+                    if not filtered_monthly_df.empty:
+                        # Create copy for display, dropping unwanted columns
+                        display_monthly_df = filtered_monthly_df.drop(columns=['Departament'])
                         
-                        if not month_year_combinations.empty:
-                            # Format options for select box
-                            month_year_options = [f"{row['Luna_Nume']} {row['An']}" for _, row in month_year_combinations.iterrows()]
-                            selected_month_year = st.selectbox("Selectați Luna pentru Analiza Detaliată", month_year_options)
-                            
-                            # Parse selection to get month and year
-                            selected_month_name = selected_month_year.split(' ')[0]
-                            selected_year = int(selected_month_year.split(' ')[1])
-                            
-                            # Map month name to number
-                            month_map = {
-                                'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6,
-                                'July': 7, 'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12
-                            }
+                        # Apply rounding if selected
+                        if rounding_percentage > 0:
+                            display_monthly_df['Ore Totale'] = display_monthly_df['Ore Totale'].apply(
+                                lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
+                            )
+                            # Recalculate difference
+                            display_monthly_df['Diferență'] = display_monthly_df['Ore Totale'] - display_monthly_df['Ore Standard']
+                        
+                        # Format the DataFrame for display
+                        def highlight_monthly_diff(row):
+                            if row['Diferență'] > 0:
+                                return ['background-color: #c6efce; color: #006100' if col == 'Diferență' else '' for col in row.index]
+                            elif row['Diferență'] < 0:
+                                return ['background-color: #ffc7ce; color: #9c0006' if col == 'Diferență' else '' for col in row.index]
+                            return [''] * len(row)
+                        
+                        styled_monthly_df = display_monthly_df.style.apply(highlight_monthly_diff, axis=1)
+                        
+                        with recorder.stage('styling_monthly') as stage_stats:
+                            st.dataframe(styled_monthly_df, use_container_width=True)
+                            stage_stats['rows'] = len(styled_monthly_df.data)
+                        
+                        # Calculate working days for the selected month-year combination
+                        if 'Luna' in filtered_monthly_df.columns and 'An' in filtered_monthly_df.columns:
+                            # Get unique month-year combinations
+                            month_year_combinations = filtered_monthly_df[['Luna_Nume', 'Luna', 'An']].drop_duplicates()
                             
-                            if selected_month_name in month_map:
-                                month_num = month_map[selected_month_name]
+                            if not month_year_combinations.empty:
+                                # Format options for select box
+                                month_year_options = (month_year_combinations['Luna_Nume'].astype(str) + ' '
+                                                      + month_year_combinations['An'].astype(str)).tolist()
+                                selected_month_year = st.selectbox("Selectați Luna pentru Analiza Detaliată", month_year_options)
                                 
-                                # Calculate working days and standard hours dynamically
-                                working_days = calculate_working_days(selected_year, month_num)
-                                standard_hours = calculate_standard_monthly_hours(selected_year, month_num)
+                                # Month and year of the selected option
+                                selected_period = month_year_combinations.iloc[month_year_options.index(selected_month_year)]
+                                selected_year = int(selected_period['An'])
+                                month_num = int(selected_period['Luna'])
+                                
+                                # Working days and standard hours follow the schedule of the department
+                                month_departments = sorted(filtered_monthly_df.loc[
+                                    (filtered_monthly_df['Luna'] == month_num) & (filtered_monthly_df['An'] == selected_year),
+                                    'Departament'].astype(str).unique())
+                                schedule_department = None
+                                if len(month_departments) == 1:
+                                    schedule_department = month_departments[0]
+                                elif len(month_departments) > 1:
+                                    schedule_department = st.selectbox("Departament pentru Programul de Lucru", month_departments)
+                                working_days = calculate_working_days(selected_year, month_num, schedule_department)
+                                standard_hours = calculate_standard_monthly_hours(selected_year, month_num, schedule_department)
                                 
                                 # First and last day of the month
                                 first_day = date(selected_year, month_num, 1)
@@ -832,336 +822,94 @@ if uploaded_file is not None:
                                         month_diff = total_month_hours - total_month_standard
                                         st.metric("Balanță Lunară", f"{month_diff:.1f}", 
                                                delta=f"{(month_diff/total_month_standard*100):.1f}%" if total_month_standard > 0 else None)
-                    
-                    # Download links
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(get_download_link(filtered_monthly_df, "prezenta_lunara_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
-                    with col2:
-                        st.markdown(get_excel_download_link(display_monthly_df, "prezenta_lunara_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)"), unsafe_allow_html=True)
-                else:
-                    st.info("Nu există date lunare de afișat pentru selecția curentă.")
-
-            with tab4:
-                st.markdown("### Vizualizări")
-                
-                if not daily_df.empty:
-                    # Filter by employee
-                    if 'Angajat' in daily_df.columns:
-                        viz_employees = sorted(daily_df['Angajat'].unique())
-                        selected_viz_employee = st.selectbox("Selectați Angajatul", ['Toți'] + list(viz_employees), key="viz_employee")
                         
-                        if selected_viz_employee != 'Toți':
-                            filtered_viz_df = daily_df[daily_df['Angajat'] == selected_viz_employee]
-                        else:
-                            filtered_viz_df = daily_df
+                        # Download links
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown(get_download_link(filtered_monthly_df, "prezenta_lunara_original.csv", "📥 Descărcați Date Originale (CSV)"), unsafe_allow_html=True)
+                        with col2:
+                            show_excel_download_button(display_monthly_df, "prezenta_lunara_afisate.xlsx", "📥 Descărcați Date Afișate (Excel)")
                     else:
-                        filtered_viz_df = daily_df
+                        st.info("Nu există date lunare de afișat pentru selecția curentă.")
+
+            with tab4:
+                if tab4.open:
+                    st.markdown("### Vizualizări")
                     
-                    # Apply rounding for visualization if selected
-                    viz_df = filtered_viz_df.copy()
-                    if rounding_percentage > 0:
-                        viz_df['Durata (Ore)'] = viz_df.apply(
-                            lambda row: round(row['Durata (Ore)'] * (1 + rounding_percentage/100), 2) if row['Durata (Ore)'] > 0 else row['Durata (Ore)'],
-                            axis=1
+                    if not daily_df.empty:
+                        # Per-employee charts when exactly one employee is selected
+                        selected_viz_employee = selected_result_employees[0] if len(selected_result_employees) == 1 else 'Toți'
+                        filtered_viz_df = result_indexes['daily'].select(**result_filters)
+                        filtered_viz_weekly_df = result_indexes['weekly'].select(**result_filters)
+                        
+                        # The filtered rows are identified by the upload's data hash and the filter values
+                        viz_dataset_hash = (job.result_hash,) + tuple(
+                            tuple(value) if isinstance(value, list) else value for value in result_filters.values()
                         )
-                    
-                    # Select visualization type
-                    viz_type = st.selectbox(
-                        "Selectați Vizualizarea", 
-                        ["Ore Zilnice per Angajat", "Comparație Săptămânală", "Distribuția Orelor de Sosire", "Distribuția Orelor de Plecare", "Prezența Zilnică"]
-                    )
-                    
-                    try:
-                        if viz_type == "Ore Zilnice per Angajat":
-                            # If filtering by employee, show day by day data
-                            if selected_viz_employee != 'Toți':
-                                daily_emp_df = viz_df.groupby('Data')['Durata (Ore)'].sum().reset_index()
-                                daily_std_df = viz_df.groupby('Data')['Ore Standard'].sum().reset_index()
-                                
-                                daily_merged = pd.merge(daily_emp_df, daily_std_df, on='Data')
-                                
-                                # Sort by date if available
-                                if 'Data_Obiect' in viz_df.columns:
-                                    date_mapping = dict(zip(viz_df['Data'], viz_df['Data_Obiect']))
-                                    daily_merged['Data_Obiect'] = daily_merged['Data'].map(date_mapping)
-                                    daily_merged = daily_merged.sort_values('Data_Obiect')
-                                
-                                fig = px.bar(
-                                    daily_merged,
-                                    x='Data',
-                                    y=['Durata (Ore)', 'Ore Standard'],
-                                    barmode='group',
-                                    title=f"Ore Zilnice Lucrate: {selected_viz_employee}",
-                                    labels={"value": "Ore", "Data": "Data", "variable": "Tip"},
-                                    height=500,
-                                    color_discrete_map={'Durata (Ore)': '#4CAF50', 'Ore Standard': '#2196F3'}
-                                )
-                                
-                                st.plotly_chart(fig, use_container_width=True)
-                            else:
-                                # Group by employee and date
-                                pivot_df = viz_df.pivot_table(
-                                    index='Data', 
-                                    columns='Angajat', 
-                                    values='Durata (Ore)',
-                                    aggfunc='sum'
-                                ).fillna(0)
-                                
-                                # Sort pivot table by date if possible
-                                date_obj_map = {}
-                                for date_str, date_obj in zip(viz_df['Data'], viz_df['Data_Obiect']):
-                                    if date_str not in date_obj_map and date_obj is not None:
-                                        date_obj_map[date_str] = date_obj
-                                
-                                if date_obj_map:
-                                    pivot_df['sort_key'] = pd.Series(date_obj_map)
-                                    pivot_df = pivot_df.sort_values('sort_key').drop('sort_key', axis=1)
-                                
-                                # Create bar chart
-                                fig = px.bar(
-                                    pivot_df, 
-                                    barmode='group',
-                                    title="Ore Zilnice Lucrate per Angajat",
-                                    labels={"value": "Ore", "Data": "Data", "variable": "Angajat"},
-                                    height=600
-                                )
-                                
-                                st.plotly_chart(fig, use_container_width=True)
-                            
-                        elif viz_type == "Comparație Săptămânală":
-                            # Filter weekly df based on selected employee
-                            if selected_viz_employee != 'Toți':
-                                filtered_weekly_viz = weekly_df[weekly_df['Angajat'] == selected_viz_employee]
-                            else:
-                                filtered_weekly_viz = weekly_df
-                            
-                            if not filtered_weekly_viz.empty:
-                                # Apply rounding if selected
-                                weekly_viz_df = filtered_weekly_viz.copy()
-                                if rounding_percentage > 0:
-                                    weekly_viz_df['Ore Totale'] = weekly_viz_df['Ore Totale'].apply(
-                                        lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
-                                    )
-                                    weekly_viz_df['Diferență'] = weekly_viz_df['Ore Totale'] - weekly_viz_df['Ore Standard']
-                                
-                                # Create comparison chart
-                                weekly_comp_fig = px.bar(
-                                    weekly_viz_df,
-                                    x='Angajat' if selected_viz_employee == 'Toți' else 'Interval',
-                                    y=['Ore Totale', 'Ore Standard'],
-                                    barmode='group',
-                                    title="Ore Săptămânale: Efectiv vs. Standard",
-                                    labels={"value": "Ore", "variable": "Categorie"},
-                                    height=500,
-                                    color_discrete_map={'Ore Totale': '#4CAF50', 'Ore Standard': '#2196F3'}
-                                )
-                                
-                                st.plotly_chart(weekly_comp_fig, use_container_width=True)
-                                
-                                # Create difference chart
-                                weekly_diff_fig = px.bar(
-                                    weekly_viz_df,
-                                    x='Angajat' if selected_viz_employee == 'Toți' else 'Interval',
-                                    y='Diferență',
-                                    title="Diferența de Ore față de Programul Standard",
-                                    labels={"Diferență": "Ore +/-"},
-                                    color='Diferență',
-                                    color_continuous_scale=["red", "yellow", "green"],
-                                    height=500
-                                )
-                                
-                                weekly_diff_fig.add_hline(y=0, line_width=2, line_dash="dash", line_color="gray")
-                                
-                                st.plotly_chart(weekly_diff_fig, use_container_width=True)
-                            else:
-                                st.warning("Nu există date săptămânale pentru vizualizare.")
-                            
-                        elif viz_type == "Distribuția Orelor de Sosire":
-                            # Convert time strings to numeric for visualization
-                            arrival_df = viz_df.copy()
-                            arrival_df['Ora Sosire (Numeric)'] = arrival_df['Ora Sosire'].apply(
-                                lambda x: int(x.split(':')[0]) + int(x.split(':')[1])/60 if isinstance(x, str) and ':' in x else None
-                            )
-                            
-                            # Filter out None values
-                            arrival_df = arrival_df.dropna(subset=['Ora Sosire (Numeric)'])
-                            
-                            if not arrival_df.empty:
-                                # Create arrival time histogram
-                                if selected_viz_employee != 'Toți':
-                                    arrival_fig = px.histogram(
-                                        arrival_df,
-                                        x='Ora Sosire (Numeric)',
-                                        nbins=24,
-                                        range_x=[6, 12],  # Focus on 6 AM to 12 PM
-                                        title=f"Distribuția Orelor de Sosire pentru {selected_viz_employee}",
-                                        labels={"Ora Sosire (Numeric)": "Ora Zilei", "count": "Frecvență"},
-                                        height=500,
-                                        color_discrete_sequence=['#2196F3']
-                                    )
-                                else:
-                                    arrival_fig = px.histogram(
-                                        arrival_df,
-                                        x='Ora Sosire (Numeric)',
-                                        color='Angajat',
-                                        nbins=24,
-                                        range_x=[6, 12],  # Focus on 6 AM to 12 PM
-                                        title="Distribuția Orelor de Sosire",
-                                        labels={"Ora Sosire (Numeric)": "Ora Zilei", "count": "Frecvență"},
-                                        height=500
-                                    )
-                                
-                                # Add reference line for standard start time (8:30 AM)
-                                arrival_fig.add_vline(x=8.5, line_width=2, line_dash="dash", line_color="red", annotation_text="Ora Standard de Început (8:30)")
-                                
-                                st.plotly_chart(arrival_fig, use_container_width=True)
-                            else:
-                                st.warning("Nu există date de sosire pentru vizualizare.")
-                            
-                        elif viz_type == "Distribuția Orelor de Plecare":
-                            # Convert time strings to numeric for visualization
-                            departure_df = viz_df.copy()
-                            departure_df['Ora Plecare (Numeric)'] = departure_df['Ora Plecare'].apply(
-                                lambda x: int(x.split(':')[0]) + int(x.split(':')[1])/60 if isinstance(x, str) and ':' in x else None
-                            )
-                            
-                            # Filter out None values
-                            departure_df = departure_df.dropna(subset=['Ora Plecare (Numeric)'])
-                            
-                            if not departure_df.empty:
-                                # Create departure time histogram
-                                if selected_viz_employee != 'Toți':
-                                    departure_fig = px.histogram(
-                                        departure_df,
-                                        x='Ora Plecare (Numeric)',
-                                        nbins=24,
-                                        range_x=[14, 20],  # Focus on 2 PM to 8 PM
-                                        title=f"Distribuția Orelor de Plecare pentru {selected_viz_employee}",
-                                        labels={"Ora Plecare (Numeric)": "Ora Zilei", "count": "Frecvență"},
-                                        height=500,
-                                        color_discrete_sequence=['#4CAF50']
-                                    )
-                                else:
-                                    departure_fig = px.histogram(
-                                        departure_df,
-                                        x='Ora Plecare (Numeric)',
-                                        color='Angajat',
-                                        nbins=24,
-                                        range_x=[14, 20],  # Focus on 2 PM to 8 PM
-                                        title="Distribuția Orelor de Plecare",
-                                        labels={"Ora Plecare (Numeric)": "Ora Zilei", "count": "Frecvență"},
-                                        height=500
-                                    )
-                                
-                                # Add reference lines for standard end times
-                                departure_fig.add_vline(x=17, line_width=2, line_dash="dash", line_color="red", annotation_text="Sfârșit Luni-Joi (17:00)")
-                                departure_fig.add_vline(x=14.5, line_width=2, line_dash="dash", line_color="orange", annotation_text="Sfârșit Vineri (14:30)")
-                                
-                                st.plotly_chart(departure_fig, use_container_width=True)
-                            else:
-                                st.warning("Nu există date de plecare pentru vizualizare.")
-                                
-                        elif viz_type == "Prezența Zilnică":
-                            # Create daily presence chart
-                            presence_df = viz_df.copy()
-                            
-                            # Add status column (present/absent)
-                            presence_df['Status'] = presence_df['Durata (Ore)'].apply(
-                                lambda x: 'Prezent' if x > 0 else 'Absent'
-                            )
-                            
-                            # Create pivot for heatmap
-                            if 'Data' in presence_df.columns and 'Angajat' in presence_df.columns:
-                                # Ensure consistent date format
-                                if 'Data_Obiect' in presence_df.columns:
-                                    presence_df = presence_df.sort_values('Data_Obiect')
+                        
+                        # Chart libraries are only imported once a visualization is shown
+                        from charts import VIZ_TYPES, get_viz_figures
+                        
+                        # Select visualization type
+                        viz_type = st.selectbox("Selectați Vizualizarea", VIZ_TYPES)
+                        
+                        try:
+                            with recorder.stage('charts') as stage_stats:
+                                # Rounding and figure building only run when this chart is not cached
+                                figures = get_viz_figures(viz_type, filtered_viz_df, filtered_viz_weekly_df, selected_viz_employee,
+                                                          rounding_percentage, viz_dataset_hash)
                                 
-                                # Create presence heatmap
-                                if selected_viz_employee != 'Toți':
-                                    # For single employee, show date vs. status
-                                    pivot_presence = presence_df.pivot_table(
-                                        index='Data',
-                                        values='Durata (Ore)',
-                                        aggfunc='sum'
-                                    ).fillna(0)
-                                    
-                                    # Create heatmap
-                                    presence_heatmap = px.imshow(
-                                        pivot_presence,
-                                        title=f"Prezența Zilnică pentru {selected_viz_employee}",
-                                        labels=dict(x="Data", color="Ore"),
-                                        color_continuous_scale=["white", "yellow", "green"],
-                                        height=300
-                                    )
+                                if figures:
+                                    for fig in figures:
+                                        st.plotly_chart(fig, use_container_width=True)
                                 else:
-                                    # For all employees, show employee vs. date
-                                    pivot_presence = presence_df.pivot_table(
-                                        index='Angajat',
-                                        columns='Data',
-                                        values='Durata (Ore)',
-                                        aggfunc='sum'
-                                    ).fillna(0)
-                                    
-                                    # Create heatmap
-                                    presence_heatmap = px.imshow(
-                                        pivot_presence,
-                                        title="Prezența Zilnică per Angajat",
-                                        labels=dict(x="Data", y="Angajat", color="Ore"),
-                                        color_continuous_scale=["white", "yellow", "green"],
-                                        height=400
-                                    )
-                                
-                                st.plotly_chart(presence_heatmap, use_container_width=True)
-                                
-                                # Create bar chart for daily presence
-                                try:
-                                    if selected_viz_employee != 'Toți':
-                                        # For single employee
-                                        daily_presence = presence_df.groupby('Data')['Durata (Ore)'].sum().reset_index()
-                                        daily_std = presence_df.groupby('Data')['Ore Standard'].sum().reset_index()
-                                    else:
-                                        # For all employees
-                                        daily_presence = viz_df.groupby('Data')['Durata (Ore)'].sum().reset_index()
-                                        daily_std = viz_df.groupby('Data')['Ore Standard'].sum().reset_index()
-                                    
-                                    daily_combined = pd.merge(daily_presence, daily_std, on='Data', suffixes=('_Actual', '_Standard'))
-                                    
-                                    daily_combined_clean = daily_combined.dropna(subset=['Data', 'Durata (Ore)_Actual', 'Ore Standard_Standard']).drop_duplicates(subset=['Data'])
-                                    daily_combined_clean['Durata (Ore)_Actual'] = pd.to_numeric(daily_combined_clean['Durata (Ore)_Actual'], errors='coerce').fillna(0)
-                                    daily_combined_clean['Ore Standard_Standard'] = pd.to_numeric(daily_combined_clean['Ore Standard_Standard'], errors='coerce').fillna(0)
-
-                                    if not daily_combined_clean.empty:
-                                        # Sort by date if possible
-                                        if 'Data_Obiect' in viz_df.columns:
-                                            date_mapping = dict(zip(viz_df['Data'], viz_df['Data_Obiect']))
-                                            daily_combined_clean['Data_Obiect'] = daily_combined_clean['Data'].map(date_mapping)
-                                            daily_combined_clean = daily_combined_clean.sort_values('Data_Obiect')
-                                        
-                                        daily_bar = px.bar(
-                                            daily_combined_clean,
-                                            x='Data',
-                                            y=['Durata (Ore)_Actual', 'Ore Standard_Standard'],
-                                            barmode='group',
-                                            title="Ore Lucrate vs. Standard pe Zile",
-                                            labels={"value": "Ore", "variable": "Tip"},
-                                            height=400,
-                                            color_discrete_map={'Durata (Ore)_Actual': '#4CAF50', 'Ore Standard_Standard': '#2196F3'}
-                                        )
-                                        
-                                        st.plotly_chart(daily_bar, use_container_width=True)
-                                    else:
-                                        st.warning("⚠️ Nu există suficiente date valide pentru generarea graficului zilnic.")
-                                except Exception as e:
-                                    st.error(f"Eroare la generarea graficului zilnic: {e}")
-                    except Exception as e:
-                        st.error(f"Eroare la generarea vizualizărilor: {e}")
-                        st.exception(e)
-                else:
-                    st.info("Încărcați date pentru a vizualiza grafice.")
+                                    st.warning(VIZ_EMPTY_MESSAGES.get(viz_type, "Nu există date pentru vizualizare."))
+                                stage_stats['rows'] = len(filtered_viz_df)
+                        except Exception as e:
+                            st.error(f"Eroare la generarea vizualizărilor: {e}")
+                            st.exception(e)
+                    else:
+                        st.info("Încărcați date pentru a vizualiza grafice.")
+            
+            # ZIP bundle of the filtered rows for BI tools (Power BI, Tableau, DuckDB...)
+            with st.expander("📦 Export pentru BI"):
+                bundle_format = st.radio("Format", list(BUNDLE_FORMATS), horizontal=True, key="bundle_format")
+                st.caption("Arhiva conține tabelele zilnic, săptămânal și lunar cu filtrele de mai sus, plus manifest.json cu schema lor.")
+                show_bundle_download_button({
+                    'daily': result_indexes['daily'].select(**result_filters),
+                    'weekly': result_indexes['weekly'].select(**result_filters),
+                    'monthly': result_indexes['monthly'].select(**result_filters),
+                }, bundle_format, {'source': 'upload', 'date_range': date_range, 'filters': result_filters})
     except Exception as e:
         st.error(f"A apărut o eroare: {e}")
         st.exception(e)
+    finally:
+        recorder.close()
+        if profiler:
+            profiler.disable()
+            st.session_state.profile_dump = profile_to_bytes(profiler)
+            st.session_state.profile_text = profile_summary(profiler)
+    
+    # Diagnostics panel: stage timings of this run and an optional cProfile dump
+    if diagnostics_enabled:
+        with st.expander("🔧 Diagnostic Performanță"):
+            if recorder.records:
+                diagnostics_df = recorder.to_frame()
+                st.dataframe(diagnostics_df, use_container_width=True)
+                st.metric("Durată Totală (s)", f"{diagnostics_df['Durată (s)'].sum():.3f}")
+            
+            if st.button("Profilează următoarea rulare (cProfile)", key="profile_button"):
+                st.session_state.profile_next_run = True
+                st.rerun()
+            
+            if 'profile_dump' in st.session_state:
+                st.download_button(
+                    "📥 Descărcați Profilul (.prof)",
+                    data=st.session_state.profile_dump,
+                    file_name="prezenta_profil.prof",
+                    mime="application/octet-stream"
+                )
+                st.text(st.session_state.profile_text)
 else:
     # Display example data and instructions
     st.info("📌 Vă rugăm să încărcați un fișier Excel (.xlsx) sau CSV care conține datele de prezență ale angajaților.")
@@ -1180,7 +928,17 @@ else:
     24 March,25 March,26 March,27 March,28 March,,
     08:26 - 17:26,09:00 - 17:10,08:58 - 17:15,08:37 - 17:11,,,
     ```
-    
+
+    În modul **Evenimente Brute** se încarcă exportul de citiri de card al sistemului de acces (CSV, o linie per citire):
+
+    ```
+    badge,timestamp,door
+    101A23,2025-03-24 08:26:12,Intrare
+    101A23,2025-03-24 17:26:40,Intrare
+    ```
+
+    Citirile aflate una de alta la mai puțin decât cea mai lungă tură din programul de lucru plus 2 ore (minimum 11 ore) formează o tură (inclusiv ture de noapte), iar tura se atribuie zilei în care începe. Angajatul și departamentul se preiau din istoric după legitimație; citirile legitimațiilor care nu apar în istoric sunt raportate ca probleme și nu se salvează.
+
     ### Funcționalități
     
     - **Procesare Automată a Datelor**: Extrage datele de prezență ale angajaților și calculează orele lucrate
@@ -1195,29 +953,97 @@ else:
 # Footer
 st.markdown("---")
 st.markdown("### 📋 Ore Standard de Lucru")
-st.markdown("""
-- **Luni-Joi**: 08:30 - 17:00 (8.5 ore)
-- **Vineri**: 08:30 - 14:30 (6 ore)
-- **Sâmbătă-Duminică**: Zile libere
-""")
+# The program shown is the default schedule in effect today; department programs are listed under Programe de Lucru
+try:
+    default_policy = get_compiled_schedules().get_policy(date.today())
+    shift_groups = group_weekly_shifts(default_policy) if default_policy is not None else []
+except Exception as e:
+    st.warning(f"Nu s-a putut afișa programul de lucru: {e}")
+    shift_groups = []
+if shift_groups:
+    st.markdown("\n".join(
+        f"- **{days_label}**: {shift[0]} - {shift[1]} ({hours:g} ore)" if shift is not None
+        else f"- **{days_label}**: {'Zi liberă' if day_count == 1 else 'Zile libere'}"
+        for days_label, day_count, shift, hours in shift_groups
+    ))
+else:
+    st.info("Nu există un program de lucru implicit în vigoare.")
 
 # Display information about working day calculation
 with st.expander("ℹ️ Calculul Zilelor Lucrătoare"):
-    st.markdown("""
-    **Regulile pentru calculul zilelor lucrătoare**:
-    
-    1. Zilele de Luni-Vineri sunt considerate zile lucrătoare
-    2. Zilele de Sâmbătă-Duminică sunt considerate zile libere
-    3. Sărbătorile legale din România sunt excluse din calculul zilelor lucrătoare
-    4. Orele standard pentru zilele lucrătoare sunt:
-        - Luni-Joi: 8.5 ore (8 ore și 30 minute)
-        - Vineri: 6 ore
-    
-    **Exemplu de calcul pentru o săptămână completă (5 zile lucrătoare)**:
-    - 4 zile x 8.5 ore = 34 ore
-    - 1 zi x 6 ore = 6 ore
-    - Total: 40 ore
-    """)
+    working_groups = [group for group in shift_groups if group[2] is not None]
+    st.markdown("\n".join([
+        "**Regulile pentru calculul zilelor lucrătoare**:",
+        "",
+        "1. Zilele cu tură în programul de lucru sunt considerate zile lucrătoare",
+        "2. Celelalte zile ale săptămânii sunt considerate zile libere",
+        "3. Sărbătorile legale din România sunt excluse din calculul zilelor lucrătoare",
+        "4. Orele standard pentru zilele lucrătoare sunt:",
+        *[f"    - {days_label}: {hours:g} ore" for days_label, _, _, hours in working_groups],
+        "",
+        f"**Exemplu de calcul pentru o săptămână completă ({sum(group[1] for group in working_groups)} zile lucrătoare)**:",
+        *[f"- {day_count} {'zi' if day_count == 1 else 'zile'} x {hours:g} ore = {day_count * hours:g} ore"
+          for _, day_count, _, hours in working_groups],
+        f"- Total: {sum(day_count * hours for _, day_count, _, hours in working_groups):g} ore",
+        "",
+        "Departamentele și legitimațiile cu program propriu sunt listate la **Programe de Lucru**.",
+    ]))
+
+# Display the work schedule policies in effect (data/schedules.json when present)
+with st.expander("🕘 Programe de Lucru"):
+    try:
+        st.markdown(f"Programele se definesc în `{SCHEDULES_PATH}`. Programul pe legitimație are prioritate față de cel pe departament, iar acesta față de programul implicit.")
+        st.caption("După modificarea programelor sau a sărbătorilor legale, rulați `python recompute.py` pentru a recalcula orele standard din istoric.")
+        st.dataframe(get_compiled_schedules().describe(), use_container_width=True)
+    except Exception as e:
+        st.warning(f"Nu s-au putut afișa programele de lucru: {e}")
+
+# Leave and sick-leave records: days inside an interval are not owed standard hours
+with st.expander("🏖️ Concedii și Absențe Motivate"):
+    try:
+        st.markdown(f"Fișier CSV cu coloanele **Angajat**, **Început**, **Sfârșit** și opțional **Tip** "
+                    f"(ex. Concediu odihnă, Concediu medical). Înregistrările se păstrează în `{LEAVE_PATH}`.")
+        leave_file = st.file_uploader("Încărcați concediile (CSV)", type=['csv'], key="leave_file")
+        if leave_file is not None:
+            leave_records, leave_issues = read_leave_records(leave_file)
+            if leave_issues:
+                st.warning(f"⚠️ {len(leave_issues)} înregistrări invalide au fost ignorate.")
+                st.dataframe(pd.DataFrame(leave_issues), use_container_width=True, hide_index=True)
+            st.dataframe(leave_records, use_container_width=True, hide_index=True)
+            unmatched_employees = find_unmatched_employees(leave_records, historical_df['Angajat'].unique() if not historical_df.empty else [])
+            if unmatched_employees:
+                st.warning(f"⚠️ Angajați care nu apar în istoric (numele trebuie scris ca în raport, ex. „Nume Prenume 123”): {', '.join(unmatched_employees)}")
+            
+            recompute_job = st.session_state.get('leave_recompute_job')
+            recompute_running = recompute_job is not None and not recompute_job.finished
+            if st.button(f"Importați {len(leave_records)} înregistrări", key="leave_import", disabled=leave_records.empty or recompute_running):
+                save_leave_records(leave_records)
+                st.success(f"✅ {len(leave_records)} înregistrări de concediu au fost salvate.")
+                # Stored days are recomputed with the new leave days in the background
+                recompute_job = RecomputeJob()
+                recompute_job.start()
+                st.session_state.leave_recompute_job = recompute_job
+                st.session_state.leave_recompute_pending = True
+        
+        # The save and the recompute are separate outcomes: saved records stay saved when the recompute fails
+        recompute_job = st.session_state.get('leave_recompute_job')
+        if recompute_job is not None:
+            if not recompute_job.finished:
+                show_recompute_progress(recompute_job)
+            elif recompute_job.error is not None:
+                st.error(f"Concediile sunt salvate, dar istoricul nu a putut fi recalculat: {recompute_job.error}. "
+                         f"Rulați `python recompute.py` pentru a-l recalcula.")
+            else:
+                history_rows, changed_rows = recompute_job.result
+                st.success(f"✅ Istoricul a fost recalculat în {recompute_job.seconds:.1f} s: "
+                           f"{changed_rows} din {history_rows} zile au alte ore standard.")
+        
+        stored_leave = load_leave_records()
+        if not stored_leave.empty:
+            st.caption(f"{len(stored_leave)} înregistrări de concediu salvate")
+            st.dataframe(stored_leave, use_container_width=True, hide_index=True)
+    except Exception as e:
+        st.warning(f"Nu s-au putut importa concediile: {e}")
 
 # Display information about holidays
 with st.expander("📅 Sărbători Legale"):
@@ -1225,49 +1051,13 @@ with st.expander("📅 Sărbători Legale"):
         # Determine which years to show based on data and current year
         years_to_show = [datetime.now().year, datetime.now().year + 1]
         
-        all_holidays = {}
-        for year in years_to_show:
-            holidays = get_holidays_for_year(year)
-            all_holidays[year] = holidays
-        
         # Create tabs for each year
         year_tabs = st.tabs([str(year) for year in years_to_show])
         
         for i, year in enumerate(years_to_show):
             with year_tabs[i]:
-                if year in all_holidays and all_holidays[year]:
-                    # Generate descriptions based on dates
-                    descriptions = []
-                    for holiday_date in all_holidays[year]:
-                        month_day = holiday_date[5:]  # Gets MM-DD
-                        
-                        # Map common Romanian holidays
-                        if month_day == "01-01":
-                            descriptions.append("Anul Nou")
-                        elif month_day == "01-02":
-                            descriptions.append("A doua zi după Anul Nou")
-                        elif month_day == "01-24":
-                            descriptions.append("Ziua Unirii Principatelor Române")
-                        elif month_day == "05-01":
-                            descriptions.append("Ziua Muncii")
-                        elif month_day == "08-15":
-                            descriptions.append("Adormirea Maicii Domnului")
-                        elif month_day == "11-30":
-                            descriptions.append("Sfântul Andrei")
-                        elif month_day == "12-01":
-                            descriptions.append("Ziua Națională a României")
-                        elif month_day == "12-25":
-                            descriptions.append("Crăciunul")
-                        elif month_day == "12-26":
-                            descriptions.append("A doua zi de Crăciun")
-                        else:
-                            descriptions.append("Sărbătoare legală")
-                    
-                    holidays_df = pd.DataFrame({
-                        "Data": all_holidays[year],
-                        "Descriere": descriptions
-                    })
-                    
+                holidays_df = get_holiday_table(year)
+                if not holidays_df.empty:
                     st.dataframe(holidays_df, use_container_width=True)
                 else:
                     st.info(f"Nu există informații despre sărbătorile legale pentru anul {year}")
@@ -0,0 +1,1120 @@
+import csv
+import io
+import logging
+import os
+import re
+import threading
+import time
+import calendar
+from contextlib import contextmanager
+from datetime import datetime, timedelta, date
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.ipc as ipc
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: history writes are serialized within the process only
+    fcntl = None
+
+from diagnostics import StageRecorder
+from leave import get_leave_calendar
+from schedules import get_compiled_schedules
+
+logger = logging.getLogger(__name__)
+
+# History storage: raw daily rows and the pre-aggregated employee-month cube
+# History is an uncompressed Arrow IPC (Feather v2) file so every worker process can memory-map it
+HISTORY_PATH = 'data/attendance_history.arrow'
+# History written before the Arrow format; converted on first load
+LEGACY_HISTORY_PATH = 'data/attendance_history.csv'
+CUBE_PATH = 'data/attendance_cube.csv'
+# Cumulative hour balance of every employee at the end of each month with data
+LEDGER_PATH = 'data/attendance_ledger.csv'
+
+# Rewritten after every history save; readers compare it to know when their copy is stale
+HISTORY_VERSION_PATH = 'data/history.version'
+# Lock file held while the history files are written, shared by the app, API and recompute processes
+HISTORY_LOCK_PATH = 'data/history.lock'
+# Content hashes of the imported report files (see ingest_ledger.py); they describe the rows of
+# this history, so the ledger is removed when a new history is started
+INGEST_LEDGER_PATH = 'data/ingest_ledger.json'
+CUBE_COLUMNS = ['Angajat', 'Departament', 'An', 'Luna', 'Ore Totale', 'Ore Standard', 'Diferență',
+                'Zile Lucrate', 'Absențe', 'Întârzieri']
+WEEKLY_HISTORY_COLUMNS = ['Angajat', 'Departament', 'An', 'Săptămână', 'Interval', 'Început', 'Sfârșit',
+                          'Ore Totale', 'Ore Standard', 'Diferență']
+LEDGER_COLUMNS = ['Angajat', 'Departament', 'An', 'Luna', 'Diferență', 'Sold Cumulat']
+CUBE_KEY_COLUMNS = ['Angajat', 'Departament', 'An', 'Luna']
+WEEKLY_KEY_COLUMNS = ['Angajat', 'An', 'Săptămână']
+WEEKLY_AGGREGATIONS = {'Departament': 'first', 'Început': 'min', 'Sfârșit': 'max', 'Ore Totale': 'sum', 'Ore Standard': 'sum'}
+
+# History columns read by the chunked aggregations
+CUBE_INPUT_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Data_Obiect', 'Ora Sosire', 'Durata (Ore)', 'Ore Standard']
+WEEKLY_INPUT_COLUMNS = ['Angajat', 'Departament', 'Data_Obiect', 'Durata (Ore)', 'Ore Standard']
+
+# Memory the chunked aggregations may use for one history chunk and its temporaries
+HISTORY_MEMORY_BUDGET_MB = 256
+# Bytes of pandas frames and temporaries per byte of Arrow data in a chunk (object strings,
+# facts frame, groupby buffers), used to turn the budget into rows per chunk
+CHUNK_MEMORY_FACTOR = 12
+MIN_CHUNK_ROWS = 10_000
+
+# Daily attendance frame schema: column order, categorical labels and float32 hours
+DAILY_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Zi', 'Data', 'Data_Obiect',
+                 'Ora Sosire', 'Ora Plecare', 'Durata (Ore)', 'Ore Standard', 'Diferență',
+                 'Concediu', 'An', 'Luna', 'Luna_Nume', 'Săptămână']
+DAILY_CATEGORY_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Concediu']
+DAILY_HOUR_COLUMNS = ['Durata (Ore)', 'Ore Standard', 'Diferență']
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# Standard start of the working day (08:30), in minutes since midnight
+STANDARD_START_MINUTES = 8 * 60 + 30
+
+# Romanian holidays by year
+ROMANIAN_HOLIDAYS = {
+    2024: [
+        "2024-01-01", "2024-01-02", "2024-01-24", 
+        "2024-05-01", "2024-05-03", "2024-05-05", "2024-05-06",
+        "2024-06-23", "2024-06-24", "2024-08-15",
+        "2024-11-30", "2024-12-01", "2024-12-25", "2024-12-26"
+    ],
+    2025: [
+        "2025-01-01", "2025-01-02", "2025-01-24",
+        "2025-04-18", "2025-04-20", "2025-04-21",
+        "2025-05-01", "2025-06-08", "2025-06-09",
+        "2025-08-15", "2025-11-30", "2025-12-01",
+        "2025-12-25", "2025-12-26"
+    ]
+}
+# Names of the fixed-date holidays by "MM-DD"; the others are shown as "Sărbătoare legală"
+HOLIDAY_NAMES = {
+    "01-01": "Anul Nou",
+    "01-02": "A doua zi după Anul Nou",
+    "01-24": "Ziua Unirii Principatelor Române",
+    "05-01": "Ziua Muncii",
+    "08-15": "Adormirea Maicii Domnului",
+    "11-30": "Sfântul Andrei",
+    "12-01": "Ziua Națională a României",
+    "12-25": "Crăciunul",
+    "12-26": "A doua zi de Crăciun",
+}
+
+# Function to get holidays for a specific year
+def get_holidays_for_year(year):
+    if year in ROMANIAN_HOLIDAYS:
+        return ROMANIAN_HOLIDAYS[year]
+    
+    # If we don't have data for the requested year, extrapolate from 2025
+    extrapolated_holidays = []
+    for holiday in ROMANIAN_HOLIDAYS[2025]:
+        parts = holiday.split('-')
+        if len(parts) == 3:
+            new_date = f"{year}-{parts[1]}-{parts[2]}"
+            extrapolated_holidays.append(new_date)
+    return extrapolated_holidays
+
+# Function to map the holidays of a year to their descriptions
+def get_holiday_descriptions(year):
+    return {holiday: HOLIDAY_NAMES.get(holiday[5:], "Sărbătoare legală") for holiday in get_holidays_for_year(year)}
+
+# Function to check if a date is a holiday
+def is_holiday(check_date):
+    year = check_date.year
+    date_str = check_date.strftime("%Y-%m-%d")
+    return date_str in get_holidays_for_year(year)
+
+# Function to flag the dates that are legal holidays
+def get_holiday_mask(dates):
+    days = pd.to_datetime(pd.Series(dates), errors='coerce').dt.normalize()
+    years = days.dt.year.dropna().unique()
+    holiday_days = pd.to_datetime([holiday for year in years for holiday in get_holidays_for_year(int(year))])
+    return days.isin(holiday_days).to_numpy()
+
+# Function to look up scheduled hours (zero on holidays) and shift start minutes
+def get_scheduled_hours(dates, departments=None, badges=None):
+    hours, start_minutes = get_compiled_schedules().lookup(dates, departments, badges)
+    hours = np.where(get_holiday_mask(dates), 0, hours).astype('float32')
+    return hours, start_minutes
+
+# Function to look up the scheduled hours of every day in a month
+def get_month_schedule(year, month, department=None, badge=None):
+    days = pd.date_range(date(year, month, 1), periods=calendar.monthrange(year, month)[1], freq='D')
+    departments = [department] * len(days) if department is not None else None
+    badges = [badge] * len(days) if badge is not None else None
+    hours, _ = get_scheduled_hours(days, departments, badges)
+    return hours
+
+# Function to calculate working days in a month
+def calculate_working_days(year, month, department=None, badge=None):
+    return int((get_month_schedule(year, month, department, badge) > 0).sum())
+
+# Function to calculate standard monthly hours
+def calculate_standard_monthly_hours(year, month, department=None, badge=None):
+    return round(float(get_month_schedule(year, month, department, badge).astype(float).sum()), 2)
+
+# Function to compute scheduled hours and working days for many months at once; month_keys is
+# indexed by (employee, year, month) and has the Departament and ID Legitimație columns
+def get_monthly_schedule_totals(month_keys):
+    years = month_keys.index.get_level_values(1).astype(int)
+    months = month_keys.index.get_level_values(2).astype(int)
+    first_days = pd.to_datetime(pd.DataFrame({'year': years, 'month': months, 'day': 1}))
+    day_counts = first_days.dt.days_in_month.to_numpy()
+    
+    # One row per calendar day of every key
+    key_positions = np.repeat(np.arange(len(month_keys)), day_counts)
+    day_offsets = np.arange(len(key_positions)) - np.repeat(np.cumsum(day_counts) - day_counts, day_counts)
+    dates = first_days.to_numpy()[key_positions] + day_offsets.astype('timedelta64[D]')
+    
+    hours, _ = get_scheduled_hours(
+        dates,
+        month_keys['Departament'].to_numpy()[key_positions],
+        month_keys['ID Legitimație'].to_numpy()[key_positions]
+    )
+    # Days of approved leave are not owed
+    on_leave = get_leave_calendar().lookup(month_keys.index.get_level_values(0).to_numpy()[key_positions], dates) != ''
+    hours = np.where(on_leave, 0, hours)
+    days = pd.DataFrame({'key': key_positions, 'hours': hours.astype(float), 'working': hours > 0})
+    totals = days.groupby('key').agg(standard_hours=('hours', 'sum'), working_days=('working', 'sum'))
+    totals['standard_hours'] = totals['standard_hours'].round(2)
+    return totals.set_axis(month_keys.index)
+
+# Function to set standard hours and differences of every row from the compiled work schedules.
+# Days of approved leave (data/leave_records.csv) get their type in 'Concediu' and no standard hours.
+def apply_work_schedules(df):
+    if df.empty:
+        return df
+    
+    df = df.copy()
+    standard_hours, _ = get_scheduled_hours(df['Data_Obiect'], df['Departament'], df['ID Legitimație'])
+    leave_types = get_leave_calendar().lookup(df['Angajat'], df['Data_Obiect'])
+    standard_hours = np.where(leave_types != '', 0, standard_hours).astype('float32')
+    df['Concediu'] = leave_types
+    df['Ore Standard'] = standard_hours
+    df['Diferență'] = pd.to_numeric(df['Durata (Ore)'], errors='coerce').fillna(0).to_numpy() - standard_hours
+    return df
+
+# Function to parse time strings
+def parse_time(time_str):
+    if pd.isna(time_str) or time_str == '':
+        return None
+    try:
+        return datetime.strptime(time_str.strip(), '%H:%M')
+    except:
+        return None
+
+# Function to calculate duration between times
+def calculate_duration(entry_time, exit_time):
+    if entry_time is None or exit_time is None:
+        return 0
+    
+    duration = exit_time - entry_time
+    
+    # An exit earlier than the entry is an overnight shift ending the next day
+    if duration < timedelta(0):
+        duration += timedelta(days=1)
+    hours = duration.total_seconds() / 3600
+    return round(hours, 2)
+
+# Function to convert date string to datetime
+def convert_date_string(date_str, year=None):
+    if pd.isna(date_str) or not date_str:
+        return None
+    
+    # Clean up the date string
+    date_str = date_str.strip()
+    
+    # Try different date formats
+    formats = ['%d %B %Y', '%d %B', '%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d']
+    
+    for fmt in formats:
+        try:
+            dt = datetime.strptime(date_str, fmt)
+            if '%Y' not in fmt and year:
+                # If year is not in the format, set it
+                dt = dt.replace(year=year)
+            return dt
+        except ValueError:
+            continue
+    
+    return None
+
+# Function to enforce the typed schema of the daily attendance frame
+def enforce_daily_schema(df):
+    if df.empty or 'Data_Obiect' not in df.columns:
+        return df
+    
+    df = df.copy()
+    
+    # Dates as day-resolution datetime64; labels are regenerated so parsed and gap-filled rows match
+    dates = pd.to_datetime(df['Data_Obiect'], errors='coerce').dt.normalize()
+    df['Data_Obiect'] = dates
+    df['Data'] = dates.dt.strftime('%d %B').str.lstrip('0').where(dates.notna(), df['Data'])
+    weekday_names = dates.dt.dayofweek.map(dict(enumerate(WEEKDAY_NAMES)))
+    df['Zi'] = pd.Categorical(weekday_names.where(dates.notna(), df['Zi']), categories=WEEKDAY_NAMES, ordered=True)
+    
+    # Calendar fields through the vectorized .dt accessor
+    df['An'] = dates.dt.year.astype('Int16')
+    df['Luna'] = dates.dt.month.astype('Int8')
+    df['Luna_Nume'] = dates.dt.month_name().astype('category')
+    df['Săptămână'] = dates.dt.isocalendar().week.astype('Int8')
+    
+    # History saved before leave records existed has no leave column
+    if 'Concediu' not in df.columns:
+        df['Concediu'] = ''
+    
+    # Labels repeated on every row are stored once per distinct value
+    for col in DAILY_CATEGORY_COLUMNS:
+        df[col] = df[col].astype(object).fillna('').astype(str).astype('category')
+    
+    for col in ['Ora Sosire', 'Ora Plecare']:
+        df[col] = df[col].astype(object).fillna('').astype(str)
+    
+    for col in DAILY_HOUR_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('float32')
+    
+    ordered_columns = [col for col in DAILY_COLUMNS if col in df.columns]
+    return df[ordered_columns + [col for col in df.columns if col not in DAILY_COLUMNS]]
+
+# Function to load historical data
+# The file is memory-mapped, so numeric columns are views on pages shared with other processes
+# and `columns` limits the read to the columns a view needs. It was written with the typed
+# schema, whose dtypes the Arrow pandas metadata restores.
+def load_historical_data(columns=None):
+    try:
+        if not os.path.exists(HISTORY_PATH) and os.path.exists(LEGACY_HISTORY_PATH):
+            migrate_legacy_history()
+        if os.path.exists(HISTORY_PATH):
+            history_table = feather.read_table(HISTORY_PATH, columns=columns, memory_map=True)
+            return history_table.to_pandas(split_blocks=True)
+        return pd.DataFrame()
+    except Exception as e:
+        logger.warning("Nu s-a putut încărca istoricul: %s", e)
+        return pd.DataFrame()
+
+# Function to write the history file. The new file replaces the old one atomically, and
+# processes that still map the old file keep reading it until they reload.
+def write_historical_data(historical_df):
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    temporary_path = f"{HISTORY_PATH}.{os.getpid()}.tmp"
+    feather.write_feather(historical_df.reset_index(drop=True), temporary_path, compression='uncompressed')
+    os.replace(temporary_path, HISTORY_PATH)
+
+# Function to write a CSV file atomically (cube and balance ledger), so readers never see a partial file
+def write_csv_atomically(df, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(temporary_path, index=False)
+    os.replace(temporary_path, path)
+
+# Function to convert a CSV history to the Arrow history file
+def migrate_legacy_history():
+    history_df = pd.read_csv(
+        LEGACY_HISTORY_PATH,
+        dtype={'ID Legitimație': str, 'Ora Sosire': str, 'Ora Plecare': str}
+    )
+    write_historical_data(enforce_daily_schema(history_df))
+    logger.info("Istoricul din %s a fost convertit în %s", LEGACY_HISTORY_PATH, HISTORY_PATH)
+
+# Function to build (employee, day) keys used to match history rows
+def get_employee_day_keys(df):
+    days = pd.to_datetime(df['Data_Obiect'], errors='coerce').dt.normalize()
+    return pd.MultiIndex.from_arrays([df['Angajat'], days])
+
+# Saves are read-modify-write, so concurrent savers in this process (the history writer,
+# benchmarks, recompute) take turns; otherwise the later save would drop the rows of the other
+_history_write_lock = threading.Lock()
+
+# Function to hold the history write lock: the lock of this process, then an exclusive lock on
+# HISTORY_LOCK_PATH, so writers in other processes (API server, recompute) wait as well
+@contextmanager
+def hold_history_write_lock():
+    with _history_write_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(HISTORY_LOCK_PATH), exist_ok=True)
+        with open(HISTORY_LOCK_PATH, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Function to save data to historical record
+def save_to_historical_data(new_data):
+    if new_data.empty:
+        return pd.DataFrame()
+    
+    with hold_history_write_lock():
+        return merge_into_history(new_data)
+
+# Function to remove the files derived from a history that no longer exists: its cube, its balance
+# ledger and its ingest ledger
+def reset_history_derived_files():
+    for path in [CUBE_PATH, LEDGER_PATH, INGEST_LEDGER_PATH]:
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info("Fișierul %s al istoricului anterior a fost șters", path)
+
+# Function to upsert daily rows into the history and refresh the cube, the balance ledger and the
+# version stamp; the caller holds the history write lock. Rows of closed payroll months are dropped.
+def merge_into_history(new_data):
+    # Checked again with the lock held: a month can be closed after an upload checked it, while its
+    # rows waited in the history queue (periods imports this module, hence the local import)
+    from periods import split_closed_rows
+    new_data, closed_periods = split_closed_rows(new_data)
+    if closed_periods:
+        logger.warning("Rânduri din luni închise ignorate la salvarea în istoric: %s", closed_periods)
+    
+    # Load existing data first
+    historical_df = load_historical_data()
+    if new_data.empty:
+        return historical_df
+    
+    if historical_df.empty:
+        # A new history: the cube and balance ledger are rebuilt from its rows alone, and the ingest
+        # ledger of the removed one must not skip the next imports
+        reset_history_derived_files()
+        historical_df = enforce_daily_schema(new_data)
+    else:
+        # Remove duplicates based on Employee + Date (the 'Data' label has no year,
+        # so match on the full date to keep the same day of different years apart)
+        if 'Angajat' in new_data.columns and 'Data_Obiect' in new_data.columns:
+            duplicate_mask = get_employee_day_keys(historical_df).isin(get_employee_day_keys(new_data))
+            historical_df = historical_df[~duplicate_mask]
+            
+            # Add new data
+            historical_df = enforce_daily_schema(pd.concat([historical_df, new_data], ignore_index=True))
+            
+            # Imported report blocks of the overwritten days no longer describe the history
+            # (ingest_ledger imports this module, hence the local import)
+            from ingest_ledger import forget_overwritten_blocks
+            forget_overwritten_blocks(new_data)
+    
+    # Save locally
+    write_historical_data(historical_df)
+    
+    # Refresh the employee-month cube for the months touched by this upload,
+    # then the balance checkpoints from the first touched month onwards
+    cube = update_history_cube(historical_df, new_data)
+    update_balance_ledger(cube, new_data)
+    
+    # New version stamp once both files are written
+    bump_history_version()
+    
+    return historical_df
+
+# Function to replace the history, its cube and its balance ledger at once (after a full recompute).
+# Fails when the history changed since `expected_version` was read, so no upload is lost.
+def replace_history_files(historical_df, cube_df, ledger_df, expected_version):
+    with hold_history_write_lock():
+        if get_history_version() != expected_version:
+            raise RuntimeError("Istoricul a fost modificat în timpul recalculării; rulați din nou comanda")
+        write_historical_data(historical_df)
+        write_csv_atomically(cube_df, CUBE_PATH)
+        write_csv_atomically(ledger_df, LEDGER_PATH)
+        return bump_history_version()
+
+# Function to return the version stamp of the stored history ('' when there is no history)
+def get_history_version():
+    try:
+        with open(HISTORY_VERSION_PATH, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        # History written before version stamps existed
+        return str(os.stat(HISTORY_PATH).st_mtime_ns) if os.path.exists(HISTORY_PATH) else ''
+
+# Function to write a new history version stamp (atomically, so readers never see a partial one)
+def bump_history_version():
+    version = f"{time.time_ns()}-{os.getpid()}"
+    temporary_path = f"{HISTORY_VERSION_PATH}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(temporary_path, HISTORY_VERSION_PATH)
+    return version
+
+# Function to derive the per-row facts summed into the employee-month cube. Hours are summed as
+# float64, so partial sums of history chunks add up to the totals of a single pass.
+def get_cube_facts(daily_df):
+    dates = pd.to_datetime(daily_df['Data_Obiect'], errors='coerce')
+    hours = pd.to_numeric(daily_df['Durata (Ore)'], errors='coerce').fillna(0).astype('float64')
+    standard_hours = pd.to_numeric(daily_df['Ore Standard'], errors='coerce').fillna(0).astype('float64')
+    
+    # Arrival time in minutes since midnight, NaN for absent days
+    arrival = daily_df['Ora Sosire'].astype(str).str.extract(r'^\s*(\d{1,2}):(\d{2})')
+    arrival_minutes = arrival[0].astype(float) * 60 + arrival[1].astype(float)
+    
+    # Late against the scheduled shift start (08:30 on days without a shift)
+    _, shift_start = get_scheduled_hours(dates, daily_df['Departament'], daily_df['ID Legitimație'])
+    late_threshold = np.where(np.isnan(shift_start), STANDARD_START_MINUTES, shift_start)
+    
+    return pd.DataFrame({
+        'Angajat': daily_df['Angajat'],
+        'Departament': daily_df['Departament'],
+        'An': dates.dt.year,
+        'Luna': dates.dt.month,
+        'Ore Totale': hours,
+        'Ore Standard': standard_hours,
+        'Zile Lucrate': (hours > 0).astype(int),
+        'Absențe': ((standard_hours > 0) & (hours <= 0)).astype(int),
+        'Întârzieri': (arrival_minutes.to_numpy() > late_threshold).astype(int),
+    }).dropna(subset=['An', 'Luna'])
+
+# Function to sum cube facts, or partial sums of several chunks, per (employee, department, year, month)
+def sum_cube_facts(facts):
+    return facts.groupby(CUBE_KEY_COLUMNS, as_index=False, observed=True).sum()
+
+# Function to turn summed cube facts into cube rows
+def finish_history_cube(sums):
+    cube = sums.copy()
+    cube['An'] = cube['An'].astype(int)
+    cube['Luna'] = cube['Luna'].astype(int)
+    cube['Ore Totale'] = cube['Ore Totale'].astype(float).round(2)
+    cube['Ore Standard'] = cube['Ore Standard'].astype(float).round(2)
+    cube['Diferență'] = (cube['Ore Totale'] - cube['Ore Standard']).round(2)
+    return cube[CUBE_COLUMNS]
+
+# Function to aggregate daily rows into the (employee, department, year, month) cube
+def build_history_cube(daily_df):
+    if daily_df.empty:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+    return finish_history_cube(sum_cube_facts(get_cube_facts(daily_df)))
+
+# Function to build (employee, year, month) keys of cube rows
+def get_cube_keys(cube_df):
+    return pd.MultiIndex.from_arrays([cube_df['Angajat'], cube_df['An'], cube_df['Luna']])
+
+# Function to load the employee-month cube, building it from history if missing
+def load_history_cube():
+    try:
+        if os.path.exists(CUBE_PATH):
+            return pd.read_csv(CUBE_PATH, keep_default_na=False)
+        
+        # Built chunk by chunk, so a history larger than memory is never loaded whole
+        cube = aggregate_history_cube()
+        if not cube.empty:
+            write_csv_atomically(cube, CUBE_PATH)
+        return cube
+    except Exception as e:
+        logger.warning("Nu s-a putut încărca cubul istoric: %s", e)
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+
+# Function to recompute only the cube cells touched by newly saved data
+def update_history_cube(historical_df, new_data):
+    touched_keys = get_cube_keys(build_history_cube(new_data)).unique()
+    
+    if not os.path.exists(CUBE_PATH):
+        cube = build_history_cube(historical_df)
+    else:
+        cube = load_history_cube()
+        cube = cube[~get_cube_keys(cube).isin(touched_keys)]
+        
+        # Re-aggregate the touched months from the merged history
+        dates = pd.to_datetime(historical_df['Data_Obiect'], errors='coerce')
+        history_keys = pd.MultiIndex.from_arrays([historical_df['Angajat'], dates.dt.year, dates.dt.month])
+        touched_rows = historical_df[history_keys.isin(touched_keys)]
+        
+        cube = pd.concat([cube, build_history_cube(touched_rows)], ignore_index=True)
+    
+    cube = cube.sort_values(['Angajat', 'An', 'Luna']).reset_index(drop=True)
+    write_csv_atomically(cube, CUBE_PATH)
+    return cube
+
+# Function to derive the per-row facts of the weekly history: ISO week keys, the department,
+# the day as both ends of the week's interval and the hours as float64
+def get_weekly_facts(daily_df):
+    calendar_week = daily_df['Data_Obiect'].dt.isocalendar()
+    return pd.DataFrame({
+        'Angajat': daily_df['Angajat'],
+        'An': calendar_week['year'],
+        'Săptămână': calendar_week['week'],
+        'Departament': daily_df['Departament'],
+        'Început': daily_df['Data_Obiect'],
+        'Sfârșit': daily_df['Data_Obiect'],
+        'Ore Totale': daily_df['Durata (Ore)'].astype('float64'),
+        'Ore Standard': daily_df['Ore Standard'].astype('float64'),
+    })
+
+# Function to combine weekly facts, or partial weeks of several chunks, per (employee, ISO year, week);
+# the department is the one of the week's first row
+def sum_weekly_facts(facts):
+    return facts.groupby(WEEKLY_KEY_COLUMNS, observed=True, sort=True).agg(WEEKLY_AGGREGATIONS).reset_index()
+
+# Function to turn combined weekly facts into weekly history rows
+def finish_weekly_history(weekly):
+    weekly = weekly.copy()
+    weekly['Interval'] = weekly['Început'].dt.strftime('%d %b') + ' - ' + weekly['Sfârșit'].dt.strftime('%d %b')
+    weekly['Ore Totale'] = weekly['Ore Totale'].astype(float).round(2)
+    weekly['Ore Standard'] = weekly['Ore Standard'].astype(float).round(2)
+    weekly['Diferență'] = (weekly['Ore Totale'] - weekly['Ore Standard']).round(2)
+    return weekly[WEEKLY_HISTORY_COLUMNS]
+
+# Function to aggregate the daily history into ISO weeks. The ISO year is used as 'An',
+# so the days of a week that spans New Year stay in one row.
+def build_weekly_history(daily_df):
+    if daily_df.empty:
+        return pd.DataFrame(columns=WEEKLY_HISTORY_COLUMNS)
+    return finish_weekly_history(sum_weekly_facts(get_weekly_facts(daily_df)))
+
+# Function to turn a memory budget into rows per chunk, given the size of one row
+def get_chunk_rows(bytes_per_row, memory_budget_mb=HISTORY_MEMORY_BUDGET_MB):
+    chunk_rows = int(memory_budget_mb * 1024 ** 2 / (max(bytes_per_row, 1) * CHUNK_MEMORY_FACTOR))
+    return max(chunk_rows, MIN_CHUNK_ROWS)
+
+# Function to read the history in chunks of at most `memory_budget_mb`, as daily frames with
+# `columns`. Chunks are slices of the record batches of the memory-mapped Arrow file (a history
+# still in the legacy CSV is read in CSV chunks), so only one chunk is in memory at a time.
+def iter_history_chunks(columns, memory_budget_mb=HISTORY_MEMORY_BUDGET_MB):
+    if os.path.exists(HISTORY_PATH):
+        with pa.memory_map(HISTORY_PATH) as source:
+            reader = ipc.open_file(source)
+            if reader.num_record_batches == 0:
+                return
+            first_batch = reader.get_batch(0).select(columns)
+            chunk_rows = get_chunk_rows(first_batch.nbytes / max(first_batch.num_rows, 1), memory_budget_mb)
+            
+            pending = []
+            pending_rows = 0
+            for batch_index in range(reader.num_record_batches):
+                batch = reader.get_batch(batch_index).select(columns)
+                offset = 0
+                while offset < batch.num_rows:
+                    piece = batch.slice(offset, chunk_rows - pending_rows)
+                    pending.append(piece)
+                    pending_rows += piece.num_rows
+                    offset += piece.num_rows
+                    if pending_rows == chunk_rows:
+                        yield pa.Table.from_batches(pending).to_pandas()
+                        pending = []
+                        pending_rows = 0
+            if pending_rows:
+                yield pa.Table.from_batches(pending).to_pandas()
+    elif os.path.exists(LEGACY_HISTORY_PATH):
+        sample = pd.read_csv(LEGACY_HISTORY_PATH, usecols=columns, nrows=1000)
+        bytes_per_row = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+        chunks = pd.read_csv(LEGACY_HISTORY_PATH, usecols=columns, dtype={'ID Legitimație': str, 'Ora Sosire': str},
+                             keep_default_na=False, chunksize=get_chunk_rows(bytes_per_row, memory_budget_mb))
+        for chunk in chunks:
+            chunk['Data_Obiect'] = pd.to_datetime(chunk['Data_Obiect'], errors='coerce').dt.normalize()
+            for col in DAILY_HOUR_COLUMNS:
+                if col in chunk.columns:
+                    chunk[col] = pd.to_numeric(chunk[col], errors='coerce').fillna(0).astype('float32')
+            yield chunk
+
+# Function to build the employee-month cube of the whole history chunk by chunk: the partial
+# sums of each chunk are added to the running sums, which hold one row per cube cell
+def aggregate_history_cube(memory_budget_mb=HISTORY_MEMORY_BUDGET_MB):
+    sums = None
+    for chunk in iter_history_chunks(CUBE_INPUT_COLUMNS, memory_budget_mb):
+        partial = sum_cube_facts(get_cube_facts(chunk))
+        sums = partial if sums is None else sum_cube_facts(pd.concat([sums, partial], ignore_index=True))
+    if sums is None or sums.empty:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+    return finish_history_cube(sums)
+
+# Function to build the weekly history of the whole history chunk by chunk: sums are added and the
+# first/last days are combined with min/max, keeping one running row per employee-week
+def aggregate_weekly_history(memory_budget_mb=HISTORY_MEMORY_BUDGET_MB):
+    weekly = None
+    for chunk in iter_history_chunks(WEEKLY_INPUT_COLUMNS, memory_budget_mb):
+        partial = sum_weekly_facts(get_weekly_facts(chunk))
+        weekly = partial if weekly is None else sum_weekly_facts(pd.concat([weekly, partial], ignore_index=True))
+    if weekly is None or weekly.empty:
+        return pd.DataFrame(columns=WEEKLY_HISTORY_COLUMNS)
+    return finish_weekly_history(weekly)
+
+# Function to build the balance ledger from the cube: per employee and month, the month's
+# difference and the cumulative balance through the end of that month
+def build_balance_ledger(cube_df):
+    if cube_df.empty:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+    
+    # An employee who changed department within a month has one cube row per department
+    ledger = cube_df.sort_values(['Angajat', 'An', 'Luna'], kind='mergesort').groupby(
+        ['Angajat', 'An', 'Luna'], as_index=False, sort=True
+    ).agg(Departament=('Departament', 'last'), Diferență=('Diferență', 'sum'))
+    ledger['Diferență'] = ledger['Diferență'].round(2)
+    ledger['Sold Cumulat'] = ledger.groupby('Angajat', sort=False)['Diferență'].cumsum().round(2)
+    return ledger[LEDGER_COLUMNS]
+
+# Function to load the balance ledger, building it from the cube if missing
+def load_balance_ledger():
+    try:
+        if os.path.exists(LEDGER_PATH):
+            return pd.read_csv(LEDGER_PATH, keep_default_na=False)
+        
+        ledger = build_balance_ledger(load_history_cube())
+        if not ledger.empty:
+            write_csv_atomically(ledger, LEDGER_PATH)
+        return ledger
+    except Exception as e:
+        logger.warning("Nu s-a putut încărca registrul de sold: %s", e)
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+
+# Function to shift only the checkpoints from each touched employee's first touched month
+# onwards; earlier checkpoints, and those of other employees, are kept as they are
+def update_balance_ledger(cube_df, new_data):
+    if not os.path.exists(LEDGER_PATH):
+        ledger = build_balance_ledger(cube_df)
+    else:
+        ledger = load_balance_ledger()
+        
+        # First touched month of every employee in the upload, as year * 12 + month
+        dates = pd.to_datetime(new_data['Data_Obiect'], errors='coerce')
+        first_touched = (dates.dt.year * 12 + dates.dt.month).groupby(new_data['Angajat'].astype(str), observed=True).min()
+        
+        ledger_months = ledger['An'] * 12 + ledger['Luna']
+        ledger_first_touched = ledger['Angajat'].map(first_touched)
+        kept = ledger[~(ledger_months >= ledger_first_touched)]
+        
+        cube_months = cube_df['An'] * 12 + cube_df['Luna']
+        touched_rows = cube_df[cube_months >= cube_df['Angajat'].map(first_touched)]
+        recomputed = build_balance_ledger(touched_rows)
+        
+        # Continue from the last kept checkpoint of each employee
+        opening_balance = kept.groupby('Angajat', sort=False)['Sold Cumulat'].last()
+        recomputed['Sold Cumulat'] = (recomputed['Sold Cumulat'] + recomputed['Angajat'].map(opening_balance).fillna(0)).round(2)
+        
+        ledger = pd.concat([kept, recomputed], ignore_index=True)
+    
+    ledger = ledger.sort_values(['Angajat', 'An', 'Luna']).reset_index(drop=True)
+    write_csv_atomically(ledger, LEDGER_PATH)
+    return ledger
+
+# Balance ledger indexed for point-in-time lookups. Built once per ledger version; every lookup
+# is then one binary search per employee over the (employee, month) keys.
+class BalanceLedger:
+    def __init__(self, ledger_df):
+        ledger = ledger_df.sort_values(['Angajat', 'An', 'Luna'], kind='mergesort').reset_index(drop=True)
+        employee_codes, self.employees = pd.factorize(ledger['Angajat'].astype(str))
+        self.balances = ledger['Sold Cumulat'].to_numpy(dtype='float64')
+        
+        # Month numbers (year * 12 + month) stay far below 1e6, so code * 1e6 + month orders rows by employee, then month
+        self.keys = employee_codes.astype('int64') * 1_000_000 + (ledger['An'] * 12 + ledger['Luna']).to_numpy(dtype='int64')
+        employee_range = np.arange(len(self.employees))
+        self.first_rows = np.searchsorted(employee_codes, employee_range, side='left')
+        self.departments = ledger['Departament'].to_numpy()[np.searchsorted(employee_codes, employee_range, side='right') - 1]
+    
+    # Function to look up every employee's balance through the end of a month number (0 before the first checkpoint)
+    def balance_through(self, month_number):
+        probes = np.arange(len(self.employees), dtype='int64') * 1_000_000 + month_number
+        rows = np.searchsorted(self.keys, probes, side='right') - 1
+        return np.where(rows >= self.first_rows, self.balances[np.maximum(rows, 0)], 0.0)
+    
+    # Function to compute every employee's balance at the end of a day. Without the daily history
+    # only whole months count, so a month that has not ended by `day` is left out; with it, the
+    # days of that month up to `day` are added to the checkpoint of the month before.
+    def balance_at(self, day, daily_df=None):
+        month_number = day.year * 12 + day.month
+        if day.is_month_end or daily_df is None or daily_df.empty:
+            return self.balance_through(month_number if day.is_month_end else month_number - 1)
+        
+        month_days = daily_df[(daily_df['Data_Obiect'] >= day.replace(day=1)) & (daily_df['Data_Obiect'] <= day)]
+        partial = month_days.groupby(month_days['Angajat'].astype(str), observed=True)['Diferență'].sum()
+        return self.balance_through(month_number - 1) + partial.reindex(self.employees).fillna(0).to_numpy()
+    
+    # Function to return each employee's balance at the end of `as_of`; with `since`, only the
+    # hours from that date on count (the balance before it is subtracted)
+    def balance_as_of(self, as_of, daily_df=None, since=None):
+        as_of = pd.Timestamp(as_of).normalize()
+        balance = self.balance_at(as_of, daily_df)
+        if since is not None:
+            balance = balance - self.balance_at(pd.Timestamp(since).normalize() - timedelta(days=1), daily_df)
+        return pd.DataFrame({'Angajat': self.employees, 'Departament': self.departments, 'Sold': np.round(balance, 2)})
+
+# Function to convert an Excel sheet into the CSV text the parser expects
+def excel_sheet_to_csv_text(source, sheet_name=0):
+    df_raw = pd.read_excel(source, sheet_name=sheet_name)
+    return df_raw.to_csv(index=False)
+
+# Function to serialize a frame as CSV bytes
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode()
+
+# Function to serialize a frame as an Excel workbook
+def to_excel_bytes(df, sheet_name='Sheet1'):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
+
+# Helper function to process employee data entries (removes duplication)
+def process_employee_entry(current_employee, department, badge_id, weekdays, dates, time_range, report_year):
+    data_entries = []
+    
+    for day_idx, (day, date_str, time_range_val) in enumerate(zip(weekdays, dates, time_range)):
+        if date_str:  # Check if date exists
+            date_obj = convert_date_string(date_str, report_year)
+            weekday_name = day
+            
+            if time_range_val and '-' in time_range_val:
+                entry_time_str, exit_time_str = time_range_val.split(' - ')
+                entry_time = parse_time(entry_time_str)
+                exit_time = parse_time(exit_time_str)
+                
+                if entry_time and exit_time:
+                    duration = calculate_duration(entry_time, exit_time)
+                    
+                    # Standard hours are set afterwards for the whole frame by apply_work_schedules
+                    data_entries.append({
+                        'Angajat': current_employee,
+                        'Departament': department,
+                        'ID Legitimație': badge_id,
+                        'Zi': weekday_name,
+                        'Data': date_str,
+                        'Data_Obiect': date_obj,
+                        'Ora Sosire': entry_time_str,
+                        'Ora Plecare': exit_time_str,
+                        'Durata (Ore)': duration
+                    })
+            else:
+                # Date exists but no time range (absent day)
+                data_entries.append({
+                    'Angajat': current_employee,
+                    'Departament': department,
+                    'ID Legitimație': badge_id,
+                    'Zi': weekday_name,
+                    'Data': date_str,
+                    'Data_Obiect': date_obj,
+                    'Ora Sosire': '',
+                    'Ora Plecare': '',
+                    'Durata (Ore)': 0
+                })
+    
+    return data_entries
+
+# Function to check the "24 March" (or "24 March 2025") shape of a date cell
+def is_date_cell(value):
+    day, _, rest = value.partition(' ')
+    return day.isdigit() and len(day) <= 2 and rest[:1].isalpha()
+
+# Function to check the "H:MM" / "HH:MM" shape of a clock time
+def is_clock_time(value):
+    hours, separator, minutes = value.partition(':')
+    return separator == ':' and 1 <= len(hours) <= 2 and hours.isdigit() and len(minutes) == 2 and minutes.isdigit()
+
+# Function to normalize a time range cell to "HH:MM - HH:MM", None if it has another shape
+def normalize_time_range(value):
+    # Fast path for the canonical "08:26 - 17:26" layout of the export
+    if len(value) == 13 and value[5:8] == ' - ' and value[2] == ':' and value[10] == ':' \
+            and value[:2].isdigit() and value[3:5].isdigit() and value[8:10].isdigit() and value[11:].isdigit():
+        return value
+    
+    entry_time, separator, exit_time = value.partition('-')
+    entry_time, exit_time = entry_time.strip(), exit_time.strip()
+    if separator and is_clock_time(entry_time) and is_clock_time(exit_time):
+        return f"{entry_time} - {exit_time}"
+    return None
+
+# Function to locate the "Name Surname 123" cell of an employee header row
+def find_employee_cell(cells):
+    # The department follows the name, so the name is never the last cell
+    for idx in range(len(cells) - 1):
+        parts = cells[idx].split()
+        if len(parts) >= 3 and parts[-1].isdigit() and not parts[0].isdigit():
+            return idx
+    return None
+
+# Function to check the "123ABC" shape of a badge ID
+def is_badge_id(value):
+    suffix = value[3:]
+    return len(value) > 3 and value[:3].isdigit() and suffix.isalnum() and suffix.isascii() and suffix == suffix.upper()
+
+# Function to split an attendance export into weekly blocks with a csv.reader state machine.
+# Returns the report (start, end) strings, the week tuples
+# (employee, department, badge, weekdays, dates, times) and the problems found, by line number.
+def tokenize_attendance_export(file_content):
+    report_range = None
+    weeks = []
+    issues = []
+    
+    employee = None
+    department = None
+    badge_id = None
+    employee_line = None
+    employee_weeks = 0
+    weekdays = None
+    dates = None
+    
+    # 'header' before the first employee, then 'block' -> 'weekdays' -> 'dates' -> 'block' per week
+    state = 'header'
+    
+    def report(line_number, message):
+        issues.append({'Linia': line_number, 'Angajat': employee or '', 'Problemă': message})
+    
+    def close_employee_block(line_number):
+        if state == 'weekdays':
+            report(line_number, "Bloc incomplet: lipsește linia de date după zilele săptămânii")
+        elif state == 'dates':
+            report(line_number, "Bloc incomplet: lipsește linia de ore după linia de date")
+        if employee is not None and employee_weeks == 0:
+            report(employee_line, "Angajat fără nicio săptămână de prezență")
+    
+    reader = csv.reader(io.StringIO(file_content))
+    for row in reader:
+        line_number = reader.line_num
+        cells = [cell.strip() for cell in row]
+        first_value = next((cell for cell in cells if cell), None)
+        
+        if first_value is None:
+            # An all-empty row after a date line is a week without any punches
+            if state == 'dates' and cells:
+                weeks.append((employee, department, badge_id, weekdays, dates, [None] * len(dates)))
+                employee_weeks += 1
+                state = 'block'
+            continue
+        
+        # Weekday header row
+        if cells[:7] == WEEKDAY_NAMES:
+            if employee is None:
+                report(line_number, "Linie de zile ale săptămânii înaintea oricărui angajat")
+            elif state == 'weekdays':
+                report(line_number, "Linie de zile repetată fără linie de date")
+            elif state == 'dates':
+                report(line_number, "Lipsește linia de ore pentru săptămâna anterioară")
+            weekdays = cells[:7]
+            state = 'weekdays' if employee is not None else state
+            continue
+        
+        # Date row
+        if is_date_cell(first_value) and all(is_date_cell(cell) for cell in cells if cell):
+            if state != 'weekdays':
+                if employee is None or weekdays is None:
+                    report(line_number, "Linie de date fără antet de angajat sau zile ale săptămânii")
+                    continue
+                report(line_number, "Linie de date fără linie de zile; se folosesc zilele anterioare")
+            dates = [cell or None for cell in cells[:len(weekdays)]]
+            dates += [None] * (len(weekdays) - len(dates))
+            state = 'dates'
+            continue
+        
+        # Time range row
+        if normalize_time_range(first_value) is not None:
+            if state != 'dates':
+                report(line_number, "Linie de ore fără linie de date")
+                continue
+            times = [normalize_time_range(cell) if cell else None for cell in cells[:len(dates)]]
+            times += [None] * (len(dates) - len(times))
+            for day_name, date_str, cell, time_value in zip(weekdays, dates, cells, times):
+                if cell and time_value is None:
+                    report(line_number, f"Interval orar invalid '{cell}' ({day_name}); ziua este tratată ca absență")
+                elif time_value and not date_str:
+                    report(line_number, f"Interval orar fără dată ({day_name})")
+            weeks.append((employee, department, badge_id, weekdays, dates, times))
+            employee_weeks += 1
+            state = 'block'
+            continue
+        
+        # Report interval in the header
+        if state == 'header' and report_range is None and first_value.startswith('from '):
+            range_match = re.search(r'from\s+(\d+\s+\w+\s+\d+)\s+to\s+(\d+\s+\w+\s+\d+)', first_value)
+            if range_match:
+                report_range = (range_match.group(1), range_match.group(2))
+                continue
+        
+        # Employee header row
+        name_idx = find_employee_cell(cells)
+        if name_idx is not None:
+            close_employee_block(line_number)
+            employee = cells[name_idx]
+            department = cells[name_idx + 1]
+            last_value = next(cell for cell in reversed(cells) if cell)
+            badge_id = last_value if is_badge_id(last_value) else "N/A"
+            employee_line = line_number
+            employee_weeks = 0
+            weekdays = None
+            dates = None
+            state = 'block'
+            continue
+        
+        # Anything else before the first employee is report preamble
+        if state != 'header':
+            excerpt = ','.join(row)
+            report(line_number, f"Linie nerecunoscută: {excerpt[:80]}")
+    
+    close_employee_block(reader.line_num)
+    if employee is None:
+        issues.append({'Linia': reader.line_num, 'Angajat': '', 'Problemă': "Nu a fost găsit niciun bloc de angajat"})
+    
+    return report_range, weeks, issues
+
+# Function to process attendance data
+# progress, when given, is called as progress(stage, done, total, rows): per employee block while
+# parsing (rows is the list of per-day records parsed so far) and once at the start of later stages.
+# ingest, when given (an ingest_ledger.IngestReport), drops the employee blocks imported before
+# unchanged; their per-day records are read back from the history instead of being parsed.
+def process_attendance_data(file_content, recorder=None, issues=None, progress=None, ingest=None):
+    recorder = recorder or StageRecorder(enabled=False)
+    recorder.begin('parse')
+    
+    # Split the export into per-week blocks in a single csv.reader pass
+    report_range, weeks, parse_issues = tokenize_attendance_export(file_content)
+    if parse_issues:
+        logger.warning("%d probleme de structură în fișierul de prezență", len(parse_issues))
+    if issues is not None:
+        issues.extend(parse_issues)
+    
+    # Extract start and end dates
+    start_date_str, end_date_str = report_range if report_range else (None, None)
+    date_range = f"{start_date_str} - {end_date_str}" if report_range else "N/A"
+    
+    start_date = convert_date_string(start_date_str)
+    end_date = convert_date_string(end_date_str)
+    report_year = start_date.year if start_date else datetime.now().year
+    
+    known_rows = None
+    if ingest is not None:
+        weeks, known_rows = ingest.filter_blocks(report_range, weeks)
+    
+    # Employee blocks are consecutive runs of weeks with the same employee
+    employee_total = sum(1 for index in range(len(weeks)) if index == 0 or weeks[index][0] != weeks[index - 1][0])
+    parsed_employees = 0
+    
+    data = []
+    for index, (current_employee, department, badge_id, weekdays, dates, days_data) in enumerate(weeks):
+        data_entries = process_employee_entry(current_employee, department, badge_id, weekdays, dates, days_data, report_year)
+        data.extend(data_entries)
+        
+        if progress is not None and (index + 1 == len(weeks) or weeks[index + 1][0] != current_employee):
+            parsed_employees += 1
+            progress('parse', parsed_employees, employee_total, data)
+    
+    # Create DataFrame
+    df = pd.DataFrame(data)
+    if known_rows is not None and not known_rows.empty:
+        df = known_rows if df.empty else pd.concat([df, known_rows], ignore_index=True)
+    recorder.end(rows=len(df))
+    
+    daily_df, weekly_df, monthly_df = build_attendance_frames(df, start_date, end_date, recorder, progress)
+    return daily_df, weekly_df, monthly_df, date_range, report_year
+
+# Function to turn parsed per-day rows into the daily, weekly and monthly frames
+# (gap fill over [start_date, end_date], work schedules, typed schema and aggregation)
+def build_attendance_frames(df, start_date, end_date, recorder=None, progress=None):
+    recorder = recorder or StageRecorder(enabled=False)
+    
+    # Function to start a stage in the recorder and report it to the progress callback
+    def begin_stage(name):
+        recorder.begin(name)
+        if progress is not None:
+            progress(name, None, None, None)
+    
+    begin_stage('gap_fill')
+    
+    # Add missing scheduled working days for each employee
+    if not df.empty and start_date and end_date:
+        employees = df.drop_duplicates('Angajat')[['Angajat', 'Departament', 'ID Legitimație']]
+        calendar_days = pd.DataFrame({'Data_Obiect': pd.date_range(start_date, end_date, freq='D')})
+        
+        # Every (employee, day) of the report interval that the employee's schedule has a shift on
+        expected_days = employees.merge(calendar_days, how='cross')
+        scheduled_hours, _ = get_compiled_schedules().lookup(
+            expected_days['Data_Obiect'], expected_days['Departament'], expected_days['ID Legitimație']
+        )
+        expected_days = expected_days[scheduled_hours > 0]
+        
+        missing_days = expected_days[~get_employee_day_keys(expected_days).isin(get_employee_day_keys(df))].copy()
+        if not missing_days.empty:
+            missing_days['Zi'] = missing_days['Data_Obiect'].dt.dayofweek.map(dict(enumerate(WEEKDAY_NAMES)))
+            missing_days['Data'] = missing_days['Data_Obiect'].dt.strftime('%d %B').str.lstrip('0')
+            missing_days['Ora Sosire'] = ''
+            missing_days['Ora Plecare'] = ''
+            missing_days['Durata (Ore)'] = 0
+            df = pd.concat([df, missing_days], ignore_index=True)
+    
+    # Standard hours and differences from the compiled work schedules
+    df = apply_work_schedules(df)
+    
+    recorder.end(rows=len(df))
+    begin_stage('schema')
+    
+    # Apply the typed schema (derives year, month and week columns)
+    df = enforce_daily_schema(df)
+    
+    # Sort DataFrame by employee and date
+    if 'Data_Obiect' in df.columns and not df.empty:
+        df = df.sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True)
+    
+    recorder.end(rows=len(df))
+    begin_stage('aggregate')
+    
+    # Calculate weekly totals for each employee
+    weekly_data = []
+    
+    if not df.empty and 'Săptămână' in df.columns:
+        for (employee, year, week), week_df in df.groupby(['Angajat', 'An', 'Săptămână'], observed=True):
+            if pd.isna(year) or pd.isna(week):
+                continue
+    
+            total_hours = round(float(week_df['Durata (Ore)'].sum()), 2)
+            total_standard_hours = round(float(week_df['Ore Standard'].sum()), 2)
+    
+            # Get department
+            department = week_df['Departament'].iloc[0] if 'Departament' in week_df.columns else ""
+    
+            # Get the first and last date of the week
+            dates = sorted(week_df['Data_Obiect'].dropna())
+            week_start = dates[0].strftime('%d %b') if dates else ""
+            week_end = dates[-1].strftime('%d %b') if dates else ""
+            week_range = f"{week_start} - {week_end}" if week_start and week_end else f"Săpt. {week}"
+    
+            weekly_data.append({
+                'Angajat': employee,
+                'Departament': department,
+                'An': year,
+                'Săptămână': week,
+                'Interval': week_range,
+                'Ore Totale': total_hours,
+                'Ore Standard': total_standard_hours,
+                'Diferență': total_hours - total_standard_hours
+            })
+    
+    weekly_df = pd.DataFrame(weekly_data)
+    
+    # Calculate monthly totals
+    monthly_data = []
+    
+    if not df.empty and 'Luna' in df.columns and 'An' in df.columns:
+        # Scheduled hours and working days of every (employee, month) in one lookup
+        month_totals = get_monthly_schedule_totals(
+            df.groupby(['Angajat', 'An', 'Luna'], observed=True)[['Departament', 'ID Legitimație']].first()
+        )
+        
+        for (employee, year, month), month_df in df.groupby(['Angajat', 'An', 'Luna'], observed=True):
+            if pd.isna(year) or pd.isna(month):
+                continue
+    
+            # Calculate actual hours worked
+            total_hours = round(float(month_df['Durata (Ore)'].sum()), 2)
+    
+            # Get department
+            department = month_df['Departament'].iloc[0] if 'Departament' in month_df.columns else ""
+    
+            # Standard hours and working days for the month from the employee's work schedule
+            standard_hours, working_days = month_totals.loc[(employee, year, month)]
+    
+            # Get month name
+            month_name = month_df['Luna_Nume'].iloc[0] if not month_df['Luna_Nume'].isna().all() else ""
+    
+            monthly_data.append({
+                'Angajat': employee,
+                'Departament': department,
+                'An': int(year),
+                'Luna': int(month),
+                'Luna_Nume': month_name,
+                'Ore Totale': total_hours,
+                'Ore Standard': standard_hours,
+                'Diferență': total_hours - standard_hours,
+                'Zile Lucrătoare': int(working_days)
+            })
+    
+    monthly_df = pd.DataFrame(monthly_data)
+    recorder.end(rows=len(weekly_df) + len(monthly_df))
+    
+    return df, weekly_df, monthly_df
@@ -0,0 +1,87 @@
+# Usage (from the repository root): python -m benchmarks.bench_app_startup [--samples 3] [--reruns 5] [--json results.json]
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Script run in a fresh interpreter so that every sample pays the cold imports again
+PROBE = r"""
+import json, os, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+streamlit_loaded = time.perf_counter()
+
+sys.path.insert(0, os.environ['APP_DIR'])
+from benchmarks.generate_export import generate_export_csv
+
+app = AppTest.from_file(os.path.join(os.environ['APP_DIR'], 'app.py'), default_timeout=300)
+run_start = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - run_start
+
+def timed_reruns(count):
+    timings = []
+    for _ in range(count):
+        run_start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - run_start)
+    return timings
+
+reruns = int(os.environ['RERUNS'])
+idle_reruns = timed_reruns(reruns)
+
+app.file_uploader[0].set_value(('export.csv', generate_export_csv(25, 28).encode(), 'text/csv'))
+run_start = time.perf_counter()
+app.run()
+upload_run = time.perf_counter() - run_start
+upload_reruns = timed_reruns(reruns)
+
+print(json.dumps({
+    'streamlit_import': streamlit_loaded - start,
+    'first_run': first_run,
+    'rerun': min(idle_reruns),
+    'upload_run': upload_run,
+    'upload_rerun': min(upload_reruns),
+    'exceptions': len(app.exception),
+}))
+"""
+
+METRICS = [
+    ('streamlit_import', "import streamlit (not affected by the app)"),
+    ('first_run', "cold first run: app imports + script"),
+    ('rerun', "rerun without data (best)"),
+    ('upload_run', "first run after a 25x28 upload"),
+    ('upload_rerun', "rerun with the upload loaded (best)"),
+]
+
+# Function to run one cold sample in a fresh interpreter inside an empty working directory
+def run_sample(app_dir, reruns):
+    workdir = tempfile.mkdtemp(prefix='attendance-startup-')
+    env = dict(os.environ, APP_DIR=app_dir, RERUNS=str(reruns), STREAMLIT_LOGGER_LEVEL='error')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure cold start and rerun time of the Streamlit app with AppTest")
+    parser.add_argument('--app-dir', default=os.getcwd(), help="repository checkout to measure (default: current directory)")
+    parser.add_argument('--samples', type=int, default=3, help="fresh interpreters to start, the median is reported")
+    parser.add_argument('--reruns', type=int, default=5)
+    parser.add_argument('--json', help="also write the samples to this JSON file")
+    args = parser.parse_args()
+
+    samples = [run_sample(os.path.abspath(args.app_dir), args.reruns) for _ in range(args.samples)]
+
+    print(f"{'metric':<45} {'median s':>9}")
+    for metric, label in METRICS:
+        print(f"{label:<45} {statistics.median(sample[metric] for sample in samples):>9.4f}")
+    if any(sample['exceptions'] for sample in samples):
+        print("warning: the app raised exceptions during the measurement")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(samples, f, indent=2)
@@ -0,0 +1,204 @@
+# Usage (from the repository root): python -m benchmarks.bench_concurrent_sessions --sessions 8 [--processes 2] [--actions 20] [--size 50x28] [--json results.json]
+
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.generate_export import generate_export_csv
+from benchmarks.run_benchmarks import parse_sizes
+
+# Interactions a simulated HR user performs after the upload, drawn at random
+SESSION_ACTIONS = ['rounding', 'employees', 'departments', 'tab', 'viz']
+
+RESULT_TABS = ["📋 Analiză Zilnică", "📅 Sumar Săptămânal", "📆 Prezentare Lunară", "📊 Vizualizări"]
+VIZ_TAB = RESULT_TABS[3]
+
+# Options of the rounding selector in app.py
+ROUNDING_PERCENTAGES = [0, 10, 15, 20]
+
+PERCENTILES = [50, 90, 99]
+
+# Function to read the resident set size of this process in MB (peak when the current one is unavailable)
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return get_peak_rss_mb()
+
+# Function to read the peak resident set size of this process in MB (ru_maxrss is in KB on Linux, bytes on macOS)
+def get_peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+# One simulated user: uploads its own synthetic export, then changes filters, rounding, tabs and
+# charts. Every rerun is timed and recorded as (action, seconds).
+class SimulatedSession:
+    def __init__(self, app_path, session_id, employees, days, actions, seed):
+        from streamlit.testing.v1 import AppTest
+
+        self.app = AppTest.from_file(app_path, default_timeout=600)
+        self.session_id = session_id
+        self.export = generate_export_csv(employees, days, seed=seed).encode()
+        self.actions = actions
+        self.rng = random.Random(seed)
+        self.tab = RESULT_TABS[0]
+        self.samples = []
+        self.errors = []
+
+    # Function to rerun the app, record the rerun time and any exception or error shown
+    def timed_run(self, action):
+        start = time.perf_counter()
+        self.app.run()
+        if action == 'upload':
+            # Large uploads are processed by a background job: wait for it like the progress fragment does
+            job = self.app.session_state['attendance_job'] if 'attendance_job' in self.app.session_state else None
+            while job is not None and not job.finished:
+                time.sleep(0.05)
+            if job is not None:
+                self.app.run()
+        self.samples.append((action, time.perf_counter() - start))
+
+        messages = [str(element.value) for element in list(self.app.exception) + list(self.app.error)]
+        if messages:
+            self.errors.append({'session': self.session_id, 'action': action, 'messages': [message[:300] for message in messages]})
+
+    # Function to apply one random interaction to the widgets of the result view
+    def random_action(self):
+        action = self.rng.choice(SESSION_ACTIONS if self.tab == VIZ_TAB else SESSION_ACTIONS[:-1])
+        if action == 'rounding':
+            widget = self.app.selectbox(key='rounding_percentage')
+            widget.set_value(self.rng.choice(ROUNDING_PERCENTAGES))
+        elif action == 'employees':
+            widget = self.app.multiselect(key='result_employees')
+            widget.set_value(self.rng.sample(widget.options, min(self.rng.randint(0, 2), len(widget.options))))
+        elif action == 'departments':
+            widget = self.app.multiselect(key='result_departments')
+            widget.set_value(self.rng.sample(widget.options, min(self.rng.randint(0, 1), len(widget.options))))
+        elif action == 'tab':
+            self.tab = self.rng.choice(RESULT_TABS)
+            self.app.session_state['result_tab'] = self.tab
+        else:
+            widget = [selectbox for selectbox in self.app.selectbox if selectbox.label == "Selectați Vizualizarea"][0]
+            widget.set_value(self.rng.choice(widget.options))
+        self.timed_run(action)
+
+    # Function to run the whole session; the barrier lines the uploads of all sessions up, as at month end
+    def run(self, barrier):
+        try:
+            self.timed_run('first_run')
+            barrier.wait()
+            self.app.file_uploader[0].set_value((f"export_{self.session_id}.csv", self.export, 'text/csv'))
+            self.timed_run('upload')
+            if self.app.exception or not self.app.success:
+                return
+            for _ in range(self.actions):
+                self.random_action()
+        except Exception as e:
+            self.errors.append({'session': self.session_id, 'action': 'harness', 'messages': [repr(e)[:300]]})
+            barrier.abort()
+
+# Function to run a share of the sessions in threads of one worker process, all inside the shared working directory
+def run_process(process_index, session_ids, app_dir, workdir, employees, days, actions):
+    sys.path.insert(0, app_dir)
+    os.chdir(workdir)
+    os.environ['STREAMLIT_LOGGER_LEVEL'] = 'error'
+
+    sessions = [SimulatedSession(os.path.join(app_dir, 'app.py'), session_id, employees, days, actions, seed=session_id)
+                for session_id in session_ids]
+    rss_start = get_rss_mb()
+    barrier = threading.Barrier(len(sessions))
+    threads = [threading.Thread(target=session.run, args=(barrier,), name=f"session-{session.session_id}") for session in sessions]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    end = time.time()
+
+    return {
+        'process': process_index,
+        'pid': os.getpid(),
+        'sessions': len(sessions),
+        'start': start,
+        'end': end,
+        'rss_start_mb': rss_start,
+        'rss_end_mb': get_rss_mb(),
+        'rss_peak_mb': get_peak_rss_mb(),
+        'samples': [sample for session in sessions for sample in session.samples],
+        'errors': [error for session in sessions for error in session.errors],
+    }
+
+# Function to summarize the rerun times of one action: count, percentiles and maximum, in seconds
+def summarize_latencies(timings):
+    timings = np.asarray(timings)
+    summary = {'count': len(timings), 'max': float(timings.max())}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(timings, percentile))
+    return summary
+
+# Function to spread the sessions over the worker processes and collect their results
+def run_load_test(app_dir, sessions, processes, employees, days, actions):
+    workdir = tempfile.mkdtemp(prefix='attendance-load-')
+    session_ids = list(range(sessions))
+    shares = [session_ids[index::processes] for index in range(processes)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_process, index, share, app_dir, workdir, employees, days, actions)
+                   for index, share in enumerate(shares) if share]
+        results = [future.result() for future in futures]
+    return workdir, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive concurrent headless sessions of the Streamlit app and measure rerun latency")
+    parser.add_argument('--app-dir', default=os.getcwd(), help="repository checkout to measure (default: current directory)")
+    parser.add_argument('--sessions', type=int, default=8, help="simulated users in total")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes the sessions are spread over (one app process per worker)")
+    parser.add_argument('--actions', type=int, default=20, help="interactions per session after the upload")
+    parser.add_argument('--size', default="50x28", help="EMPLOYEESxDAYS of every synthetic export")
+    parser.add_argument('--json', help="also write the raw samples and per-process results to this JSON file")
+    args = parser.parse_args()
+
+    (employees, days), = parse_sizes(args.size)
+    workdir, results = run_load_test(os.path.abspath(args.app_dir), args.sessions, args.processes, employees, days, args.actions)
+
+    samples = [sample for result in results for sample in result['samples']]
+    wall = max(result['end'] for result in results) - min(result['start'] for result in results)
+    by_action = {}
+    for action, seconds in samples:
+        by_action.setdefault(action, []).append(seconds)
+
+    print(f"{args.sessions} sessions in {len(results)} processes, {args.size} exports, history in {workdir}")
+    print(f"{'action':<12} {'reruns':>7} " + ' '.join(f"{f'p{percentile} s':>8}" for percentile in PERCENTILES) + f" {'max s':>8}")
+    summaries = {}
+    for action in ['first_run', 'upload'] + SESSION_ACTIONS + ['all']:
+        timings = [seconds for _, seconds in samples] if action == 'all' else by_action.get(action)
+        if not timings:
+            continue
+        summaries[action] = summarize_latencies(timings)
+        summary = summaries[action]
+        print(f"{action:<12} {summary['count']:>7} " + ' '.join(f"{summary[f'p{percentile}']:>8.3f}" for percentile in PERCENTILES) + f" {summary['max']:>8.3f}")
+    print(f"throughput: {len(samples) / wall:.2f} reruns/s over {wall:.1f} s")
+
+    print(f"{'process':>7} {'pid':>8} {'sessions':>8} {'RSS start MB':>13} {'RSS end MB':>11} {'peak MB':>8}")
+    for result in results:
+        print(f"{result['process']:>7} {result['pid']:>8} {result['sessions']:>8} {result['rss_start_mb']:>13.1f} "
+              f"{result['rss_end_mb']:>11.1f} {result['rss_peak_mb']:>8.1f}")
+
+    errors = [error for result in results for error in result['errors']]
+    if errors:
+        print(f"warning: {len(errors)} reruns showed exceptions or errors, first: {errors[0]}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summaries, 'wall_seconds': wall, 'processes': results}, f, indent=2)
@@ -0,0 +1,48 @@
+# Usage (from the repository root): python -m benchmarks.bench_raw_events --sizes 200x31,2000x31 --chunk-rows 100000,500000
+
+import argparse
+import io
+import time
+import tracemalloc
+
+from benchmarks.generate_export import generate_raw_events_csv
+from benchmarks.run_benchmarks import parse_sizes
+from raw_events import RAW_EVENT_CHUNK_ROWS, read_punch_shifts
+
+DEFAULT_SIZES = "200x31,1000x31"
+
+# Function to time the chunked event reduction (best of `repeat` runs) and measure its tracemalloc peak
+def time_reduction(content, chunk_rows, repeat):
+    best = None
+    shifts = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        shifts, _ = read_punch_shifts(io.StringIO(content), chunk_rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    read_punch_shifts(io.StringIO(content), chunk_rows)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return shifts, best, peak_bytes / 1024 ** 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the chunked raw punch event reduction")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"EMPLOYEESxDAYS list (default: {DEFAULT_SIZES})")
+    parser.add_argument('--chunk-rows', default=str(RAW_EVENT_CHUNK_ROWS), help="comma separated chunk sizes to compare")
+    parser.add_argument('--extra-punches', type=int, default=2, help="punches per day besides the entry and the exit")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'events':>10} {'chunk':>9} {'shifts':>8} {'seconds':>9} {'events/s':>12} {'peak MB':>8}")
+    for employees, days in parse_sizes(args.sizes):
+        content = generate_raw_events_csv(employees, days, extra_punches=args.extra_punches)
+        event_count = content.count('\n') - 1
+        for chunk_rows in [int(value) for value in args.chunk_rows.split(',')]:
+            shifts, seconds, peak_mb = time_reduction(content, chunk_rows, args.repeat)
+            size = f"{employees}x{days}"
+            print(f"{size:>10} {event_count:>10} {chunk_rows:>9} {len(shifts):>8} {seconds:>9.4f} "
+                  f"{event_count / seconds:>12,.0f} {peak_mb:>8.1f}")
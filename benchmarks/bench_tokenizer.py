@@ -0,0 +1,95 @@
+# Usage (from the repository root): python -m benchmarks.bench_tokenizer --sizes 50x28,500x91
+
+import argparse
+import re
+import time
+
+from attendance import tokenize_attendance_export
+from benchmarks.generate_export import generate_export_csv
+from benchmarks.run_benchmarks import parse_sizes
+
+DEFAULT_SIZES = "50x28,200x91,1000x91"
+
+# Reference copy of the previous line classifier: up to four regexes per raw line split on commas.
+# It returns the same week tuples as tokenize_attendance_export so both can be compared.
+def legacy_regex_weeks(file_content):
+    lines = file_content.strip().split('\n')
+    weeks = []
+    current_employee = None
+    department = None
+    badge_id = None
+    weekdays = None
+    dates = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        employee_match = re.search(r',([^,]+\s+[^,]+\s+\d+),([^,]*),', line)
+        if employee_match:
+            current_employee = employee_match.group(1).strip()
+            department = employee_match.group(2).strip()
+            badge_match = re.search(r'(\d{3}[A-Z0-9]+)$', line)
+            badge_id = badge_match.group(1) if badge_match else "N/A"
+            continue
+
+        if line.startswith('Mon,Tue,Wed,Thu,Fri,Sat,Sun'):
+            weekdays = line.split(',')
+            continue
+
+        date_line_match = re.match(r'\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,\d+\s+\w+,', line)
+        if date_line_match:
+            dates = []
+            for date_str in line.split(','):
+                date_str = date_str.strip()
+                if date_str and re.match(r'\d+\s+\w+', date_str):
+                    dates.append(date_str)
+                else:
+                    dates.append(None)
+            continue
+
+        time_range_match = re.match(r'(\d{1,2}:\d{2}\s+-\s+\d{1,2}:\d{2})?,(\d{1,2}:\d{2}\s+-\s+\d{1,2}:\d{2})?,', line)
+        if time_range_match:
+            days_data = [d.strip() if d.strip() else None for d in line.split(',')]
+            if current_employee:
+                weeks.append((current_employee, department, badge_id, weekdays, dates, days_data))
+            continue
+
+    return weeks
+
+# Function to time a parser over the same content (best of `repeat` runs)
+def time_parser(func, file_content, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(file_content)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the csv.reader tokenizer with the legacy regex cascade")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"EMPLOYEESxDAYS list (default: {DEFAULT_SIZES})")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'lines':>8} {'regex s':>9} {'csv s':>9} {'regex lines/s':>14} {'csv lines/s':>12} {'speedup':>8} {'same weeks':>10}")
+    for employees, days in parse_sizes(args.sizes):
+        # Whole weeks only: the legacy classifier cannot read partial weeks
+        file_content = generate_export_csv(employees, days - days % 7 or 7)
+        line_count = file_content.count('\n')
+
+        legacy_weeks, legacy_seconds = time_parser(legacy_regex_weeks, file_content, args.repeat)
+        (_, weeks, _), csv_seconds = time_parser(tokenize_attendance_export, file_content, args.repeat)
+
+        same = len(weeks) == len(legacy_weeks) and all(
+            week[:3] == legacy[:3] and week[4] == legacy[4][:7] and week[5] == legacy[5][:7]
+            for week, legacy in zip(weeks, legacy_weeks)
+        )
+        size = f"{employees}x{days}"
+        print(f"{size:>10} {line_count:>8} {legacy_seconds:>9.4f} {csv_seconds:>9.4f} "
+              f"{line_count / legacy_seconds:>14,.0f} {line_count / csv_seconds:>12,.0f} "
+              f"{legacy_seconds / csv_seconds:>7.2f}x {'yes' if same else 'no':>10}")
@@ -0,0 +1,149 @@
+# Usage (from the repository root): python -m benchmarks.generate_export --employees 50 --days 28 [--format xlsx|events] export.csv
+
+import argparse
+import io
+import random
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from attendance import WEEKDAY_NAMES, is_holiday
+
+FIRST_NAMES = ['Ion', 'Maria', 'Andrei', 'Elena', 'Mihai', 'Ioana', 'Alexandru', 'Ana', 'Cristian', 'Gabriela',
+               'Vlad', 'Raluca', 'Stefan', 'Diana', 'Radu', 'Laura', 'George', 'Irina', 'Florin', 'Simona']
+LAST_NAMES = ['Popescu', 'Ionescu', 'Popa', 'Constantin', 'Stan', 'Dumitru', 'Dinu', 'Gheorghe', 'Stoica', 'Matei',
+              'Ciobanu', 'Rusu', 'Munteanu', 'Marin', 'Tudor', 'Barbu', 'Nistor', 'Florea', 'Lazar', 'Moldovan']
+DEPARTMENTS = ['Vanzari', 'Contabilitate', 'Resurse Umane', 'IT', 'Logistica', 'Productie', 'Achizitii']
+
+EXPORT_TITLE = "Report by first and last card presenting per calendar day"
+
+# Function to format minutes since midnight as HH:MM
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+# Function to draw one worked day as "HH:MM - HH:MM"
+def random_time_range(rng, weekday):
+    arrival = int(rng.gauss(8 * 60 + 30, 12))
+    if weekday == 4:  # Friday ends at 14:30
+        departure = int(rng.gauss(14 * 60 + 30, 15))
+    else:  # Monday to Thursday end at 17:00
+        departure = int(rng.gauss(17 * 60, 20))
+    return f"{format_minutes(arrival)} - {format_minutes(departure)}"
+
+# Function to generate the rows (lists of cells) of a synthetic attendance export
+def generate_export_rows(employees, days, start=date(2025, 3, 3), absence_rate=0.05, weekend_rate=0.02, seed=0):
+    rng = random.Random(seed)
+    end = start + timedelta(days=days - 1)
+
+    rows = [
+        [EXPORT_TITLE],
+        [f"from {start.day} {start:%B %Y} to {end.day} {end:%B %Y}"],
+        [],
+    ]
+
+    # Calendar weeks (Monday to Sunday) covering the report interval
+    first_monday = start - timedelta(days=start.weekday())
+    weeks = []
+    week_start = first_monday
+    while week_start <= end:
+        weeks.append([week_start + timedelta(days=offset) for offset in range(7)])
+        week_start += timedelta(days=7)
+
+    for employee_idx in range(employees):
+        number = 100 + employee_idx
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {number}"
+        department = rng.choice(DEPARTMENTS)
+        badge_id = f"{number}{rng.choice('ABCDEFGH')}{rng.randint(10, 99)}"
+        rows.append(['', name, department, '', '', '', badge_id])
+
+        for week in weeks:
+            date_cells = []
+            time_cells = []
+            for day in week:
+                if day < start or day > end:
+                    date_cells.append('')
+                    time_cells.append('')
+                    continue
+
+                date_cells.append(f"{day.day} {day:%B}")
+
+                weekday = day.weekday()
+                if weekday >= 5:
+                    worked = rng.random() < weekend_rate
+                else:
+                    worked = not is_holiday(day) and rng.random() >= absence_rate
+                time_cells.append(random_time_range(rng, weekday) if worked else '')
+
+            rows.append(list(WEEKDAY_NAMES))
+            rows.append(date_cells)
+            rows.append(time_cells)
+
+    return rows
+
+# Function to generate raw punch events (badge, timestamp, door) for the same synthetic employees.
+# Every `night_every`-th employee works 22:00-06:00 night shifts; the others punch a few extra times during the day.
+def generate_raw_events_csv(employees, days, start=date(2025, 3, 3), absence_rate=0.05, extra_punches=2, night_every=5, seed=0):
+    rng = random.Random(seed)
+    rows = ['badge,timestamp,door']
+    doors = ['Intrare', 'Depozit', 'Birouri']
+
+    for employee_idx in range(employees):
+        badge_id = f"{100 + employee_idx}{rng.choice('ABCDEFGH')}{rng.randint(10, 99)}"
+        night_shift = night_every and employee_idx % night_every == night_every - 1
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            if day.weekday() >= 5 or is_holiday(day) or rng.random() < absence_rate:
+                continue
+
+            if night_shift:
+                arrival = int(rng.gauss(22 * 60, 10))
+                departure = int(rng.gauss(30 * 60, 10))  # 06:00 the next day
+            else:
+                arrival = int(rng.gauss(8 * 60 + 30, 12))
+                departure = int(rng.gauss(14 * 60 + 30 if day.weekday() == 4 else 17 * 60, 15))
+            punches = [arrival, departure] + sorted(rng.randint(arrival, departure) for _ in range(extra_punches))
+            for minutes in sorted(punches):
+                moment = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minutes, seconds=rng.randint(0, 59))
+                rows.append(f"{badge_id},{moment:%Y-%m-%d %H:%M:%S},{rng.choice(doors)}")
+
+    return '\n'.join(rows) + '\n'
+
+# Function to render a synthetic export as CSV text
+def generate_export_csv(employees, days, **kwargs):
+    rows = generate_export_rows(employees, days, **kwargs)
+    return '\n'.join(','.join(row) for row in rows) + '\n'
+
+# Function to render a synthetic export as an XLSX workbook
+def generate_export_xlsx(employees, days, **kwargs):
+    rows = generate_export_rows(employees, days, **kwargs)
+    width = max(len(row) for row in rows)
+    sheet = pd.DataFrame([row + [''] * (width - len(row)) for row in rows if row])
+
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        sheet.to_excel(writer, index=False, header=False, sheet_name='Sheet1')
+    return output.getvalue()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic attendance export")
+    parser.add_argument('--employees', type=int, default=50)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2025, 3, 3), help="first day (YYYY-MM-DD)")
+    parser.add_argument('--absence-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['csv', 'xlsx', 'events'], default='csv',
+                        help="events: raw punch events (badge, timestamp, door) instead of the report export")
+    parser.add_argument('output', help="destination file")
+    args = parser.parse_args()
+
+    options = dict(start=args.start, absence_rate=args.absence_rate, seed=args.seed)
+    if args.format == 'xlsx':
+        with open(args.output, 'wb') as f:
+            f.write(generate_export_xlsx(args.employees, args.days, **options))
+    elif args.format == 'events':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(generate_raw_events_csv(args.employees, args.days, **options))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(generate_export_csv(args.employees, args.days, **options))
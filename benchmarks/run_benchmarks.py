@@ -0,0 +1,150 @@
+# Usage (from the repository root): python -m benchmarks.run_benchmarks --sizes 10x28,25x91 [--format xlsx] [--json results.json]
+
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import attendance
+from attendance import (
+    excel_sheet_to_csv_text,
+    load_historical_data,
+    process_attendance_data,
+    save_to_historical_data,
+    to_csv_bytes,
+    to_excel_bytes,
+)
+from benchmarks.generate_export import generate_export_csv, generate_export_xlsx
+from charts import VIZ_TYPES, build_viz_figures
+
+DEFAULT_SIZES = "10x28,25x91"
+
+# Function to parse "EMPLOYEESxDAYS[,EMPLOYEESxDAYS...]" into (employees, days) pairs
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(','):
+        employees, days = item.lower().split('x')
+        sizes.append((int(employees), int(days)))
+    return sizes
+
+# Function to time a stage (best of `repeat` runs) and record its tracemalloc peak
+def measure(func, repeat, track_memory):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    peak_bytes = None
+    if track_memory:
+        tracemalloc.start()
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, min(timings), peak_bytes
+
+# Function to remove any history written by a previous run
+def reset_history():
+    shutil.rmtree(os.path.dirname(attendance.HISTORY_PATH), ignore_errors=True)
+
+# Function to benchmark every pipeline stage for one export size
+def benchmark_size(employees, days, file_format, repeat, track_memory):
+    results = []
+
+    def record(stage, func, rows=None):
+        result, seconds, peak_bytes = measure(func, repeat, track_memory)
+        results.append({
+            'employees': employees,
+            'days': days,
+            'format': file_format,
+            'stage': stage,
+            'rows': rows(result) if rows else None,
+            'seconds': seconds,
+            'peak_mb': peak_bytes / 1024 ** 2 if peak_bytes is not None else None,
+        })
+        return result
+
+    if file_format == 'xlsx':
+        raw = generate_export_xlsx(employees, days)
+        file_content = record('decode', lambda: excel_sheet_to_csv_text(io.BytesIO(raw)))
+    else:
+        raw = generate_export_csv(employees, days).encode('utf-8')
+        file_content = record('decode', lambda: raw.decode('utf-8'))
+
+    daily_df, weekly_df, monthly_df, _, _ = record(
+        'parse', lambda: process_attendance_data(file_content), rows=lambda result: len(result[0])
+    )
+
+    def save_into_empty_history():
+        reset_history()
+        return save_to_historical_data(daily_df)
+
+    def save_over_existing_history():
+        reset_history()
+        save_to_historical_data(daily_df)
+        return save_to_historical_data(daily_df)
+
+    record('history_save', save_into_empty_history, rows=len)
+    record('history_save_merge', save_over_existing_history, rows=len)
+    record('history_load', load_historical_data, rows=len)
+    record('history_load_columns', lambda: load_historical_data(columns=['Angajat', 'Data_Obiect', 'Durata (Ore)']), rows=len)
+    reset_history()
+
+    record('export_csv', lambda: to_csv_bytes(daily_df), rows=lambda _: len(daily_df))
+    record('export_excel', lambda: to_excel_bytes(daily_df), rows=lambda _: len(daily_df))
+
+    def build_all_figures():
+        payload = []
+        for viz_type in VIZ_TYPES:
+            for fig in build_viz_figures(viz_type, daily_df, weekly_df, 'Toți', 0):
+                payload.append(fig.to_json())
+        return payload
+
+    record('charts', build_all_figures, rows=lambda _: len(daily_df))
+
+    return results
+
+# Function to print results as an aligned table
+def print_results(results):
+    print(f"{'size':>10} {'format':>6} {'stage':<20} {'rows':>8} {'seconds':>9} {'peak MB':>8}")
+    for result in results:
+        size = f"{result['employees']}x{result['days']}"
+        rows = result['rows'] if result['rows'] is not None else ''
+        peak = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else ''
+        print(f"{size:>10} {result['format']:>6} {result['stage']:<20} {rows:>8} {result['seconds']:>9.4f} {peak:>8}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the attendance pipeline on synthetic exports")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"EMPLOYEESxDAYS list (default: {DEFAULT_SIZES})")
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage, the best one is reported")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc peak memory pass")
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    # History is written under the relative data/ directory, keep it out of the working tree
+    workdir = tempfile.mkdtemp(prefix='attendance-bench-')
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = []
+        for employees, days in parse_sizes(args.sizes):
+            results.extend(benchmark_size(employees, days, args.format, args.repeat, not args.no_memory))
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
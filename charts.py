@@ -0,0 +1,339 @@
+import math
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+from schedules import WEEKDAY_NAMES, WEEKDAYS, clock_to_minutes, get_compiled_schedules, get_schedules_version
+
+# Visualization types offered in the "Vizualizări" tab
+VIZ_TYPES = ["Ore Zilnice per Angajat", "Comparație Săptămânală", "Distribuția Orelor de Sosire", "Distribuția Orelor de Plecare", "Prezența Zilnică"]
+
+# Built figures kept in memory, as Plotly JSON, per (visualization, employee, rounding %, dataset hash,
+# schedules version); the least recently shown are dropped first
+FIGURE_CACHE_ENTRIES = 32
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+# Function to sort a frame indexed by the 'Data' label in calendar order
+def sort_by_date_label(df, viz_df):
+    date_obj_map = {}
+    for date_str, date_obj in zip(viz_df['Data'], viz_df['Data_Obiect']):
+        if date_str not in date_obj_map and not pd.isna(date_obj):
+            date_obj_map[date_str] = date_obj
+
+    if not date_obj_map:
+        return df
+
+    df = df.copy()
+    df['sort_key'] = pd.Series(date_obj_map)
+    return df.sort_values('sort_key').drop('sort_key', axis=1)
+
+# Function to convert "HH:MM" strings to fractional hours
+def time_to_hours(time_series):
+    parts = time_series.astype(str).str.extract(r'^\s*(\d{1,2}):(\d{2})')
+    return parts[0].astype(float) + parts[1].astype(float) / 60
+
+# Function to build the daily hours chart
+def build_daily_hours_figures(viz_df, selected_employee):
+    # If filtering by employee, show day by day data
+    if selected_employee != 'Toți':
+        daily_merged = viz_df.groupby('Data', as_index=False)[['Durata (Ore)', 'Ore Standard']].sum()
+
+        # Sort by date if available
+        if 'Data_Obiect' in viz_df.columns:
+            date_mapping = dict(zip(viz_df['Data'], viz_df['Data_Obiect']))
+            daily_merged['Data_Obiect'] = daily_merged['Data'].map(date_mapping)
+            daily_merged = daily_merged.sort_values('Data_Obiect')
+
+        fig = px.bar(
+            daily_merged,
+            x='Data',
+            y=['Durata (Ore)', 'Ore Standard'],
+            barmode='group',
+            title=f"Ore Zilnice Lucrate: {selected_employee}",
+            labels={"value": "Ore", "Data": "Data", "variable": "Tip"},
+            height=500,
+            color_discrete_map={'Durata (Ore)': '#4CAF50', 'Ore Standard': '#2196F3'}
+        )
+        return [fig]
+
+    # Group by employee and date
+    pivot_df = viz_df.pivot_table(
+        index='Data',
+        columns='Angajat',
+        values='Durata (Ore)',
+        aggfunc='sum',
+        observed=True
+    ).fillna(0)
+
+    # Sort pivot table by date if possible
+    pivot_df = sort_by_date_label(pivot_df, viz_df)
+
+    fig = px.bar(
+        pivot_df,
+        barmode='group',
+        title="Ore Zilnice Lucrate per Angajat",
+        labels={"value": "Ore", "Data": "Data", "variable": "Angajat"},
+        height=600
+    )
+    return [fig]
+
+# Function to build the weekly comparison charts
+def build_weekly_comparison_figures(weekly_df, selected_employee, rounding_percentage):
+    # Filter weekly df based on selected employee
+    if selected_employee != 'Toți':
+        filtered_weekly_viz = weekly_df[weekly_df['Angajat'] == selected_employee]
+    else:
+        filtered_weekly_viz = weekly_df
+
+    if filtered_weekly_viz.empty:
+        return []
+
+    # Apply rounding if selected
+    weekly_viz_df = filtered_weekly_viz.copy()
+    if rounding_percentage > 0:
+        weekly_viz_df['Ore Totale'] = weekly_viz_df['Ore Totale'].apply(
+            lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
+        )
+        weekly_viz_df['Diferență'] = weekly_viz_df['Ore Totale'] - weekly_viz_df['Ore Standard']
+
+    x_column = 'Angajat' if selected_employee == 'Toți' else 'Interval'
+
+    # Create comparison chart
+    weekly_comp_fig = px.bar(
+        weekly_viz_df,
+        x=x_column,
+        y=['Ore Totale', 'Ore Standard'],
+        barmode='group',
+        title="Ore Săptămânale: Efectiv vs. Standard",
+        labels={"value": "Ore", "variable": "Categorie"},
+        height=500,
+        color_discrete_map={'Ore Totale': '#4CAF50', 'Ore Standard': '#2196F3'}
+    )
+
+    # Create difference chart
+    weekly_diff_fig = px.bar(
+        weekly_viz_df,
+        x=x_column,
+        y='Diferență',
+        title="Diferența de Ore față de Programul Standard",
+        labels={"Diferență": "Ore +/-"},
+        color='Diferență',
+        color_continuous_scale=["red", "yellow", "green"],
+        height=500
+    )
+
+    weekly_diff_fig.add_hline(y=0, line_width=2, line_dash="dash", line_color="gray")
+
+    return [weekly_comp_fig, weekly_diff_fig]
+
+# Function to return the reference lines (hour, label) of the work schedule followed by the charted
+# rows: the shift starts for arrivals, the shift ends for departures. The policy in effect on the
+# last charted day is used; when the rows follow different policies there are no lines.
+def get_schedule_reference_lines(time_df, time_column):
+    day = pd.Timestamp(time_df['Data_Obiect'].max() if 'Data_Obiect' in time_df.columns else None)
+    if pd.isna(day):
+        day = pd.Timestamp(date.today())
+    schedules = get_compiled_schedules()
+    departments = time_df['Departament'].astype(str).unique() if 'Departament' in time_df.columns else [None]
+    policies = {id(policy): policy for policy in (schedules.get_policy(day, department) for department in departments)}
+
+    badges = set(time_df['ID Legitimație'].astype(str)) if 'ID Legitimație' in time_df.columns else set()
+    badge_policies = [policy for policy in schedules.policies if badges & set(policy.get('badges', []))
+                      and not (policy.get('start') and day < pd.Timestamp(policy['start']))
+                      and not (policy.get('end') and day > pd.Timestamp(policy['end']))]
+    if len(policies) != 1 or badge_policies or None in policies.values():
+        return []
+
+    # Runs of consecutive weekdays with the same shift start (or end), per time:
+    # e.g. {'17:00': ['Luni-Joi'], '14:30': ['Vineri']}
+    shifts = next(iter(policies.values())).get('shifts', {})
+    clocks = [shifts[day][0 if time_column == 'Ora Sosire' else 1] if day in shifts else None for day in WEEKDAYS]
+    shift_days = {}
+    first = 0
+    for index in range(1, len(clocks) + 1):
+        if index < len(clocks) and clocks[index] == clocks[first]:
+            continue
+        if clocks[first] is not None:
+            last = index - 1
+            days_label = WEEKDAY_NAMES[first] if first == last else f"{WEEKDAY_NAMES[first]}-{WEEKDAY_NAMES[last]}"
+            shift_days.setdefault(clocks[first], []).append(days_label)
+        first = index
+    prefix = "Început" if time_column == 'Ora Sosire' else "Sfârșit"
+    return [(clock_to_minutes(clock) / 60, f"{prefix} {', '.join(days_labels)} ({clock})") for clock, days_labels in shift_days.items()]
+
+# Function to build the arrival or departure time histogram
+def build_time_distribution_figures(viz_df, selected_employee, time_column):
+    # Convert time strings to numeric for visualization
+    numeric_column = f"{time_column} (Numeric)"
+    time_df = viz_df.copy()
+    time_df[numeric_column] = time_to_hours(time_df[time_column])
+
+    # Filter out None values
+    time_df = time_df.dropna(subset=[numeric_column])
+
+    if time_df.empty:
+        return []
+
+    if time_column == 'Ora Sosire':
+        range_x = [6, 12]  # Focus on 6 AM to 12 PM
+        title = "Distribuția Orelor de Sosire"
+        single_color = '#2196F3'
+    else:
+        range_x = [14, 20]  # Focus on 2 PM to 8 PM
+        title = "Distribuția Orelor de Plecare"
+        single_color = '#4CAF50'
+
+    # The view is widened to the shift times of schedules outside the usual hours (night shifts)
+    reference_lines = get_schedule_reference_lines(time_df, time_column)
+    for hour, _ in reference_lines:
+        if not range_x[0] <= hour <= range_x[1]:
+            range_x = [min(range_x[0], math.floor(hour) - 1), max(range_x[1], math.ceil(hour) + 1)]
+
+    if selected_employee != 'Toți':
+        fig = px.histogram(
+            time_df,
+            x=numeric_column,
+            nbins=24,
+            range_x=range_x,
+            title=f"{title} pentru {selected_employee}",
+            labels={numeric_column: "Ora Zilei", "count": "Frecvență"},
+            height=500,
+            color_discrete_sequence=[single_color]
+        )
+    else:
+        fig = px.histogram(
+            time_df,
+            x=numeric_column,
+            color='Angajat',
+            nbins=24,
+            range_x=range_x,
+            title=title,
+            labels={numeric_column: "Ora Zilei", "count": "Frecvență"},
+            height=500
+        )
+
+    # Reference lines at the shift times of the schedule
+    for index, (hour, label) in enumerate(reference_lines):
+        fig.add_vline(x=hour, line_width=2, line_dash="dash", line_color="red" if index == 0 else "orange", annotation_text=label)
+
+    return [fig]
+
+# Function to build the daily presence heatmap and worked vs. standard bars
+def build_presence_figures(viz_df, selected_employee):
+    presence_df = viz_df
+    if 'Data_Obiect' in presence_df.columns:
+        presence_df = presence_df.sort_values('Data_Obiect')
+
+    # Create presence heatmap
+    if selected_employee != 'Toți':
+        # For single employee, show date vs. status
+        pivot_presence = presence_df.pivot_table(
+            index='Data',
+            values='Durata (Ore)',
+            aggfunc='sum',
+            observed=True
+        ).fillna(0)
+
+        presence_heatmap = px.imshow(
+            pivot_presence,
+            title=f"Prezența Zilnică pentru {selected_employee}",
+            labels=dict(x="Data", color="Ore"),
+            color_continuous_scale=["white", "yellow", "green"],
+            height=300
+        )
+    else:
+        # For all employees, show employee vs. date
+        pivot_presence = presence_df.pivot_table(
+            index='Angajat',
+            columns='Data',
+            values='Durata (Ore)',
+            aggfunc='sum',
+            observed=True
+        ).fillna(0)
+
+        presence_heatmap = px.imshow(
+            pivot_presence,
+            title="Prezența Zilnică per Angajat",
+            labels=dict(x="Data", y="Angajat", color="Ore"),
+            color_continuous_scale=["white", "yellow", "green"],
+            height=400
+        )
+
+    figures = [presence_heatmap]
+
+    # Worked vs. standard hours summed per day
+    daily_combined = viz_df.groupby('Data', as_index=False)[['Durata (Ore)', 'Ore Standard']].sum()
+    daily_combined = daily_combined.rename(columns={
+        'Durata (Ore)': 'Durata (Ore)_Actual',
+        'Ore Standard': 'Ore Standard_Standard'
+    })
+
+    if not daily_combined.empty:
+        # Sort by date if possible
+        if 'Data_Obiect' in viz_df.columns:
+            date_mapping = dict(zip(viz_df['Data'], viz_df['Data_Obiect']))
+            daily_combined['Data_Obiect'] = daily_combined['Data'].map(date_mapping)
+            daily_combined = daily_combined.sort_values('Data_Obiect')
+
+        daily_bar = px.bar(
+            daily_combined,
+            x='Data',
+            y=['Durata (Ore)_Actual', 'Ore Standard_Standard'],
+            barmode='group',
+            title="Ore Lucrate vs. Standard pe Zile",
+            labels={"value": "Ore", "variable": "Tip"},
+            height=400,
+            color_discrete_map={'Durata (Ore)_Actual': '#4CAF50', 'Ore Standard_Standard': '#2196F3'}
+        )
+        figures.append(daily_bar)
+
+    return figures
+
+# Function to build the figures of one visualization type
+def build_viz_figures(viz_type, viz_df, weekly_df, selected_employee, rounding_percentage):
+    if viz_type == "Ore Zilnice per Angajat":
+        return build_daily_hours_figures(viz_df, selected_employee)
+    elif viz_type == "Comparație Săptămânală":
+        return build_weekly_comparison_figures(weekly_df, selected_employee, rounding_percentage)
+    elif viz_type == "Distribuția Orelor de Sosire":
+        return build_time_distribution_figures(viz_df, selected_employee, 'Ora Sosire')
+    elif viz_type == "Distribuția Orelor de Plecare":
+        return build_time_distribution_figures(viz_df, selected_employee, 'Ora Plecare')
+    elif viz_type == "Prezența Zilnică":
+        return build_presence_figures(viz_df, selected_employee)
+    return []
+
+# Function to round positive worked hours up by a percentage, on a copy of the frame
+def round_up_hours(viz_df, rounding_percentage):
+    viz_df = viz_df.copy()
+    if rounding_percentage > 0:
+        viz_df['Durata (Ore)'] = viz_df['Durata (Ore)'].map(
+            lambda x: round(x * (1 + rounding_percentage/100), 2) if x > 0 else x
+        )
+    return viz_df
+
+# Function to return the figures of one visualization, building them only when this visualization,
+# employee, rounding and dataset were not shown recently. `dataset_hash` must identify the rows of
+# both frames. The cache holds the JSON of the figures, shared by all sessions, and every call
+# returns new figure objects that the caller may change.
+def get_viz_figures(viz_type, daily_df, weekly_df, selected_employee, rounding_percentage, dataset_hash):
+    key = (viz_type, selected_employee, rounding_percentage, dataset_hash, get_schedules_version())
+    with _figure_cache_lock:
+        figure_json = _figure_cache.get(key)
+        if figure_json is not None:
+            _figure_cache.move_to_end(key)
+
+    if figure_json is None:
+        figures = build_viz_figures(viz_type, round_up_hours(daily_df, rounding_percentage), weekly_df, selected_employee, rounding_percentage)
+        figure_json = tuple(fig.to_json() for fig in figures)
+        with _figure_cache_lock:
+            _figure_cache[key] = figure_json
+            while len(_figure_cache) > FIGURE_CACHE_ENTRIES:
+                _figure_cache.popitem(last=False)
+    return [pio.from_json(fig_json) for fig_json in figure_json]
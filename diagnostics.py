@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+import marshal
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Records wall time, row counts and tracemalloc peak of pipeline stages.
+# A disabled recorder is a no-op, so callers can pass one unconditionally.
+# tracemalloc is process-wide: with several sessions measuring at once the
+# memory peaks include allocations made by the other sessions.
+class StageRecorder:
+    def __init__(self, enabled=True, track_memory=True):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self.records = []
+        self._current = None
+        self._started_tracing = False
+
+    # Function to start timing a stage
+    def begin(self, name):
+        if not self.enabled:
+            return
+
+        start_bytes = 0
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+
+        self._current = {'stage': name, 'start': time.perf_counter(), 'start_bytes': start_bytes}
+
+    # Function to finish the current stage and log it
+    def end(self, rows=None):
+        if not self.enabled or self._current is None:
+            return
+
+        seconds = time.perf_counter() - self._current['start']
+        peak_mb = None
+        if self.track_memory and tracemalloc.is_tracing():
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            peak_mb = round(max(peak_bytes - self._current['start_bytes'], 0) / 1024 ** 2, 3)
+
+        record = {
+            'stage': self._current['stage'],
+            'seconds': round(seconds, 4),
+            'rows': rows,
+            'peak_mb': peak_mb,
+        }
+        self.records.append(record)
+        self._current = None
+
+        logger.info(json.dumps({'event': 'pipeline_stage', **record}, ensure_ascii=False))
+
+    @contextmanager
+    def stage(self, name):
+        stats = {}
+        self.begin(name)
+        try:
+            yield stats
+        finally:
+            self.end(rows=stats.get('rows'))
+
+    # Function to stop tracemalloc if this recorder started it
+    def close(self):
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.records, columns=['stage', 'seconds', 'rows', 'peak_mb'])
+        return frame.rename(columns={
+            'stage': 'Etapă',
+            'seconds': 'Durată (s)',
+            'rows': 'Rânduri',
+            'peak_mb': 'Vârf Memorie (MB)',
+        })
+
+# Function to serialize a finished cProfile run in the .prof format read by pstats/snakeviz
+def profile_to_bytes(profiler):
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+# Function to summarize a finished cProfile run as text
+def profile_summary(profiler, limit=25):
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,131 @@
+# Usage (from the repository root):
+#   python export_bundle.py bundle.zip [--format parquet|arrow|csv] [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+#                                      [--employee NAME ...] [--department NAME ...]
+# Writes the stored history (daily rows, ISO weeks and the employee-month cube) as a ZIP bundle;
+# use "-" as the output to stream the archive to stdout.
+
+import argparse
+import json
+import logging
+import sys
+import time
+import zipfile
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from attendance import build_weekly_history, get_history_version, load_historical_data, load_history_cube
+
+logger = logging.getLogger(__name__)
+
+# Member file extension and ZIP compression of every bundle format. Parquet is already
+# compressed, so it is stored as is; Arrow IPC and CSV are deflated.
+BUNDLE_FORMATS = {
+    'parquet': ('parquet', zipfile.ZIP_STORED),
+    'arrow': ('arrow', zipfile.ZIP_DEFLATED),
+    'csv': ('csv', zipfile.ZIP_DEFLATED),
+}
+
+# Rows converted and written at a time, so only one chunk of each table is held in Arrow form
+EXPORT_CHUNK_ROWS = 100_000
+
+BUNDLE_MIME_TYPE = 'application/zip'
+
+# Function to describe the columns of a table for the manifest
+def describe_columns(df, schema):
+    return [
+        {'name': field.name, 'type': str(field.type), 'pandas_dtype': str(df[field.name].dtype)}
+        for field in schema
+    ]
+
+# Function to write one frame into an open archive, chunk by chunk, and return its manifest entry
+def write_bundle_member(archive, name, df, bundle_format, chunk_rows=EXPORT_CHUNK_ROWS):
+    extension, compression = BUNDLE_FORMATS[bundle_format]
+    member_info = zipfile.ZipInfo(f"{name}.{extension}", date_time=time.localtime()[:6])
+    member_info.compress_type = compression
+
+    df = df.reset_index(drop=True)
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+    with archive.open(member_info, 'w', force_zip64=True) as member:
+        writer = None
+        if bundle_format == 'parquet':
+            writer = pq.ParquetWriter(member, schema)
+        elif bundle_format == 'arrow':
+            writer = pa.ipc.new_file(member, schema)
+        elif df.empty:
+            member.write(df.to_csv(index=False).encode('utf-8'))
+
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            if writer is None:
+                member.write(chunk.to_csv(index=False, header=start == 0, date_format='%Y-%m-%d').encode('utf-8'))
+            else:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+        if writer is not None:
+            writer.close()
+
+    return {'name': name, 'file': member_info.filename, 'rows': len(df), 'columns': describe_columns(df, schema)}
+
+# Function to write frames ({name: frame}) as a ZIP bundle with a manifest.json describing them.
+# `output` may be a path or any writable binary stream, seekable or not (e.g. stdout or an HTTP response).
+def write_export_bundle(output, frames, bundle_format='parquet', details=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    if bundle_format not in BUNDLE_FORMATS:
+        raise ValueError(f"Format necunoscut '{bundle_format}' (acceptate: {', '.join(BUNDLE_FORMATS)})")
+
+    with zipfile.ZipFile(output, 'w') as archive:
+        tables = [write_bundle_member(archive, name, df, bundle_format, chunk_rows) for name, df in frames.items()]
+        manifest = {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'format': bundle_format,
+            **(details or {}),
+            'tables': tables,
+        }
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2, default=str))
+    return manifest
+
+# Function to select the history rows of the given employees, departments and date range as bundle frames
+def get_history_bundle_frames(employees=None, departments=None, start=None, end=None):
+    daily_df = load_historical_data()
+    cube_df = load_history_cube()
+    if daily_df.empty:
+        return {'daily': daily_df, 'weekly': build_weekly_history(daily_df), 'monthly': cube_df}
+
+    daily_mask = pd.Series(True, index=daily_df.index)
+    cube_mask = pd.Series(True, index=cube_df.index)
+    if employees:
+        daily_mask &= daily_df['Angajat'].isin(employees)
+        cube_mask &= cube_df['Angajat'].isin(employees)
+    if departments:
+        daily_mask &= daily_df['Departament'].isin(departments)
+        cube_mask &= cube_df['Departament'].isin(departments)
+    cube_months = cube_df['An'] * 12 + cube_df['Luna']
+    if start is not None:
+        daily_mask &= daily_df['Data_Obiect'] >= pd.Timestamp(start)
+        cube_mask &= cube_months >= start.year * 12 + start.month
+    if end is not None:
+        daily_mask &= daily_df['Data_Obiect'] <= pd.Timestamp(end)
+        cube_mask &= cube_months <= end.year * 12 + end.month
+
+    daily_df = daily_df[daily_mask]
+    return {'daily': daily_df, 'weekly': build_weekly_history(daily_df), 'monthly': cube_df[cube_mask]}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the attendance history as a ZIP bundle for BI tools")
+    parser.add_argument('output', help="destination ZIP file, or - for stdout")
+    parser.add_argument('--format', choices=list(BUNDLE_FORMATS), default='parquet')
+    parser.add_argument('--start', type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument('--end', type=date.fromisoformat, help="last day (YYYY-MM-DD)")
+    parser.add_argument('--employee', action='append', help="repeat to export several employees")
+    parser.add_argument('--department', action='append', help="repeat to export several departments")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    frames = get_history_bundle_frames(args.employee, args.department, args.start, args.end)
+    output = sys.stdout.buffer if args.output == '-' else args.output
+    manifest = write_export_bundle(output, frames, args.format, {'source': 'history', 'history_version': get_history_version()})
+    logger.info("Pachet %s scris: %s", args.format, ', '.join(f"{table['name']} ({table['rows']} rânduri)" for table in manifest['tables']))
@@ -0,0 +1,204 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from attendance import get_employee_day_keys, hold_history_write_lock, load_historical_data, merge_into_history
+
+logger = logging.getLogger(__name__)
+
+# Daily rows of uploads waiting to be merged into the history, one Arrow file per upload, named
+# so that they sort in enqueue order. A batch file is removed only after the commit that merged
+# it, so queued rows survive a crash and are merged by the next writer that starts (merging a
+# batch twice gives the same history, since its rows replace the same employee-days).
+HISTORY_QUEUE_DIR = 'data/history_queue'
+# Batches that cannot be read, or that failed to merge MAX_COMMIT_ATTEMPTS times, are moved here
+# instead of blocking the queue; their rows are not in the history
+FAILED_BATCH_DIR = os.path.join(HISTORY_QUEUE_DIR, 'failed')
+BATCH_SUFFIX = '.arrow'
+
+# Seconds between scans of the queue when nothing wakes the writer (retries after a failed
+# commit, and batches left by processes that stopped before their rows were merged)
+QUEUE_RETRY_SECONDS = 5.0
+# Most batches merged by one commit, which bounds the memory of a drain
+MAX_BATCHES_PER_COMMIT = 64
+# Failed merges of a batch (in this process) before it is moved to FAILED_BATCH_DIR
+MAX_COMMIT_ATTEMPTS = 3
+
+_batch_sequence = itertools.count()
+_history_writer = None
+_history_writer_lock = threading.Lock()
+
+# Function to return the file of a queued batch
+def get_batch_path(batch_id, directory=HISTORY_QUEUE_DIR):
+    return os.path.join(directory, batch_id + BATCH_SUFFIX)
+
+# Function to list the queued batches, oldest first
+def list_queued_batches():
+    if not os.path.isdir(HISTORY_QUEUE_DIR):
+        return []
+    return sorted(name[:-len(BATCH_SUFFIX)] for name in os.listdir(HISTORY_QUEUE_DIR) if name.endswith(BATCH_SUFFIX))
+
+# Function to write daily rows to the queue; the file is synced before it appears under its
+# final name, so a queued batch is never partial. Returns the batch id.
+def enqueue_history_rows(new_data):
+    os.makedirs(HISTORY_QUEUE_DIR, exist_ok=True)
+    batch_id = f"{time.time_ns():020d}-{os.getpid()}-{next(_batch_sequence)}"
+    path = get_batch_path(batch_id)
+    temporary_path = f"{path}.tmp"
+    feather.write_feather(new_data.reset_index(drop=True), temporary_path, compression='uncompressed')
+    file_descriptor = os.open(temporary_path, os.O_RDONLY)
+    try:
+        os.fsync(file_descriptor)
+    finally:
+        os.close(file_descriptor)
+    os.replace(temporary_path, path)
+    return batch_id
+
+# Function to combine queued batches into one upsert; where batches share an employee-day, the
+# one enqueued last wins, as if they had been saved one after the other
+def coalesce_batches(frames):
+    new_data = pd.concat(frames, ignore_index=True)
+    return new_data[~get_employee_day_keys(new_data).duplicated(keep='last')].reset_index(drop=True)
+
+# Single writer of the history in this process. Uploads enqueue their rows and wait; the writer
+# thread merges every queued batch (including those of other processes) with one upsert and one
+# atomic commit, so uploads arriving together cost one history rewrite instead of one each and
+# never overwrite each other's rows. Writers of different processes take turns through the
+# history write lock, and a batch is committed by whichever one drains the queue first. Outcomes
+# are kept only for the batches submitted by this process, until their upload has read them.
+class HistoryWriter:
+    def __init__(self):
+        self.wakeup = threading.Event()
+        self.changed = threading.Condition()
+        self.submitted = set()
+        self.committed_rows = {}
+        self.failures = {}
+        self.attempts = {}
+        self.thread = threading.Thread(target=self.run, name="history-writer", daemon=True)
+        self.thread.start()
+
+    # Function run by the writer thread: drains the queue whenever it is woken up, and every
+    # QUEUE_RETRY_SECONDS otherwise
+    def run(self):
+        while True:
+            try:
+                while self.drain():
+                    pass
+            except Exception:
+                logger.exception("Coada istoricului nu a putut fi salvată; se reîncearcă în %.0f s", QUEUE_RETRY_SECONDS)
+            self.wakeup.wait(QUEUE_RETRY_SECONDS)
+            self.wakeup.clear()
+
+    # Function to merge the oldest queued batches into the history; returns False once the queue is empty
+    def drain(self):
+        if not list_queued_batches():
+            return False
+
+        with hold_history_write_lock():
+            # Batches committed by another process while this one waited for the lock are gone
+            queued_ids = list_queued_batches()
+            self.attempts = {batch_id: count for batch_id, count in self.attempts.items() if batch_id in queued_ids}
+            batch_ids = queued_ids[:MAX_BATCHES_PER_COMMIT]
+            if not batch_ids:
+                return False
+
+            frames = []
+            read_ids = []
+            for batch_id in batch_ids:
+                try:
+                    frames.append(feather.read_feather(get_batch_path(batch_id)))
+                    read_ids.append(batch_id)
+                except Exception as e:
+                    logger.error("Lotul %s din coada istoricului nu poate fi citit și a fost mutat în %s: %s", batch_id, FAILED_BATCH_DIR, e)
+                    self.move_to_failed([batch_id], e)
+
+            if read_ids:
+                try:
+                    history_rows = len(merge_into_history(coalesce_batches(frames)))
+                except Exception as e:
+                    # The batches stay queued, and their uploads keep waiting, until a later drain
+                    # merges them or they have failed MAX_COMMIT_ATTEMPTS times
+                    for batch_id in read_ids:
+                        self.attempts[batch_id] = self.attempts.get(batch_id, 0) + 1
+                    exhausted = [batch_id for batch_id in read_ids if self.attempts[batch_id] >= MAX_COMMIT_ATTEMPTS]
+                    if exhausted:
+                        logger.error("%d loturi din coada istoricului nu au putut fi salvate de %d ori și au fost mutate în %s: %s",
+                                     len(exhausted), MAX_COMMIT_ATTEMPTS, FAILED_BATCH_DIR, e)
+                        self.move_to_failed(exhausted, e)
+                    raise
+                for batch_id in read_ids:
+                    os.remove(get_batch_path(batch_id))
+                    self.attempts.pop(batch_id, None)
+                self.finish(read_ids, history_rows=history_rows)
+                if len(read_ids) > 1:
+                    logger.info("%d loturi din coada istoricului salvate într-o singură scriere", len(read_ids))
+        return True
+
+    # Function to move batches out of the queue, so their rows are never merged, and fail their uploads
+    def move_to_failed(self, batch_ids, error):
+        os.makedirs(FAILED_BATCH_DIR, exist_ok=True)
+        for batch_id in batch_ids:
+            os.replace(get_batch_path(batch_id), get_batch_path(batch_id, FAILED_BATCH_DIR))
+            self.attempts.pop(batch_id, None)
+        self.finish(batch_ids, error=error)
+
+    # Function to record the outcome of the batches submitted by this process and wake their uploads
+    def finish(self, batch_ids, history_rows=None, error=None):
+        with self.changed:
+            for batch_id in batch_ids:
+                if batch_id not in self.submitted:
+                    continue
+                if error is not None:
+                    self.failures[batch_id] = error
+                else:
+                    self.committed_rows[batch_id] = history_rows
+            self.changed.notify_all()
+
+    # Function to queue daily rows and wake the writer; returns the batch id to wait for. The batch
+    # is registered before the writer can see it, so its outcome is always recorded.
+    def submit(self, new_data):
+        with self.changed:
+            batch_id = enqueue_history_rows(new_data)
+            self.submitted.add(batch_id)
+        self.wakeup.set()
+        return batch_id
+
+    # Function to wait until a batch is committed; returns the history row count after its commit
+    def wait(self, batch_id):
+        with self.changed:
+            try:
+                while True:
+                    if batch_id in self.failures:
+                        raise RuntimeError(f"Rândurile nu au fost salvate în istoric: {self.failures.pop(batch_id)}")
+                    if batch_id in self.committed_rows:
+                        return self.committed_rows.pop(batch_id)
+                    if os.path.exists(get_batch_path(batch_id, FAILED_BATCH_DIR)):
+                        raise RuntimeError(f"Lotul {batch_id} a fost mutat în {FAILED_BATCH_DIR}; rândurile nu au fost salvate în istoric")
+                    if not os.path.exists(get_batch_path(batch_id)):
+                        # Committed by the writer of another process
+                        return len(load_historical_data(columns=['Angajat']))
+                    self.changed.wait(QUEUE_RETRY_SECONDS)
+            finally:
+                self.submitted.discard(batch_id)
+
+# Function to return the history writer of this process, started on first use (it merges any
+# batches left in the queue right away)
+def get_history_writer():
+    global _history_writer
+    with _history_writer_lock:
+        if _history_writer is None:
+            _history_writer = HistoryWriter()
+        return _history_writer
+
+# Function to save daily rows through the queue: enqueue them, wake the writer and wait for the
+# commit. Returns the history row count after the commit.
+def queue_history_save(new_data):
+    if new_data.empty:
+        return 0
+    writer = get_history_writer()
+    return writer.wait(writer.submit(new_data))
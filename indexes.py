@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Row positions of a result frame by employee, department and date, built once per processed
+# upload so that the tab filters cost O(rows returned) instead of a boolean scan per rerun.
+# `dates` are the first days of the rows' periods; for weekly ('W') and monthly ('M') rows the
+# lower bound of a date range is moved back so that periods overlapping the range are kept.
+class FrameIndex:
+    def __init__(self, df, dates=None, period='D'):
+        self.df = df
+        self.period = period
+
+        self.employee_positions = {}
+        self.department_positions = {}
+        if 'Angajat' in df.columns and 'Departament' in df.columns:
+            self.employee_positions = df.groupby('Angajat', observed=True, sort=True).indices
+            self.department_positions = df.groupby('Departament', observed=True, sort=True).indices
+        self.employee_names = list(self.employee_positions)
+        self.department_names = list(self.department_positions)
+        self.departments = df['Departament'].to_numpy() if 'Departament' in df.columns else None
+
+        self.dates = None
+        if dates is not None:
+            self.dates = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[ns]')
+            self.date_order = np.argsort(self.dates, kind='stable')
+            self.sorted_dates = self.dates[self.date_order]
+
+    # Function to gather the row positions of the given keys, in frame order
+    @staticmethod
+    def collect_positions(positions_by_key, keys):
+        found = [positions_by_key[key] for key in keys if key in positions_by_key]
+        return np.sort(np.concatenate(found)) if found else np.array([], dtype=np.intp)
+
+    # Function to return the rows matching all given filters (None or empty means no filter).
+    # The smallest index is used first and the other filters only check the rows it returns.
+    def select(self, employees=None, departments=None, start=None, end=None):
+        if start is not None and self.period == 'W':
+            start = pd.Timestamp(start) - pd.Timedelta(days=6)
+        elif start is not None and self.period == 'M':
+            start = pd.Timestamp(start).replace(day=1)
+        start = np.datetime64(pd.Timestamp(start), 'ns') if start is not None else None
+        end = np.datetime64(pd.Timestamp(end), 'ns') if end is not None else None
+        date_filter = self.dates is not None and (start is not None or end is not None)
+
+        if employees:
+            positions = self.collect_positions(self.employee_positions, employees)
+            if departments:
+                positions = positions[np.isin(self.departments[positions], list(departments))]
+        elif departments:
+            positions = self.collect_positions(self.department_positions, departments)
+        elif date_filter:
+            low = np.searchsorted(self.sorted_dates, start, side='left') if start is not None else 0
+            high = np.searchsorted(self.sorted_dates, end, side='right') if end is not None else len(self.sorted_dates)
+            return self.df.iloc[np.sort(self.date_order[low:high])]
+        else:
+            return self.df
+
+        if date_filter:
+            row_dates = self.dates[positions]
+            if start is not None:
+                positions = positions[row_dates >= start]
+                row_dates = self.dates[positions]
+            if end is not None:
+                positions = positions[row_dates <= end]
+        return self.df.iloc[positions]
+
+# Function to index the daily, weekly and monthly frames of a processed upload
+def build_result_indexes(daily_df, weekly_df, monthly_df):
+    indexes = {'daily': FrameIndex(daily_df, daily_df['Data_Obiect'])}
+
+    if not weekly_df.empty:
+        # Weeks start on the Monday before their first day in the data
+        week_keys = ['Angajat', 'An', 'Săptămână']
+        first_days = daily_df.groupby(week_keys, observed=True, as_index=False)['Data_Obiect'].min()
+        first_days['Angajat'] = first_days['Angajat'].astype(str)
+        week_rows = weekly_df[week_keys].astype({'Angajat': str, 'An': 'int64', 'Săptămână': 'int64'})
+        first_days = first_days.astype({'An': 'int64', 'Săptămână': 'int64'})
+        week_first_days = pd.DatetimeIndex(week_rows.merge(first_days, on=week_keys, how='left')['Data_Obiect'])
+        indexes['weekly'] = FrameIndex(weekly_df, week_first_days - pd.to_timedelta(week_first_days.dayofweek, unit='D'), period='W')
+    else:
+        indexes['weekly'] = FrameIndex(weekly_df)
+
+    if not monthly_df.empty:
+        month_first_days = pd.to_datetime(pd.DataFrame({'year': monthly_df['An'], 'month': monthly_df['Luna'], 'day': 1}))
+        indexes['monthly'] = FrameIndex(monthly_df, month_first_days, period='M')
+    else:
+        indexes['monthly'] = FrameIndex(monthly_df)
+
+    return indexes
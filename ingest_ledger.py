@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from attendance import HISTORY_PATH, INGEST_LEDGER_PATH, LEGACY_HISTORY_PATH, convert_date_string, load_historical_data
+from leave import get_leave_version
+from schedules import SCHEDULES_PATH
+
+logger = logging.getLogger(__name__)
+
+# Content hashes of the imported report files and of every employee block they contained, kept
+# in INGEST_LEDGER_PATH next to the history, which it describes: without a history file (Arrow or
+# legacy CSV) the ledger is ignored, and it is removed when a new history is started.
+
+# File entries kept: the newest MAX_INGEST_FILES imported within INGEST_FILE_RETENTION_DAYS. A file
+# dropped from the ledger is parsed again on its next upload, but its blocks are still matched.
+MAX_INGEST_FILES = 500
+INGEST_FILE_RETENTION_DAYS = 400
+
+# Status of an employee block of an upload against the ledger
+BLOCK_NEW = "Nou"
+BLOCK_CHANGED = "Modificat"
+BLOCK_UNCHANGED = "Neschimbat"
+
+# Columns of the parsed per-day records (see process_employee_entry), read back from the
+# history for blocks that are not parsed again
+PARSED_RECORD_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Zi', 'Data', 'Data_Obiect',
+                         'Ora Sosire', 'Ora Plecare', 'Durata (Ore)']
+
+# Loads and saves of the ledger from jobs, sessions and API requests of this process take turns
+_ingest_ledger_lock = threading.Lock()
+
+# Function to load the ledger ({'files': {...}, 'blocks': {...}}), empty when there is no history
+def load_ingest_ledger():
+    ledger = {'files': {}, 'blocks': {}}
+    if not os.path.exists(INGEST_LEDGER_PATH):
+        return ledger
+    if not os.path.exists(HISTORY_PATH) and not os.path.exists(LEGACY_HISTORY_PATH):
+        # The history it described was removed; its entries must not skip the next imports
+        return ledger
+    try:
+        with open(INGEST_LEDGER_PATH, encoding='utf-8') as f:
+            ledger.update(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning("Nu s-a putut încărca registrul de importuri: %s", e)
+    return ledger
+
+# Function to drop the recorded blocks whose days are overwritten by rows saved to the history (raw
+# punch events, or another report), so the files they came from are parsed and saved again on their
+# next upload instead of being skipped as already imported. Called by merge_into_history.
+def forget_overwritten_blocks(new_data):
+    with _ingest_ledger_lock:
+        if not os.path.exists(INGEST_LEDGER_PATH):
+            return
+        ledger = load_ingest_ledger()
+        days = pd.to_datetime(new_data['Data_Obiect'], errors='coerce').dt.normalize()
+        written_days = days.groupby(new_data['Angajat'].astype(str).to_numpy()).unique()
+
+        forgotten = 0
+        for employee, employee_days in written_days.items():
+            blocks = ledger['blocks'].get(employee)
+            if not blocks:
+                continue
+            employee_days = pd.DatetimeIndex(employee_days).dropna().sort_values()
+            kept = [block for block in blocks if not IngestReport.contains_any(block, employee_days)]
+            forgotten += len(blocks) - len(kept)
+            ledger['blocks'][employee] = kept
+        if forgotten:
+            write_ingest_ledger(ledger)
+            logger.info("%d blocuri din registrul de importuri au fost suprascrise și vor fi importate din nou", forgotten)
+
+# Function to write the ledger atomically
+def write_ingest_ledger(ledger):
+    os.makedirs(os.path.dirname(INGEST_LEDGER_PATH), exist_ok=True)
+    temporary_path = f"{INGEST_LEDGER_PATH}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(ledger, f, ensure_ascii=False)
+    os.replace(temporary_path, INGEST_LEDGER_PATH)
+
+# Function to keep the newest file entries imported within the retention period
+def prune_file_entries(files, now=None):
+    cutoff = ((now or datetime.now()) - timedelta(days=INGEST_FILE_RETENTION_DAYS)).isoformat(timespec='seconds')
+    recent = sorted(((entry['imported_at'], fingerprint) for fingerprint, entry in files.items()
+                     if entry['imported_at'] >= cutoff), reverse=True)[:MAX_INGEST_FILES]
+    return {fingerprint: files[fingerprint] for _, fingerprint in reversed(recent)}
+
+# Function to return the version of the work schedules and leave records, which the derived hours of every row depend on
+def get_rules_version():
+    schedules_version = str(os.path.getmtime(SCHEDULES_PATH)) if os.path.exists(SCHEDULES_PATH) else ''
+    return f"{schedules_version}|{get_leave_version()}"
+
+# Function to hash the parts of a fingerprint (bytes, or anything with a stable repr)
+def get_fingerprint(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+# Function to convert a report (start, end) pair of strings to dates (None when either is missing)
+def get_report_dates(report_range):
+    if report_range is None:
+        return None
+    start, end = [convert_date_string(value) for value in report_range]
+    return (start, end) if start is not None and end is not None else None
+
+# Function to read the history rows of employees within [start, end], as parsed per-day records
+def load_employee_history_rows(employees, start, end):
+    if not employees:
+        return pd.DataFrame(columns=PARSED_RECORD_COLUMNS)
+    history_df = load_historical_data(columns=PARSED_RECORD_COLUMNS)
+    if history_df.empty:
+        return pd.DataFrame(columns=PARSED_RECORD_COLUMNS)
+    mask = history_df['Angajat'].isin(employees)
+    mask &= history_df['Data_Obiect'].between(pd.Timestamp(start), pd.Timestamp(end))
+    rows = history_df[mask].reset_index(drop=True)
+    for column in ['Angajat', 'Departament', 'ID Legitimație', 'Zi']:
+        rows[column] = rows[column].astype(str)
+    return rows
+
+# Comparison of one report upload with the ledger. The whole file is looked up first; when it
+# was imported before (and none of its blocks were overwritten since), nothing is decoded or
+# parsed. Otherwise every employee block is classified as new, changed or unchanged, and only
+# the new and changed blocks are parsed and saved. record() is called once the history is saved.
+class IngestReport:
+    def __init__(self):
+        self.file_fingerprint = None
+        self.file_entry = None
+        self.report_range = None
+        self.block_fingerprints = {}
+        self.statuses = {}
+
+    # Function to look the upload up in the ledger; returns its entry when the same file was imported
+    def check_file(self, content, sheet_name=None):
+        self.file_fingerprint = get_fingerprint(content, sheet_name, get_rules_version())
+        ledger = load_ingest_ledger()
+        entry = ledger['files'].get(self.file_fingerprint)
+        if entry is None:
+            return None
+
+        blocks = ledger['blocks']
+        if any(self.find_block(blocks, employee, entry['report_range']) != block_fingerprint
+               for employee, block_fingerprint in entry['blocks'].items()):
+            # Some of its days were imported again from another file since
+            return None
+
+        self.file_entry = entry
+        self.report_range = tuple(entry['report_range'])
+        self.block_fingerprints = dict(entry['blocks'])
+        self.statuses = {employee: BLOCK_UNCHANGED for employee in entry['blocks']}
+        return entry
+
+    # Function to return the fingerprint recorded for an employee block with exactly this range
+    @staticmethod
+    def find_block(blocks, employee, report_range):
+        for block in blocks.get(employee, []):
+            if [block['start'], block['end']] == list(report_range):
+                return block['fingerprint']
+        return None
+
+    # Function to tell whether a recorded block shares any day with [start, end]
+    @staticmethod
+    def overlaps(block, start, end):
+        block_start, block_end = get_report_dates((block['start'], block['end']))
+        return block_start <= end and block_end >= start
+
+    # Function to tell whether a recorded block contains any of the sorted `days`
+    @staticmethod
+    def contains_any(block, days):
+        block_start, block_end = get_report_dates((block['start'], block['end']))
+        position = days.searchsorted(pd.Timestamp(block_start))
+        return position < len(days) and days[position] <= pd.Timestamp(block_end)
+
+    # Function to classify the employee blocks of a tokenized report. Returns the weeks to parse
+    # and the history rows of the unchanged blocks, which stand in for their parsed records.
+    def filter_blocks(self, report_range, weeks):
+        if get_report_dates(report_range) is None:
+            # Blocks cannot be matched without the report interval: everything is parsed
+            return weeks, pd.DataFrame(columns=PARSED_RECORD_COLUMNS)
+
+        self.report_range = tuple(report_range)
+        block_weeks = {}
+        for week in weeks:
+            block_weeks.setdefault(week[0], []).append(week)
+
+        start, end = get_report_dates(report_range)
+        rules_version = get_rules_version()
+        blocks = load_ingest_ledger()['blocks']
+        for employee, employee_weeks in block_weeks.items():
+            block_fingerprint = get_fingerprint(self.report_range, rules_version, employee_weeks)
+            self.block_fingerprints[employee] = block_fingerprint
+            recorded = self.find_block(blocks, employee, self.report_range)
+            if recorded == block_fingerprint:
+                self.statuses[employee] = BLOCK_UNCHANGED
+            elif not any(self.overlaps(block, start, end) for block in blocks.get(employee, [])):
+                self.statuses[employee] = BLOCK_NEW
+            else:
+                self.statuses[employee] = BLOCK_CHANGED
+
+        unchanged = [employee for employee, status in self.statuses.items() if status == BLOCK_UNCHANGED]
+        if unchanged:
+            logger.info("%d din %d blocuri de angajat sunt deja importate", len(unchanged), len(block_weeks))
+        known_rows = load_employee_history_rows(unchanged, start, end)
+        return [week for week in weeks if self.statuses[week[0]] != BLOCK_UNCHANGED], known_rows
+
+    # Function to return the history rows of the file found by check_file, as parsed per-day records
+    def load_file_rows(self):
+        return load_employee_history_rows(list(self.file_entry['blocks']), *get_report_dates(self.report_range))
+
+    # Function to list the employees whose blocks must be saved to the history
+    def changed_employees(self):
+        return [employee for employee, status in self.statuses.items() if status != BLOCK_UNCHANGED]
+
+    # Function to count the blocks per status
+    def counts(self):
+        counts = {BLOCK_NEW: 0, BLOCK_CHANGED: 0, BLOCK_UNCHANGED: 0}
+        for status in self.statuses.values():
+            counts[status] += 1
+        return counts
+
+    # Function to describe the blocks for the UI
+    def to_frame(self):
+        return pd.DataFrame({'Angajat': list(self.statuses), 'Stare': list(self.statuses.values())})
+
+    # Function to store the file and its blocks in the ledger once their rows are in the history.
+    # Blocks of the same employee that overlap the new one are dropped, since their days were replaced.
+    def record(self, date_range, report_year, issues):
+        if self.file_fingerprint is None or self.report_range is None or self.file_entry is not None:
+            return
+
+        start, end = get_report_dates(self.report_range)
+        imported_at = datetime.now().isoformat(timespec='seconds')
+        with _ingest_ledger_lock:
+            ledger = load_ingest_ledger()
+            for employee, block_fingerprint in self.block_fingerprints.items():
+                kept = [block for block in ledger['blocks'].get(employee, []) if not self.overlaps(block, start, end)]
+                kept.append({'start': self.report_range[0], 'end': self.report_range[1],
+                             'fingerprint': block_fingerprint, 'imported_at': imported_at})
+                ledger['blocks'][employee] = kept
+
+            ledger['files'][self.file_fingerprint] = {
+                'report_range': list(self.report_range),
+                'date_range': date_range,
+                'report_year': report_year,
+                'imported_at': imported_at,
+                'blocks': self.block_fingerprints,
+                'issues': issues,
+            }
+            ledger['files'] = prune_file_entries(ledger['files'])
+            write_ingest_ledger(ledger)
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from attendance import build_attendance_frames, excel_sheet_to_csv_text, process_attendance_data
+from diagnostics import StageRecorder
+from history_queue import queue_history_save
+from indexes import build_result_indexes
+from ingest_ledger import IngestReport, get_report_dates
+from periods import split_closed_rows
+from raw_events import process_raw_events
+from recompute import recompute_history
+
+logger = logging.getLogger(__name__)
+
+# Uploads at least this large are processed in a background thread
+BACKGROUND_MIN_BYTES = 512 * 1024
+
+# Stages reported through the progress callback, in pipeline order
+JOB_STAGES = ['decode', 'parse', 'gap_fill', 'schema', 'aggregate', 'history_save']
+
+# Function to decode and process an uploaded file (runs inline, inside a background job or in the API).
+# Attendance reports are compared with the ingest ledger through `ingest` (an IngestReport): a file
+# imported before is read back from the history, and otherwise only its new or changed employee
+# blocks are parsed.
+def process_upload(uploaded_file, upload_kind, sheet_name, recorder, directory, progress, issues, ingest=None):
+    if upload_kind == "Evenimente Brute":
+        # Raw punch events are streamed in chunks straight from the upload
+        uploaded_file.seek(0)
+        return process_raw_events(uploaded_file, recorder, issues, directory=directory, progress=progress)
+
+    recorder.begin('decode')
+    progress('decode')
+    if ingest is not None and ingest.check_file(uploaded_file.getvalue(), sheet_name) is not None:
+        # Same file as an earlier import: nothing is decoded or parsed
+        recorder.end(rows=0)
+        logger.info("Fișierul a fost deja importat la %s", ingest.file_entry['imported_at'])
+        issues.extend(ingest.file_entry['issues'])
+        start_date, end_date = get_report_dates(ingest.report_range)
+        daily_df, weekly_df, monthly_df = build_attendance_frames(ingest.load_file_rows(), start_date, end_date, recorder, progress)
+        return daily_df, weekly_df, monthly_df, ingest.file_entry['date_range'], ingest.file_entry['report_year']
+
+    if sheet_name is not None:
+        # For Excel files
+        file_content = excel_sheet_to_csv_text(uploaded_file, sheet_name)
+    else:
+        # For CSV files
+        file_content = uploaded_file.getvalue().decode('utf-8')
+    recorder.end(rows=file_content.count('\n'))
+
+    return process_attendance_data(file_content, recorder, issues, progress, ingest)
+
+# Function to hash the daily and weekly result rows, which identifies the dataset of cached charts
+def get_result_hash(daily_df, weekly_df):
+    return tuple(int(pd.util.hash_pandas_object(df, index=False).sum()) if not df.empty else 0 for df in (daily_df, weekly_df))
+
+# Processing of one uploaded file, run either inline or in a background thread.
+# `process` is called as process(progress, issues, ingest) and returns the same tuple as
+# process_attendance_data. The worker never touches Streamlit: the UI polls the
+# attributes below (plain assignments, so reads from another thread are safe).
+# Only the rows of new or changed employee blocks (all rows when `ingest` was not
+# used) are saved, and the ingest ledger is updated once they are. Rows of closed
+# payroll months are never saved; their counts per month are kept in closed_periods.
+class AttendanceJob:
+    def __init__(self, key, process, recorder=None):
+        self.key = key
+        self.process = process
+        self.recorder = recorder or StageRecorder(enabled=False)
+        self.issues = []
+        self.ingest = IngestReport()
+
+        self.stage = None
+        self.done = None
+        self.total = None
+        self.partial_rows = []
+        self.partial_count = 0
+
+        self.result = None
+        self.indexes = None
+        self.result_hash = None
+        self.history_rows = None
+        self.history_error = None
+        self.closed_periods = {}
+        self.error = None
+        self.seconds = None
+        self.finished = False
+        self.thread = None
+
+    # Function passed to the pipeline as its progress callback
+    def report(self, stage, done=None, total=None, rows=None):
+        self.stage = stage
+        self.done = done
+        self.total = total
+        if rows is not None:
+            self.partial_rows = rows
+            self.partial_count = len(rows)
+
+    # Function to process the upload and save it to the history
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.result = self.process(self.report, self.issues, self.ingest)
+            daily_df = self.result[0]
+
+            if not daily_df.empty:
+                # Row indexes used by the result filters, built once per upload
+                with self.recorder.stage('index') as stage_stats:
+                    self.indexes = build_result_indexes(*self.result[:3])
+                    self.result_hash = get_result_hash(daily_df, self.result[1])
+                    stage_stats['rows'] = len(daily_df)
+
+                changed_df = daily_df
+                if self.ingest.statuses:
+                    changed_df = daily_df[daily_df['Angajat'].isin(self.ingest.changed_employees())]
+                changed_df, self.closed_periods = split_closed_rows(changed_df)
+                if self.closed_periods:
+                    logger.warning("Rânduri din luni închise ignorate: %s", self.closed_periods)
+
+                self.report('history_save')
+                try:
+                    if not changed_df.empty:
+                        with self.recorder.stage('history_save') as stage_stats:
+                            # Rows go through the history queue, so jobs saving at the same time are merged in one
+                            # commit; only the row count is kept, sessions read the history from the shared cache
+                            self.history_rows = queue_history_save(changed_df)
+                            stage_stats['rows'] = self.history_rows
+                    self.ingest.record(self.result[3], self.result[4], self.issues)
+                except Exception as e:
+                    logger.warning("Nu s-a putut salva istoricul: %s", e)
+                    self.history_error = e
+        except Exception as e:
+            logger.exception("Procesarea fișierului a eșuat")
+            self.error = e
+        finally:
+            # The preview rows are only needed while the job runs
+            self.partial_rows = []
+            self.partial_count = 0
+            self.seconds = time.perf_counter() - start
+            self.finished = True
+
+    # Function to run the job in a daemon thread
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"attendance-job-{self.key[0]}", daemon=True)
+        self.thread.start()
+
+    # Function to return the per-day records parsed so far
+    def partial_frame(self):
+        return pd.DataFrame(self.partial_rows[:self.partial_count])
+
+    # Function to return the overall progress in [0, 1] from the stage and its counters
+    def progress_fraction(self):
+        if self.finished:
+            return 1.0
+        if self.stage not in JOB_STAGES:
+            return 0.0
+
+        within_stage = self.done / self.total if self.done is not None and self.total else 0.0
+        return min((JOB_STAGES.index(self.stage) + within_stage) / len(JOB_STAGES), 1.0)
+
+# Recompute of the stored history (see recompute.py) in a background thread, started once new
+# leave records are saved. Like AttendanceJob it never touches Streamlit: the UI polls `finished`,
+# then reads `result` ((history rows, rows with changed standard hours)) or `error`.
+class RecomputeJob:
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.seconds = None
+        self.finished = False
+        self.thread = None
+
+    # Function to recompute the history
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.result = recompute_history(workers=1)
+        except Exception as e:
+            logger.exception("Recalcularea istoricului a eșuat")
+            self.error = e
+        finally:
+            self.seconds = time.perf_counter() - start
+            self.finished = True
+
+    # Function to run the job in a daemon thread
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="recompute-job", daemon=True)
+        self.thread.start()
@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Approved leave and sick days, one interval per row; optional, no leave when missing
+LEAVE_PATH = 'data/leave_records.csv'
+LEAVE_COLUMNS = ['Angajat', 'Început', 'Sfârșit', 'Tip']
+
+# Accepted header names (case-insensitive) of the leave record columns
+LEAVE_COLUMN_ALIASES = {
+    'Angajat': ['angajat', 'employee', 'nume', 'name'],
+    'Început': ['început', 'inceput', 'start', 'de la', 'from'],
+    'Sfârșit': ['sfârșit', 'sfarsit', 'end', 'până la', 'pana la', 'to'],
+    'Tip': ['tip', 'type', 'motiv', 'reason'],
+}
+
+# Type used when a record has none
+DEFAULT_LEAVE_TYPE = "Concediu"
+
+# Days are encoded together with the employee as code * LEAVE_KEY_STRIDE + days since 1970,
+# so all intervals sort in one array and every lookup is a single binary search
+LEAVE_KEY_STRIDE = 1_000_000
+
+# Compiled calendar per file, rebuilt when the file changes
+_leave_cache = {}
+_leave_cache_lock = threading.Lock()
+
+# Function to reduce employee labels to the key they are matched on: the attendance parser keeps
+# the stripped cell of the report ("Nume Prenume 123"), so leave names typed with other spacing or
+# letter case still find their employee
+def normalize_employee_names(values):
+    return pd.Series(values, dtype=object).astype(str).str.split().str.join(' ').str.casefold()
+
+# Function to list the employees of leave records that match none of `employees`, as written in the records
+def find_unmatched_employees(records, employees):
+    names = records['Angajat'].astype(str)
+    unmatched = ~normalize_employee_names(names).isin(set(normalize_employee_names(employees))).to_numpy()
+    return sorted(names[unmatched].unique())
+
+# Function to map the CSV header of a leave file onto LEAVE_COLUMNS
+def resolve_leave_columns(header):
+    resolved = {}
+    for column in header:
+        for name, aliases in LEAVE_COLUMN_ALIASES.items():
+            if column.strip().lower() in aliases and name not in resolved.values():
+                resolved[column] = name
+    missing = [name for name in ['Angajat', 'Început', 'Sfârșit'] if name not in resolved.values()]
+    if missing:
+        raise ValueError(f"Lipsesc coloanele {missing} din fișierul de concedii (antet: {list(header)})")
+    return resolved
+
+# Function to parse leave dates: YYYY-MM-DD, otherwise day first (31.03.2025, 31/03/2025); NaT when invalid
+def parse_leave_dates(values):
+    values = values.str.strip()
+    dates = pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    other = dates.isna() & (values != '')
+    if other.any():
+        dates[other] = pd.to_datetime(values[other], dayfirst=True, format='mixed', errors='coerce')
+    return dates
+
+# Function to read leave records from a CSV file or buffer. Returns the valid records and the
+# problems of the others, by line number.
+def read_leave_records(source):
+    raw = pd.read_csv(source, dtype=str, keep_default_na=False)
+    raw = raw.rename(columns=resolve_leave_columns(raw.columns))
+    if 'Tip' not in raw.columns:
+        raw['Tip'] = ''
+
+    records = pd.DataFrame({
+        'Angajat': raw['Angajat'].str.strip(),
+        'Început': parse_leave_dates(raw['Început']),
+        'Sfârșit': parse_leave_dates(raw['Sfârșit']),
+        'Tip': raw['Tip'].str.strip().replace('', DEFAULT_LEAVE_TYPE),
+    })
+
+    problems = pd.Series('', index=records.index)
+    problems[records['Angajat'] == ''] = "Angajat lipsă"
+    problems[(problems == '') & records['Început'].isna()] = "Dată de început invalidă"
+    problems[(problems == '') & records['Sfârșit'].isna()] = "Dată de sfârșit invalidă"
+    problems[(problems == '') & (records['Sfârșit'] < records['Început'])] = "Sfârșitul este înaintea începutului"
+
+    invalid = problems != ''
+    # Line 1 is the header
+    issues = [{'Linia': int(index) + 2, 'Angajat': records.at[index, 'Angajat'], 'Problemă': problems[index]}
+              for index in np.flatnonzero(invalid)]
+    return records[~invalid].reset_index(drop=True), issues
+
+# Function to load the stored leave records
+def load_leave_records(path=LEAVE_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=LEAVE_COLUMNS)
+    records = pd.read_csv(path, dtype={'Angajat': str, 'Tip': str}, keep_default_na=False, parse_dates=['Început', 'Sfârșit'])
+    return records[LEAVE_COLUMNS]
+
+# Function to add leave records to the stored ones (identical records are kept once) and write
+# the file atomically. Returns all stored records.
+def save_leave_records(new_records, path=LEAVE_PATH):
+    records = pd.concat([load_leave_records(path), new_records[LEAVE_COLUMNS]], ignore_index=True)
+    records = records.drop_duplicates().sort_values(['Angajat', 'Început'], kind='mergesort', ignore_index=True)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    records.to_csv(temporary_path, index=False, date_format='%Y-%m-%d')
+    os.replace(temporary_path, path)
+    return records
+
+# Leave intervals compiled for vectorized lookups. Intervals are sorted by (employee, start) and
+# made disjoint per employee (where records overlap, the one that starts first keeps the shared
+# days), so the interval of any (employee, day) is found by one searchsorted over start keys.
+class LeaveCalendar:
+    def __init__(self, records):
+        employee_codes, self.employees = pd.factorize(normalize_employee_names(records['Angajat']), sort=True)
+        starts = records['Început'].to_numpy(dtype='datetime64[D]').astype('int64')
+        ends = records['Sfârșit'].to_numpy(dtype='datetime64[D]').astype('int64')
+        start_keys = employee_codes.astype('int64') * LEAVE_KEY_STRIDE + starts
+        end_keys = employee_codes.astype('int64') * LEAVE_KEY_STRIDE + ends
+
+        order = np.lexsort((-end_keys, start_keys))
+        start_keys, end_keys = start_keys[order], end_keys[order]
+        types = records['Tip'].astype(str).to_numpy()[order]
+
+        # Days already covered by an earlier interval are cut from the start of the later one.
+        # Keys of different employees never mix, so one running maximum serves all of them.
+        covered_through = np.concatenate([[np.iinfo('int64').min], np.maximum.accumulate(end_keys)[:-1]])
+        start_keys = np.maximum(start_keys, covered_through + 1)
+        kept = start_keys <= end_keys
+
+        self.start_keys = start_keys[kept]
+        self.end_keys = end_keys[kept]
+        self.types = types[kept]
+
+    # Function to map employee labels to calendar codes (-1 for employees without leave). Categorical
+    # labels (the daily frame) are mapped once per category instead of once per row.
+    def get_employee_codes(self, employees):
+        if isinstance(employees.dtype, pd.CategoricalDtype):
+            category_codes = np.append(self.employees.get_indexer(normalize_employee_names(employees.cat.categories)), -1)
+            return category_codes[employees.cat.codes.to_numpy()].astype('int64')
+        return self.employees.get_indexer(normalize_employee_names(employees)).astype('int64')
+
+    # Function to return the leave type of every (employee, day) pair ('' on days without leave)
+    def lookup(self, employees, dates):
+        result = np.full(len(employees), '', dtype=object)
+        if len(self.start_keys) == 0 or len(result) == 0:
+            return result
+
+        employee_codes = self.get_employee_codes(pd.Series(employees))
+        days = pd.to_datetime(pd.Series(dates)).to_numpy(dtype='datetime64[D]')
+        known = (employee_codes >= 0) & ~np.isnat(days)
+
+        keys = employee_codes[known] * LEAVE_KEY_STRIDE + days[known].astype('int64')
+        positions = np.searchsorted(self.start_keys, keys, side='right') - 1
+        on_leave = (positions >= 0) & (keys <= self.end_keys[np.maximum(positions, 0)])
+
+        known_rows = np.flatnonzero(known)
+        result[known_rows[on_leave]] = self.types[positions[on_leave]]
+        return result
+
+# Function to return the compiled leave calendar of a file, recompiled when the file changes
+def get_leave_calendar(path=LEAVE_PATH):
+    version = get_leave_version(path)
+    with _leave_cache_lock:
+        cached = _leave_cache.get(path)
+        if cached is None or cached[0] != version:
+            try:
+                calendar = LeaveCalendar(load_leave_records(path))
+            except Exception as e:
+                logger.warning("Nu s-au putut încărca concediile din %s: %s", path, e)
+                calendar = LeaveCalendar(pd.DataFrame(columns=LEAVE_COLUMNS))
+            cached = (version, calendar)
+            _leave_cache[path] = cached
+    return cached[1]
+
+# Function to return the version of the leave file ('' when there is none)
+def get_leave_version(path=LEAVE_PATH):
+    return str(os.path.getmtime(path)) if os.path.exists(path) else ''
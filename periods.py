@@ -0,0 +1,245 @@
+# Usage (from the repository root): python periods.py close YYYY-MM | list
+#
+# Closed payroll periods. Closing a month writes an immutable snapshot of it to
+# data/snapshots/YYYY-MM/: its daily history rows, its employee-month cube rows, the chart data
+# and the rendered export files, with a manifest holding the totals, the working days and standard
+# hours of the schedule of each department and the SHA-256 of every file. Closed months are served from their snapshot, uploads cannot change
+# their history rows and the recompute keeps their derived hours as they were at the close.
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import stat
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from attendance import (
+    bump_history_version,
+    calculate_standard_monthly_hours,
+    calculate_working_days,
+    get_history_version,
+    hold_history_write_lock,
+    load_historical_data,
+    load_history_cube,
+    to_csv_bytes,
+    to_excel_bytes,
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = 'data/snapshots'
+SNAPSHOT_MANIFEST = 'manifest.json'
+
+# Columns of the daily export of a closed month
+SNAPSHOT_DAILY_EXPORT_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Zi', 'Data', 'Ora Sosire', 'Ora Plecare',
+                                 'Durata (Ore)', 'Ore Standard', 'Diferență', 'Concediu']
+
+# Snapshots never change, so each one is read once per process
+_snapshot_cache = {}
+_snapshot_cache_lock = threading.Lock()
+
+# Function to format a (year, month) period as YYYY-MM
+def get_period_label(year, month):
+    return f"{int(year)}-{int(month):02d}"
+
+# Function to parse a YYYY-MM period label into (year, month)
+def parse_period_label(label):
+    try:
+        year, month = (int(part) for part in label.split('-'))
+    except ValueError:
+        raise ValueError(f"Perioada trebuie să fie de forma AAAA-LL, nu '{label}'")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Luna {month} din '{label}' nu există")
+    return year, month
+
+# Function to return the snapshot directory of a period
+def get_snapshot_path(label):
+    return os.path.join(SNAPSHOT_DIR, label)
+
+# Function to list the closed periods (labels), oldest first
+def list_closed_periods():
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(label for label in os.listdir(SNAPSHOT_DIR)
+                  if os.path.exists(os.path.join(get_snapshot_path(label), SNAPSHOT_MANIFEST)))
+
+# Function to return the names of the files a snapshot of `label` holds
+def get_snapshot_files(label):
+    return {
+        'daily': 'zilnic.arrow',
+        'monthly': 'lunar.csv',
+        'chart': 'grafic_zilnic.csv',
+        'daily_csv': f"prezenta_zilnica_{label}.csv",
+        'daily_excel': f"prezenta_zilnica_{label}.xlsx",
+        'monthly_excel': f"sumar_lunar_{label}.xlsx",
+    }
+
+# Function to return the closed months as year * 12 + month
+def get_closed_month_numbers():
+    return [year * 12 + month for year, month in map(parse_period_label, list_closed_periods())]
+
+# Function to mark daily rows that fall in closed months
+def get_closed_row_mask(dates):
+    closed_months = get_closed_month_numbers()
+    if not closed_months or len(dates) == 0:
+        return np.zeros(len(dates), dtype=bool)
+    dates = pd.to_datetime(pd.Series(dates), errors='coerce')
+    return (dates.dt.year * 12 + dates.dt.month).isin(closed_months).to_numpy()
+
+# Function to split daily rows into the rows of open months and the row counts per closed month they would change
+def split_closed_rows(daily_df):
+    closed_mask = get_closed_row_mask(daily_df['Data_Obiect'])
+    if not closed_mask.any():
+        return daily_df, {}
+    closed_dates = pd.to_datetime(daily_df.loc[closed_mask, 'Data_Obiect'])
+    closed_counts = closed_dates.dt.strftime('%Y-%m').value_counts().sort_index()
+    return daily_df[~closed_mask], {label: int(count) for label, count in closed_counts.items()}
+
+# Function to aggregate the daily rows of a month into the data of the daily presence chart
+def build_period_chart_data(daily_df):
+    hours = daily_df['Durata (Ore)'].astype('float64')
+    chart = pd.DataFrame({
+        'Data': pd.to_datetime(daily_df['Data_Obiect']).dt.date,
+        'Ore Totale': hours,
+        'Ore Standard': daily_df['Ore Standard'].astype('float64'),
+        'Prezenți': (hours > 0).astype(int),
+    }).groupby('Data', as_index=False).sum()
+    chart['Ore Totale'] = chart['Ore Totale'].round(2)
+    chart['Ore Standard'] = chart['Ore Standard'].round(2)
+    return chart
+
+# Function to hash a file
+def get_file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function to close a month: writes its snapshot (all files in a temporary directory that is then
+# renamed, so a snapshot is either complete or absent) and returns the manifest. The history write
+# lock is held, so no upload changes the month while it is copied, and the history version is
+# bumped, so a recompute that started before the close is refused.
+def close_period(year, month):
+    label = get_period_label(year, month)
+    path = get_snapshot_path(label)
+    with hold_history_write_lock():
+        if os.path.exists(os.path.join(path, SNAPSHOT_MANIFEST)):
+            raise ValueError(f"Luna {label} este deja închisă")
+        if os.path.isdir(path):
+            # Left by a close that failed before its manifest was written
+            shutil.rmtree(path)
+
+        daily_df = load_historical_data()
+        if daily_df.empty:
+            raise ValueError("Istoricul este gol")
+        dates = daily_df['Data_Obiect']
+        daily_df = daily_df[(dates.dt.year == year) & (dates.dt.month == month)].sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True)
+        if daily_df.empty:
+            raise ValueError(f"Nu există date în istoric pentru luna {label}")
+        cube_df = load_history_cube()
+        monthly_df = cube_df[(cube_df['An'] == year) & (cube_df['Luna'] == month)].reset_index(drop=True)
+
+        files = get_snapshot_files(label)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        daily_export_df = daily_df[[col for col in SNAPSHOT_DAILY_EXPORT_COLUMNS if col in daily_df.columns]]
+        feather.write_feather(daily_df, os.path.join(temporary_path, files['daily']), compression='uncompressed')
+        monthly_df.to_csv(os.path.join(temporary_path, files['monthly']), index=False)
+        build_period_chart_data(daily_df).to_csv(os.path.join(temporary_path, files['chart']), index=False)
+        contents = {
+            'daily_csv': to_csv_bytes(daily_export_df),
+            'daily_excel': to_excel_bytes(daily_export_df, sheet_name=label),
+            'monthly_excel': to_excel_bytes(monthly_df, sheet_name=label),
+        }
+        for name, content in contents.items():
+            with open(os.path.join(temporary_path, files[name]), 'wb') as f:
+                f.write(content)
+
+        hours = daily_df['Durata (Ore)'].astype('float64').sum()
+        standard_hours = daily_df['Ore Standard'].astype('float64').sum()
+        manifest = {
+            'period': label,
+            'closed_at': datetime.now().isoformat(timespec='seconds'),
+            'history_version': get_history_version(),
+            'daily_rows': len(daily_df),
+            'employees': int(daily_df['Angajat'].nunique()),
+            # Departments can follow different schedules (see schedules.py)
+            'departments': {department: {'working_days': int(calculate_working_days(year, month, department)),
+                                         'standard_monthly_hours': float(calculate_standard_monthly_hours(year, month, department))}
+                            for department in sorted(daily_df['Departament'].astype(str).unique())},
+            'total_hours': round(float(hours), 2),
+            'total_standard_hours': round(float(standard_hours), 2),
+            'total_difference': round(float(hours - standard_hours), 2),
+            'files': {name: {'file': file_name, 'sha256': get_file_sha256(os.path.join(temporary_path, file_name))}
+                      for name, file_name in files.items()},
+        }
+        with open(os.path.join(temporary_path, SNAPSHOT_MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # Read-only files: the snapshot is not meant to be edited in place
+        for file_name in os.listdir(temporary_path):
+            os.chmod(os.path.join(temporary_path, file_name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(temporary_path, path)
+        bump_history_version()
+
+    logger.info("Luna %s a fost închisă: %d rânduri, %d angajați", label, manifest['daily_rows'], manifest['employees'])
+    return manifest
+
+# Function to read a closed period once per process. The file hashes are checked against the
+# manifest, so a snapshot changed after the close is refused instead of being served.
+def load_period_snapshot(label):
+    with _snapshot_cache_lock:
+        snapshot = _snapshot_cache.get(label)
+        if snapshot is not None:
+            return snapshot
+
+        path = get_snapshot_path(label)
+        manifest_path = os.path.join(path, SNAPSHOT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"Luna {label} nu este închisă")
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        contents = {}
+        for name, entry in manifest['files'].items():
+            with open(os.path.join(path, entry['file']), 'rb') as f:
+                content = f.read()
+            if hashlib.sha256(content).hexdigest() != entry['sha256']:
+                raise ValueError(f"Fișierul {entry['file']} al lunii închise {label} a fost modificat după închidere")
+            contents[name] = content
+
+        snapshot = {
+            'manifest': manifest,
+            'daily': feather.read_feather(io.BytesIO(contents['daily'])),
+            'monthly': pd.read_csv(io.BytesIO(contents['monthly']), keep_default_na=False),
+            'chart': pd.read_csv(io.BytesIO(contents['chart']), parse_dates=['Data']),
+            'files': {name: (manifest['files'][name]['file'], contents[name]) for name in ['daily_csv', 'daily_excel', 'monthly_excel']},
+        }
+        _snapshot_cache[label] = snapshot
+        return snapshot
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Close payroll months as immutable snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    close_parser = subparsers.add_parser('close', help="close a month")
+    close_parser.add_argument('period', help="month to close, YYYY-MM")
+    subparsers.add_parser('list', help="list the closed months")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    if args.command == 'close':
+        close_period(*parse_period_label(args.period))
+    else:
+        for label in list_closed_periods():
+            print(label)
@@ -0,0 +1,189 @@
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from attendance import WEEKDAY_NAMES, build_attendance_frames
+from diagnostics import StageRecorder
+from schedules import get_compiled_schedules
+
+logger = logging.getLogger(__name__)
+
+# Accepted header names (case-insensitive) of the raw punch event columns
+RAW_EVENT_COLUMNS = {
+    'badge': ['badge', 'badge_id', 'card', 'card_id', 'legitimatie', 'id legitimație'],
+    'timestamp': ['timestamp', 'time', 'datetime', 'event_time', 'data_ora'],
+}
+
+# Rows read per chunk; only the per-chunk shift intervals are kept between chunks
+RAW_EVENT_CHUNK_ROWS = 500_000
+
+# Punches at most a shift gap apart belong to the same shift, so a shift may cross midnight.
+# The gap of a badge is the longest shift of its work schedule plus PUNCH_SHIFT_MARGIN, and at
+# least MIN_PUNCH_SHIFT_GAP. The labour code requires 12 hours of rest between working days
+# (24 hours after a 12-hour shift), so the rest before the next shift is always longer than the
+# gap, while the entry and exit punches of a shift as long as the schedule allows stay together.
+MIN_PUNCH_SHIFT_GAP = pd.Timedelta(hours=11)
+PUNCH_SHIFT_MARGIN = pd.Timedelta(hours=2)
+
+# Function to map the raw CSV header onto the 'badge' and 'timestamp' columns
+def resolve_raw_event_columns(header):
+    resolved = {}
+    for column in header:
+        for name, aliases in RAW_EVENT_COLUMNS.items():
+            if column.strip().lower() in aliases and name not in resolved.values():
+                resolved[column] = name
+    missing = set(RAW_EVENT_COLUMNS) - set(resolved.values())
+    if missing:
+        raise ValueError(f"Lipsesc coloanele {sorted(missing)} din fișierul de evenimente (antet: {list(header)})")
+    return resolved
+
+# Function to return the shift gap of every badge from the work schedule of the badge and of its
+# department in the badge directory
+def get_punch_shift_gaps(badges, directory=None, margin=PUNCH_SHIFT_MARGIN, minimum=MIN_PUNCH_SHIFT_GAP):
+    badges = pd.Index(badges, dtype=str)
+    departments = None
+    if directory is not None and not directory.empty:
+        departments = directory['Departament'].reindex(badges).to_numpy()
+    longest = get_compiled_schedules().longest_shift_hours(departments, badges.to_numpy())
+    gaps = pd.Series(pd.to_timedelta(longest, unit='h') + margin, index=badges)
+    return gaps.clip(lower=minimum)
+
+# Function to merge punch intervals of the same badge that are less than `gap` apart into shifts;
+# `gap` is one Timedelta for all badges or a Series of them indexed by badge
+def merge_punch_intervals(intervals, gap):
+    if intervals.empty:
+        return intervals
+
+    intervals = intervals.sort_values(['badge', 'first'], kind='mergesort', ignore_index=True)
+
+    # A shift starts where the gap to the latest punch seen so far for the badge exceeds `gap`
+    latest_punch = intervals.groupby('badge', sort=False, observed=True)['last'].cummax()
+    previous_punch = latest_punch.groupby(intervals['badge'], sort=False, observed=True).shift()
+    if isinstance(gap, pd.Series):
+        gap = gap.reindex(intervals['badge'].astype(str)).to_numpy()
+    shift_id = (previous_punch.isna() | (intervals['first'] - previous_punch > gap)).cumsum()
+
+    shifts = intervals.groupby(shift_id, sort=False).agg(
+        badge=('badge', 'first'), first=('first', 'min'), last=('last', 'max'), punches=('punches', 'sum')
+    )
+    shifts['badge'] = shifts['badge'].astype(str)
+    return shifts.reset_index(drop=True)
+
+# Function to reduce a raw punch event CSV to shifts (badge, first, last, punches), chunk by chunk.
+# Without a fixed `gap` every badge uses the gap of its work schedule (see get_punch_shift_gaps).
+def read_punch_shifts(source, chunk_rows=RAW_EVENT_CHUNK_ROWS, gap=None, issues=None, progress=None, directory=None):
+    header = pd.read_csv(source, nrows=0).columns
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    columns = resolve_raw_event_columns(header)
+
+    shifts = []
+    invalid_rows = 0
+    event_rows = 0
+    for chunk in pd.read_csv(source, usecols=list(columns), dtype=str, chunksize=chunk_rows):
+        chunk = chunk.rename(columns=columns)
+        events = pd.DataFrame({
+            'badge': chunk['badge'].str.strip(),
+            'first': pd.to_datetime(chunk['timestamp'].str.strip(), errors='coerce', format='ISO8601'),
+        })
+        valid = events['first'].notna() & events['badge'].notna() & (events['badge'] != '')
+        invalid_rows += int((~valid).sum())
+        event_rows += len(events)
+
+        events = events[valid]
+        events['badge'] = events['badge'].astype('category')
+        events['last'] = events['first']
+        events['punches'] = 1
+        chunk_gap = gap if gap is not None else get_punch_shift_gaps(events['badge'].cat.categories, directory)
+        shifts.append(merge_punch_intervals(events, chunk_gap))
+        if progress is not None:
+            progress('parse', event_rows, None, None)
+
+    if invalid_rows:
+        logger.warning("%d evenimente fără legitimație sau cu marcaj de timp invalid au fost ignorate", invalid_rows)
+        if issues is not None:
+            issues.append({'Linia': '', 'Angajat': '', 'Problemă': f"{invalid_rows} evenimente fără legitimație sau cu marcaj de timp invalid"})
+
+    if not shifts:
+        return pd.DataFrame(columns=['badge', 'first', 'last', 'punches']), event_rows
+
+    # Shifts cut by a chunk boundary are joined again here
+    shifts = pd.concat(shifts, ignore_index=True)
+    if gap is None:
+        gap = get_punch_shift_gaps(shifts['badge'].unique(), directory)
+    return merge_punch_intervals(shifts, gap), event_rows
+
+# Function to build the badge -> (employee, department) directory from the attendance history
+def get_badge_directory(historical_df):
+    if historical_df is None or historical_df.empty:
+        return pd.DataFrame(columns=['Angajat', 'Departament'])
+
+    known = historical_df.sort_values('Data_Obiect').drop_duplicates('ID Legitimație', keep='last')
+    return known.set_index(known['ID Legitimație'].astype(str))[['Angajat', 'Departament']].astype(str)
+
+# Function to turn shifts into per-day attendance rows (the day of a shift is the day it starts)
+def shifts_to_daily_rows(shifts, directory, issues=None):
+    if shifts.empty:
+        return pd.DataFrame()
+
+    shifts = shifts.assign(Data_Obiect=shifts['first'].dt.normalize())
+
+    # Several shifts starting on the same day count from the first entry to the last exit
+    days = shifts.groupby(['badge', 'Data_Obiect'], as_index=False, sort=False).agg(
+        first=('first', 'min'), last=('last', 'max'), punches=('punches', 'sum')
+    )
+
+    # Badges missing from the roster are reported and left out, so they never reach the history
+    people = directory.reindex(days['badge'])
+    unknown = people['Angajat'].isna().to_numpy()
+    if unknown.any():
+        if issues is not None:
+            for badge, day_count in days.loc[unknown, 'badge'].value_counts(sort=False).items():
+                issues.append({'Linia': '', 'Angajat': badge, 'Problemă': f"Legitimație fără angajat în istoric; {day_count} zile ignorate"})
+        logger.warning("%d zile ale legitimațiilor fără angajat în istoric au fost ignorate", int(unknown.sum()))
+        days = days[~unknown].reset_index(drop=True)
+        people = people[~unknown]
+        if days.empty:
+            return pd.DataFrame()
+
+    single_punch = days['punches'] == 1
+    if single_punch.any() and issues is not None:
+        for badge, day_count in days.loc[single_punch, 'badge'].value_counts(sort=False).items():
+            issues.append({'Linia': '', 'Angajat': badge, 'Problemă': f"{day_count} zile cu o singură citire a cardului (fără ieșire)"})
+
+    return pd.DataFrame({
+        'Angajat': people['Angajat'].to_numpy(),
+        'Departament': people['Departament'].to_numpy(),
+        'ID Legitimație': days['badge'].to_numpy(),
+        'Zi': days['Data_Obiect'].dt.dayofweek.map(dict(enumerate(WEEKDAY_NAMES))).to_numpy(),
+        'Data': days['Data_Obiect'].dt.strftime('%d %B').str.lstrip('0').to_numpy(),
+        'Data_Obiect': days['Data_Obiect'].to_numpy(),
+        'Ora Sosire': days['first'].dt.strftime('%H:%M').to_numpy(),
+        'Ora Plecare': days['last'].dt.strftime('%H:%M').where(~single_punch, '').to_numpy(),
+        'Durata (Ore)': ((days['last'] - days['first']).dt.total_seconds() / 3600).round(2).to_numpy(),
+    })
+
+# Function to process a raw punch event CSV (badge, timestamp[, door]) into the same frames as a report export
+# progress is called as in process_attendance_data; while reading, `done` counts the events read so far
+def process_raw_events(source, recorder=None, issues=None, directory=None, chunk_rows=RAW_EVENT_CHUNK_ROWS,
+                       gap=None, progress=None):
+    recorder = recorder or StageRecorder(enabled=False)
+    recorder.begin('parse')
+
+    directory = directory if directory is not None else get_badge_directory(None)
+    shifts, event_rows = read_punch_shifts(source, chunk_rows, gap, issues, progress, directory)
+    df = shifts_to_daily_rows(shifts, directory, issues)
+    logger.info("%d evenimente reduse la %d zile de prezență", event_rows, len(df))
+
+    recorder.end(rows=event_rows)
+
+    if df.empty:
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), "N/A", datetime.now().year
+
+    start_date = df['Data_Obiect'].min()
+    end_date = df['Data_Obiect'].max()
+    date_range = f"{start_date.day} {start_date:%B %Y} - {end_date.day} {end_date:%B %Y}"
+
+    daily_df, weekly_df, monthly_df = build_attendance_frames(df, start_date, end_date, recorder, progress)
+    return daily_df, weekly_df, monthly_df, date_range, start_date.year
@@ -0,0 +1,121 @@
+# Usage (from the repository root): python recompute.py [--workers N]
+#
+# Recomputes everything derived from the work schedules, leave records and legal holidays over the
+# whole stored history: 'Ore Standard', 'Diferență' and 'Concediu' of every day, the employee-month
+# cube and the balance ledger. Run it after changing data/schedules.json, data/leave_records.csv or
+# ROMANIAN_HOLIDAYS instead of uploading every file again. The history is split into shards of
+# whole employees, the shards are recomputed in a process pool (each worker reads only its rows
+# from the memory-mapped history file) and the results are written back atomically as a new
+# history version. Months closed for payroll (see periods.py) are left as they were closed.
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from attendance import (
+    CUBE_COLUMNS,
+    HISTORY_PATH,
+    apply_work_schedules,
+    build_balance_ledger,
+    build_history_cube,
+    get_history_version,
+    load_historical_data,
+    load_history_cube,
+    replace_history_files,
+)
+from periods import get_closed_month_numbers, get_closed_row_mask
+
+logger = logging.getLogger(__name__)
+
+# History columns a shard needs for the schedules and the cube
+RECOMPUTE_COLUMNS = ['Angajat', 'Departament', 'ID Legitimație', 'Data_Obiect', 'Ora Sosire', 'Durata (Ore)']
+
+# Shards per worker; more shards than workers keep the pool busy when employees have uneven row counts
+SHARDS_PER_WORKER = 4
+
+# Function to split the history rows into shards of whole employees, as row positions
+def get_employee_shards(employees, shard_count):
+    employee_codes, _ = pd.factorize(employees)
+    shard_of_row = employee_codes % shard_count
+    order = np.argsort(shard_of_row, kind='stable')
+    boundaries = np.searchsorted(shard_of_row[order], np.arange(1, shard_count))
+    return [positions for positions in np.split(order, boundaries) if len(positions)]
+
+# Function to recompute one shard (runs in a worker process): returns its row positions, the new
+# standard hours, differences and leave types of those rows, and the cube rows of its employees
+def recompute_shard(positions):
+    table = feather.read_table(HISTORY_PATH, columns=RECOMPUTE_COLUMNS, memory_map=True)
+    shard = apply_work_schedules(table.take(positions).to_pandas())
+    return (
+        positions,
+        shard['Ore Standard'].to_numpy(dtype='float32'),
+        shard['Diferență'].to_numpy(dtype='float32'),
+        shard['Concediu'].to_numpy(dtype=object),
+        build_history_cube(shard),
+    )
+
+# Function to recompute the derived data of the whole history and write it back as a new version.
+# Returns the number of history rows and of rows whose standard hours changed.
+def recompute_history(workers=None):
+    workers = workers or os.cpu_count() or 1
+    version = get_history_version()
+    history_df = load_historical_data()
+    if history_df.empty:
+        logger.info("Istoricul este gol; nu este nimic de recalculat")
+        return 0, 0
+
+    shards = get_employee_shards(history_df['Angajat'], workers * SHARDS_PER_WORKER)
+    if workers == 1:
+        results = [recompute_shard(positions) for positions in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(recompute_shard, shards))
+
+    standard_hours = np.empty(len(history_df), dtype='float32')
+    differences = np.empty(len(history_df), dtype='float32')
+    leave_types = np.empty(len(history_df), dtype=object)
+    for positions, shard_standard_hours, shard_differences, shard_leave_types, _ in results:
+        standard_hours[positions] = shard_standard_hours
+        differences[positions] = shard_differences
+        leave_types[positions] = shard_leave_types
+
+    # Closed payroll months keep the hours, leave days and cube cells they were closed with
+    closed_rows = get_closed_row_mask(history_df['Data_Obiect'])
+    standard_hours[closed_rows] = history_df['Ore Standard'].to_numpy()[closed_rows]
+    differences[closed_rows] = history_df['Diferență'].to_numpy()[closed_rows]
+    if 'Concediu' in history_df.columns:
+        leave_types[closed_rows] = history_df['Concediu'].astype(str).to_numpy()[closed_rows]
+    changed_rows = int((standard_hours != history_df['Ore Standard'].to_numpy()).sum())
+
+    cube = pd.concat([result[4] for result in results], ignore_index=True)[CUBE_COLUMNS]
+    closed_months = get_closed_month_numbers()
+    if closed_months:
+        stored_cube = load_history_cube()
+        stored_closed = (stored_cube['An'] * 12 + stored_cube['Luna']).isin(closed_months)
+        cube = pd.concat([cube[~(cube['An'] * 12 + cube['Luna']).isin(closed_months)], stored_cube[stored_closed]],
+                         ignore_index=True)[CUBE_COLUMNS]
+    cube = cube.sort_values(['Angajat', 'An', 'Luna']).reset_index(drop=True)
+    history_df = history_df.assign(**{'Ore Standard': standard_hours, 'Diferență': differences,
+                                      'Concediu': pd.Categorical(leave_types)})
+    replace_history_files(history_df, cube, build_balance_ledger(cube), version)
+
+    return len(history_df), changed_rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute standard hours, differences, the cube and the balance ledger of the history")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU core)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    start = time.perf_counter()
+    total_rows, changed_rows = recompute_history(args.workers)
+    seconds = time.perf_counter() - start
+    logger.info("%d rânduri recalculate în %.2f s (%.0f rânduri/s), %d cu ore standard modificate",
+                total_rows, seconds, total_rows / seconds if seconds else 0, changed_rows)
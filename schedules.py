@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Optional policy file; when missing only DEFAULT_SCHEDULE_POLICIES apply
+SCHEDULES_PATH = 'data/schedules.json'
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+WEEKDAY_NAMES = ['Luni', 'Marți', 'Miercuri', 'Joi', 'Vineri', 'Sâmbătă', 'Duminică']
+
+# Work schedule policies. Each policy has:
+#   name         - label shown in the UI
+#   departments  - departments it applies to (optional)
+#   badges       - badge IDs it applies to (optional, wins over departments)
+#   start, end   - inclusive effective dates "YYYY-MM-DD" (optional, open-ended when missing)
+#   shifts       - weekday -> [shift start, shift end]; weekdays left out are days off
+# A policy without departments or badges is a default for everyone. For the same
+# department/badge and date, policies later in the list take precedence.
+DEFAULT_SCHEDULE_POLICIES = [
+    {
+        'name': 'Program standard',
+        'shifts': {
+            'Mon': ['08:30', '17:00'],
+            'Tue': ['08:30', '17:00'],
+            'Wed': ['08:30', '17:00'],
+            'Thu': ['08:30', '17:00'],
+            'Fri': ['08:30', '14:30'],
+        },
+    },
+]
+
+# Function to convert "HH:MM" into minutes since midnight
+def clock_to_minutes(value):
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+# Function to return the length in hours of a shift given as "HH:MM" start and end
+def get_shift_hours(shift_start, shift_end):
+    start_minutes = clock_to_minutes(shift_start)
+    end_minutes = clock_to_minutes(shift_end)
+    if end_minutes <= start_minutes:  # Overnight shift
+        end_minutes += 24 * 60
+    return (end_minutes - start_minutes) / 60
+
+# Function to group consecutive weekdays of a policy that have the same shift; returns
+# (days label, number of days, [start, end] or None for days off, hours) per group
+def group_weekly_shifts(policy):
+    shifts = policy.get('shifts', {})
+    groups = []
+    for index, day in enumerate(WEEKDAYS):
+        shift = list(shifts[day]) if day in shifts else None
+        if groups and groups[-1][2] == shift:
+            groups[-1][1] = index
+        else:
+            groups.append([index, index, shift])
+    return [(WEEKDAY_NAMES[first] if first == last else f"{WEEKDAY_NAMES[first]}-{WEEKDAY_NAMES[last]}",
+             last - first + 1, shift, get_shift_hours(*shift) if shift else 0.0)
+            for first, last, shift in groups]
+
+# Function to load schedule policies from the policy file, falling back to the defaults
+def load_schedule_policies(path=SCHEDULES_PATH):
+    if not os.path.exists(path):
+        return DEFAULT_SCHEDULE_POLICIES
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# Work schedules compiled into lookup arrays indexed [selector, period, weekday].
+# Selector 0 is the default schedule, the others are one department or one badge.
+# Periods are the intervals between consecutive effective-date boundaries.
+class CompiledSchedules:
+    def __init__(self, policies):
+        self.policies = policies
+        self._description = None
+
+        boundaries = set()
+        for policy in policies:
+            unknown_days = set(policy.get('shifts', {})) - set(WEEKDAYS)
+            if unknown_days:
+                raise ValueError(f"Zile necunoscute în programul '{policy.get('name')}': {sorted(unknown_days)}")
+            if policy.get('start'):
+                boundaries.add(np.datetime64(policy['start'], 'D'))
+            if policy.get('end'):
+                boundaries.add(np.datetime64(policy['end'], 'D') + 1)
+        self.boundaries = np.array(sorted(boundaries), dtype='datetime64[D]')
+
+        self.department_index = {}
+        self.badge_index = {}
+        for policy in policies:
+            for department in policy.get('departments', []):
+                self.department_index.setdefault(department, 1 + len(self.department_index) + len(self.badge_index))
+            for badge in policy.get('badges', []):
+                self.badge_index.setdefault(badge, 1 + len(self.department_index) + len(self.badge_index))
+
+        selector_count = 1 + len(self.department_index) + len(self.badge_index)
+        period_count = len(self.boundaries) + 1
+
+        # NaN marks (selector, period) cells that no policy covers
+        self.hours = np.full((selector_count, period_count, 7), np.nan, dtype='float32')
+        self.start_minutes = np.full((selector_count, period_count, 7), np.nan, dtype='float32')
+
+        for policy in policies:
+            day_hours = np.zeros(7, dtype='float32')
+            day_starts = np.full(7, np.nan, dtype='float32')
+            for day_name, (shift_start, shift_end) in policy.get('shifts', {}).items():
+                day_hours[WEEKDAYS.index(day_name)] = get_shift_hours(shift_start, shift_end)
+                day_starts[WEEKDAYS.index(day_name)] = clock_to_minutes(shift_start)
+
+            first_period = 0
+            last_period = period_count - 1
+            if policy.get('start'):
+                first_period = int(np.searchsorted(self.boundaries, np.datetime64(policy['start'], 'D'), side='right'))
+            if policy.get('end'):
+                last_period = int(np.searchsorted(self.boundaries, np.datetime64(policy['end'], 'D'), side='right'))
+
+            selectors = [self.department_index[d] for d in policy.get('departments', [])]
+            selectors += [self.badge_index[b] for b in policy.get('badges', [])]
+            for selector in selectors or [0]:
+                self.hours[selector, first_period:last_period + 1] = day_hours
+                self.start_minutes[selector, first_period:last_period + 1] = day_starts
+
+    # Function to map labels to selector indices through their categorical codes (-1 = none)
+    @staticmethod
+    def selector_codes(values, index):
+        categorical = pd.Categorical(values)
+        category_selectors = np.array([index.get(category, -1) for category in categorical.categories] + [-1])
+        return category_selectors[categorical.codes]
+
+    # Function to look up scheduled hours and shift start (minutes) for each (date, department, badge)
+    def lookup(self, dates, departments=None, badges=None):
+        dates = pd.to_datetime(pd.Series(dates), errors='coerce')
+        valid = dates.notna().to_numpy()
+        days = dates.to_numpy().astype('datetime64[D]')
+        day_numbers = days.astype('int64')
+
+        period = np.searchsorted(self.boundaries, days, side='right')
+        weekday = (day_numbers + 3) % 7  # 1970-01-01 was a Thursday
+        period = np.where(valid, period, 0)
+        weekday = np.where(valid, weekday, 0)
+
+        row_count = len(days)
+        candidates = []
+        if badges is not None and self.badge_index:
+            candidates.append(self.selector_codes(badges, self.badge_index))
+        if departments is not None and self.department_index:
+            candidates.append(self.selector_codes(departments, self.department_index))
+        candidates.append(np.zeros(row_count, dtype='int64'))
+
+        # Most specific selector first: badge, then department, then the default
+        hours = np.full(row_count, np.nan, dtype='float32')
+        start_minutes = np.full(row_count, np.nan, dtype='float32')
+        for selector in candidates:
+            has_selector = selector >= 0
+            safe_selector = np.where(has_selector, selector, 0)
+            candidate_hours = self.hours[safe_selector, period, weekday]
+            fill = np.isnan(hours) & has_selector & ~np.isnan(candidate_hours)
+            hours[fill] = candidate_hours[fill]
+            start_minutes[fill] = self.start_minutes[safe_selector, period, weekday][fill]
+
+        hours = np.where(valid, np.nan_to_num(hours), 0).astype('float32')
+        start_minutes = np.where(valid, start_minutes, np.nan).astype('float32')
+        return hours, start_minutes
+
+    # Function to return, for each (department, badge), the longest shift in hours of the schedule that
+    # applies to it (badge, then department, then the default), over all periods and weekdays
+    def longest_shift_hours(self, departments=None, badges=None):
+        covered = ~np.isnan(self.hours).reshape(len(self.hours), -1)
+        selector_longest = np.where(covered.any(axis=1), np.where(covered, self.hours.reshape(len(self.hours), -1), 0).max(axis=1), np.nan)
+
+        row_count = len(badges) if badges is not None else len(departments) if departments is not None else 1
+        candidates = []
+        if badges is not None and self.badge_index:
+            candidates.append(self.selector_codes(badges, self.badge_index))
+        if departments is not None and self.department_index:
+            candidates.append(self.selector_codes(departments, self.department_index))
+        candidates.append(np.zeros(row_count, dtype='int64'))
+
+        longest = np.full(row_count, np.nan)
+        for selector in candidates:
+            candidate_longest = np.where(selector >= 0, selector_longest[np.where(selector >= 0, selector, 0)], np.nan)
+            longest = np.where(np.isnan(longest), candidate_longest, longest)
+        return np.nan_to_num(longest)
+
+    # Function to return the policy that applies to a department (or to everyone when None) on a
+    # day: the last matching policy in the list, as in lookup; None when no policy covers the day
+    def get_policy(self, day, department=None):
+        day = np.datetime64(day, 'D')
+        default_policy = None
+        department_policy = None
+        for policy in self.policies:
+            if policy.get('start') and day < np.datetime64(policy['start'], 'D'):
+                continue
+            if policy.get('end') and day > np.datetime64(policy['end'], 'D'):
+                continue
+            if not policy.get('departments') and not policy.get('badges'):
+                default_policy = policy
+            elif department is not None and department in policy.get('departments', []):
+                department_policy = policy
+        return department_policy or default_policy
+
+    # Function to describe the policies as a table for the UI (built once per compiled version)
+    def describe(self):
+        if self._description is not None:
+            return self._description
+
+        rows = []
+        for policy in self.policies:
+            shifts = policy.get('shifts', {})
+            rows.append({
+                'Program': policy.get('name', ''),
+                'Se aplică': ', '.join(policy.get('badges', []) + policy.get('departments', [])) or 'Toți angajații',
+                'De la': policy.get('start', ''),
+                'Până la': policy.get('end', ''),
+                **{day: '-'.join(shifts[day]) if day in shifts else '' for day in WEEKDAYS},
+            })
+        self._description = pd.DataFrame(rows)
+        return self._description
+
+_compiled_cache = {}
+
+# Function to return the version of the policy file ('' when there is none)
+def get_schedules_version(path=SCHEDULES_PATH):
+    return str(os.path.getmtime(path)) if os.path.exists(path) else ''
+
+# Function to return the compiled schedules, recompiling only when the policy file changes
+def get_compiled_schedules(path=SCHEDULES_PATH):
+    version = os.path.getmtime(path) if os.path.exists(path) else None
+    cached = _compiled_cache.get(path)
+    if cached is None or cached[0] != version:
+        try:
+            compiled = CompiledSchedules(load_schedule_policies(path))
+        except Exception as e:
+            logger.warning("Nu s-au putut încărca programele de lucru din %s: %s", path, e)
+            compiled = CompiledSchedules(DEFAULT_SCHEDULE_POLICIES)
+        _compiled_cache[path] = (version, compiled)
+    return _compiled_cache[path][1]
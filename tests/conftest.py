@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+import leave
+import periods
+import schedules
+from attendance import process_attendance_data
+from benchmarks.generate_export import generate_export_csv
+
+# The session starts in a directory of its own as well, so a history writer thread still running
+# after its test, when the working directory is restored, never writes under the repository
+@pytest.fixture(autouse=True, scope='session')
+def session_workdir(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp('session'))
+        yield
+
+# Every test runs in its own empty directory, since the modules keep their files under the
+# relative data/ directory, and starts with empty per-process caches of those files
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    schedules._compiled_cache.clear()
+    leave._leave_cache.clear()
+    periods._snapshot_cache.clear()
+    return tmp_path
+
+# Function returning a factory of processed synthetic exports: make_upload(...) returns the
+# (daily, weekly, monthly) frames of an export of `employees` over `days` days from `start`
+@pytest.fixture
+def make_upload():
+    def make(employees=6, days=28, start=date(2025, 3, 3), seed=0):
+        daily_df, weekly_df, monthly_df, _, _ = process_attendance_data(generate_export_csv(employees, days, start=start, seed=seed))
+        return daily_df, weekly_df, monthly_df
+    return make
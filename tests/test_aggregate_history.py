@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+from datetime import date
+
+import pandas as pd
+import pyarrow.feather as feather
+import pytest
+
+import attendance
+import aggregate_history
+from attendance import (
+    HISTORY_PATH,
+    LEGACY_HISTORY_PATH,
+    aggregate_history_cube,
+    aggregate_weekly_history,
+    build_history_cube,
+    build_weekly_history,
+    load_historical_data,
+    save_to_historical_data,
+)
+
+# Function to compare aggregate frames on their values, whatever dtypes the reader produced
+def assert_same_rows(result, expected, keys):
+    result, expected = [df.astype({'Angajat': str, 'Departament': str}).sort_values(keys).reset_index(drop=True)
+                        for df in (result, expected)]
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False)
+
+# Function to store a history of several months in which one employee changes department mid-month,
+# written in small record batches so chunks also span batch boundaries; returns it as loaded
+@pytest.fixture
+def stored_history(make_upload):
+    daily_df = make_upload(employees=7, days=90, start=date(2025, 1, 27), seed=3)[0]
+    daily_df['Departament'] = daily_df['Departament'].astype(str)
+    moved = (daily_df['Angajat'] == daily_df['Angajat'].iloc[0]) & (daily_df['Data_Obiect'] >= '2025-03-12')
+    daily_df.loc[moved, 'Departament'] = 'Mutat'
+    save_to_historical_data(daily_df)
+    history_df = load_historical_data()
+    # Replaced, not rewritten in place: history_df still maps the file
+    feather.write_feather(history_df, f"{HISTORY_PATH}.tmp", compression='uncompressed', chunksize=50)
+    os.replace(f"{HISTORY_PATH}.tmp", HISTORY_PATH)
+    return history_df
+
+
+@pytest.mark.parametrize('chunk_rows', [29, 50, 1_000_000])
+def test_chunked_aggregates_match_the_in_memory_builders(stored_history, monkeypatch, chunk_rows):
+    monkeypatch.setattr(attendance, 'get_chunk_rows', lambda bytes_per_row, memory_budget_mb: chunk_rows)
+    assert_same_rows(aggregate_history_cube(), build_history_cube(stored_history), ['Angajat', 'Departament', 'An', 'Luna'])
+    assert_same_rows(aggregate_weekly_history(), build_weekly_history(stored_history), ['Angajat', 'An', 'Săptămână'])
+
+
+@pytest.mark.parametrize('chunk_rows', [37, 1_000_000])
+def test_chunked_aggregates_of_a_legacy_history_match_the_in_memory_builders(stored_history, monkeypatch, chunk_rows):
+    stored_history.to_csv(LEGACY_HISTORY_PATH, index=False)
+    os.remove(HISTORY_PATH)
+    monkeypatch.setattr(attendance, 'get_chunk_rows', lambda bytes_per_row, memory_budget_mb: chunk_rows)
+    assert_same_rows(aggregate_history_cube(), build_history_cube(stored_history), ['Angajat', 'Departament', 'An', 'Luna'])
+    assert_same_rows(aggregate_weekly_history(), build_weekly_history(stored_history), ['Angajat', 'An', 'Săptămână'])
+
+
+def test_aggregates_of_an_empty_history_are_empty():
+    assert aggregate_history_cube().empty
+    assert aggregate_weekly_history().empty
+
+
+def test_the_command_line_writes_to_a_bare_file_name(stored_history):
+    subprocess.run([sys.executable, aggregate_history.__file__, 'weekly', 'out.csv'], check=True)
+    build_weekly_history(stored_history).to_csv('expected.csv', index=False)
+    assert_same_rows(pd.read_csv('out.csv'), pd.read_csv('expected.csv'), ['Angajat', 'An', 'Săptămână'])
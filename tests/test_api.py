@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+import api
+from api import get_cached_response, get_history_frames
+from attendance import get_history_version, save_to_historical_data
+
+
+@pytest.fixture(autouse=True)
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(api, '_history', {'version': None, 'daily': None, 'weekly': None, 'cube': None, 'ledger': None})
+    monkeypatch.setattr(api, '_response_cache', api.OrderedDict())
+    monkeypatch.setattr(api, '_response_cache_size', {'bytes': 0})
+
+
+def test_response_cache_is_bounded_by_body_bytes(monkeypatch):
+    monkeypatch.setattr(api, 'RESPONSE_CACHE_MAX_BYTES', 100)
+    monkeypatch.setattr(api, 'RESPONSE_CACHE_ENTRY_MAX_BYTES', 60)
+    for key in ['a', 'b', 'c']:
+        get_cached_response(key, lambda: b'x' * 40)
+    assert list(api._response_cache) == ['b', 'c']
+    assert api._response_cache_size['bytes'] == 80
+
+    # Too large to keep: sent, but neither cached nor evicting anything
+    assert get_cached_response('big', lambda: b'y' * 70) == b'y' * 70
+    assert list(api._response_cache) == ['b', 'c']
+
+
+def test_history_frames_come_with_the_version_they_were_loaded_at(make_upload):
+    daily_df = make_upload(days=28, start=date(2025, 3, 3))[0]
+    save_to_historical_data(daily_df[daily_df['Data_Obiect'] < '2025-03-17'])
+    version, history_df = get_history_frames()[:2]
+    assert version == get_history_version()
+    get_cached_response((version, 'daily'), lambda: b'body')
+
+    save_to_historical_data(daily_df)
+    new_version, new_history_df = get_history_frames()[:2]
+    assert new_version == get_history_version() != version
+    assert len(new_history_df) == len(daily_df) > len(history_df)
+    assert len(api._response_cache) == 0
@@ -0,0 +1,85 @@
+import io
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from attendance import (
+    HISTORY_PATH,
+    BalanceLedger,
+    build_balance_ledger,
+    build_history_cube,
+    load_balance_ledger,
+    load_historical_data,
+    load_history_cube,
+    save_to_historical_data,
+)
+
+# Function to read a frame back from CSV, as the cube and ledger files are, sorted by `keys`
+def as_stored(df, keys):
+    stored = pd.read_csv(io.StringIO(df.to_csv(index=False)), keep_default_na=False)
+    return stored.sort_values(keys, kind='mergesort').reset_index(drop=True)
+
+# Function to add `hours` to the worked days of a daily frame, as a corrected re-export would
+def with_extra_hours(daily_df, hours):
+    daily_df = daily_df.copy()
+    worked = daily_df['Durata (Ore)'] > 0
+    daily_df.loc[worked, 'Durata (Ore)'] += hours
+    daily_df['Diferență'] = daily_df['Durata (Ore)'] - daily_df['Ore Standard']
+    return daily_df
+
+
+def test_incremental_cube_and_ledger_match_a_full_rebuild(make_upload):
+    daily_df = make_upload(employees=8, days=120, start=date(2025, 1, 6))[0]
+    dates = daily_df['Data_Obiect']
+    uploads = [
+        daily_df[dates < '2025-03-01'],
+        # Overlaps the first upload and replaces its days with corrected hours
+        with_extra_hours(daily_df[(dates >= '2025-02-15') & (dates < '2025-04-15')], 0.75),
+        # Rewrites days of the first month, so every later checkpoint of the ledger moves
+        with_extra_hours(daily_df[(dates >= '2025-01-10') & (dates < '2025-01-20')], -1.5),
+        # Continues from the kept checkpoints of January to March
+        daily_df[dates >= '2025-04-01'],
+    ]
+    for upload in uploads:
+        save_to_historical_data(upload)
+
+    rebuilt_cube = build_history_cube(load_historical_data())
+    cube_keys = ['Angajat', 'Departament', 'An', 'Luna']
+    pd.testing.assert_frame_equal(as_stored(load_history_cube(), cube_keys), as_stored(rebuilt_cube, cube_keys))
+
+    ledger_keys = ['Angajat', 'An', 'Luna']
+    pd.testing.assert_frame_equal(as_stored(load_balance_ledger(), ledger_keys),
+                                  as_stored(build_balance_ledger(rebuilt_cube), ledger_keys))
+
+
+def test_a_new_history_does_not_keep_the_cube_and_ledger_of_the_removed_one(make_upload):
+    save_to_historical_data(make_upload(employees=5, days=40, start=date(2025, 1, 6), seed=1)[0])
+    os.remove(HISTORY_PATH)
+    save_to_historical_data(make_upload(employees=4, days=30, start=date(2025, 4, 7), seed=2)[0])
+
+    rebuilt_cube = build_history_cube(load_historical_data())
+    cube_keys = ['Angajat', 'Departament', 'An', 'Luna']
+    pd.testing.assert_frame_equal(as_stored(load_history_cube(), cube_keys), as_stored(rebuilt_cube, cube_keys))
+
+    ledger_keys = ['Angajat', 'An', 'Luna']
+    pd.testing.assert_frame_equal(as_stored(load_balance_ledger(), ledger_keys),
+                                  as_stored(build_balance_ledger(rebuilt_cube), ledger_keys))
+
+
+@pytest.mark.parametrize('as_of, since', [
+    ('2025-02-28', None),
+    ('2025-03-14', None),
+    ('2025-04-30', '2025-03-01'),
+    ('2025-04-09', '2025-02-17'),
+])
+def test_balance_as_of_matches_the_sum_of_daily_differences(make_upload, as_of, since):
+    save_to_historical_data(make_upload(employees=8, days=100, start=date(2025, 1, 20))[0])
+    history = load_historical_data()
+
+    balance = BalanceLedger(load_balance_ledger()).balance_as_of(as_of, history, since)
+
+    days = history[(history['Data_Obiect'] <= as_of) & (history['Data_Obiect'] >= (since or '1900-01-01'))]
+    expected = days.groupby(days['Angajat'].astype(str), observed=True)['Diferență'].sum().astype('float64')
+    assert balance.set_index('Angajat')['Sold'].to_dict() == pytest.approx(expected.to_dict(), abs=0.05)
@@ -0,0 +1,26 @@
+import json
+
+from charts import get_schedule_reference_lines
+from schedules import SCHEDULES_PATH
+
+
+def test_reference_lines_follow_the_default_schedule(make_upload):
+    daily_df = make_upload()[0]
+    assert get_schedule_reference_lines(daily_df, 'Ora Sosire') == [(8.5, "Început Luni-Vineri (08:30)")]
+    assert get_schedule_reference_lines(daily_df, 'Ora Plecare') == [(17.0, "Sfârșit Luni-Joi (17:00)"), (14.5, "Sfârșit Vineri (14:30)")]
+
+
+def test_reference_lines_follow_the_department_schedule_or_are_left_out(make_upload):
+    daily_df = make_upload(employees=10)[0]
+    department = daily_df['Departament'].astype(str).iloc[0]
+    policies = [
+        {'name': 'Program standard', 'shifts': {day: ['08:30', '17:00'] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']}},
+        {'name': 'Ture de noapte', 'departments': [department], 'shifts': {day: ['22:00', '06:00'] for day in ['Mon', 'Tue', 'Wed']}},
+    ]
+    with open(SCHEDULES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(policies, f)
+
+    department_df = daily_df[daily_df['Departament'] == department]
+    assert get_schedule_reference_lines(department_df, 'Ora Plecare') == [(6.0, "Sfârșit Luni-Miercuri (06:00)")]
+    # Rows of departments with different schedules have no common reference
+    assert get_schedule_reference_lines(daily_df, 'Ora Sosire') == []
@@ -0,0 +1,108 @@
+import os
+
+import pandas as pd
+import pytest
+
+import history_queue
+from attendance import (
+    CUBE_PATH,
+    HISTORY_PATH,
+    LEDGER_PATH,
+    load_balance_ledger,
+    load_historical_data,
+    load_history_cube,
+    merge_into_history,
+    save_to_historical_data,
+)
+from history_queue import FAILED_BATCH_DIR, HistoryWriter, enqueue_history_rows, get_batch_path, list_queued_batches
+
+# Function to read the history, its cube and its balance ledger, each sorted by its key
+def read_history_files():
+    return (
+        load_historical_data().sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True),
+        load_history_cube().sort_values(['Angajat', 'An', 'Luna']).reset_index(drop=True),
+        load_balance_ledger().sort_values(['Angajat', 'An', 'Luna']).reset_index(drop=True),
+    )
+
+# Function to drain the queue until it is empty
+def drain_all(writer):
+    while writer.drain():
+        pass
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(history_queue, 'QUEUE_RETRY_SECONDS', 0.05)
+    return HistoryWriter()
+
+
+def test_draining_a_committed_batch_again_gives_the_same_history(writer, make_upload):
+    daily_df = make_upload()[0]
+    writer.wait(writer.submit(daily_df))
+    committed = read_history_files()
+
+    # Left in the queue by a writer that stopped between its commit and the removal of the batch
+    enqueue_history_rows(daily_df)
+    drain_all(writer)
+
+    assert list_queued_batches() == []
+    for stored, expected in zip(read_history_files(), committed):
+        pd.testing.assert_frame_equal(stored, expected)
+
+
+def test_coalesced_batches_match_saving_them_one_after_the_other(writer, make_upload):
+    daily_df = make_upload(days=35)[0]
+    dates = daily_df['Data_Obiect']
+    first = daily_df[dates < '2025-03-24']
+    second = daily_df[dates >= '2025-03-17'].assign(**{'Durata (Ore)': lambda df: df['Durata (Ore)'] + 0.5})
+
+    save_to_historical_data(first)
+    save_to_historical_data(second)
+    sequential = read_history_files()
+    for path in [HISTORY_PATH, CUBE_PATH, LEDGER_PATH]:
+        os.remove(path)
+
+    enqueue_history_rows(first)
+    enqueue_history_rows(second)
+    drain_all(writer)
+
+    for stored, expected in zip(read_history_files(), sequential):
+        pd.testing.assert_frame_equal(stored, expected)
+
+
+def test_a_failed_merge_is_retried_before_the_upload_is_told(writer, monkeypatch, make_upload):
+    errors = iter([OSError("disc plin")])
+
+    def flaky_merge(new_data):
+        for error in errors:
+            raise error
+        return merge_into_history(new_data)
+
+    monkeypatch.setattr(history_queue, 'merge_into_history', flaky_merge)
+    daily_df = make_upload()[0]
+    assert writer.wait(writer.submit(daily_df)) == len(daily_df)
+    assert not os.path.isdir(FAILED_BATCH_DIR)
+
+
+def test_a_batch_that_keeps_failing_is_moved_out_of_the_queue(writer, monkeypatch, make_upload):
+    def failing_merge(new_data):
+        raise OSError("disc plin")
+
+    monkeypatch.setattr(history_queue, 'merge_into_history', failing_merge)
+    batch_id = writer.submit(make_upload()[0])
+    with pytest.raises(RuntimeError):
+        writer.wait(batch_id)
+
+    # Failed means not applied: the rows are neither in the history nor merged by a later drain
+    assert os.path.exists(get_batch_path(batch_id, FAILED_BATCH_DIR))
+    assert list_queued_batches() == []
+    assert not os.path.exists(HISTORY_PATH)
+
+
+def test_outcomes_are_kept_only_for_batches_of_this_process(writer, make_upload):
+    # Enqueued directly, as the writer of another process would find it
+    enqueue_history_rows(make_upload()[0])
+    drain_all(writer)
+    assert list_queued_batches() == []
+    assert writer.committed_rows == {}
+    assert writer.failures == {}
@@ -0,0 +1,57 @@
+import random
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from indexes import build_result_indexes
+
+# Function to return the first day of every row's period: the day, the Monday of the ISO week or the first of the month
+def get_period_starts(view, df):
+    if view == 'daily':
+        return pd.to_datetime(df['Data_Obiect'])
+    if view == 'weekly':
+        return pd.to_datetime([date.fromisocalendar(int(year), int(week), 1) for year, week in zip(df['An'], df['Săptămână'])])
+    return pd.to_datetime(pd.DataFrame({'year': df['An'], 'month': df['Luna'], 'day': 1}))
+
+# Function to filter a result frame with boolean masks, keeping the periods that overlap [start, end]
+def select_with_masks(view, df, employees, departments, start, end):
+    mask = pd.Series(True, index=df.index)
+    if employees:
+        mask &= df['Angajat'].isin(employees)
+    if departments:
+        mask &= df['Departament'].isin(departments)
+
+    period_start = pd.Series(get_period_starts(view, df), index=df.index)
+    period_end = {
+        'daily': period_start,
+        'weekly': period_start + pd.Timedelta(days=6),
+        'monthly': period_start + pd.offsets.MonthEnd(0),
+    }[view]
+    if start is not None:
+        mask &= period_end >= start
+    if end is not None:
+        mask &= period_start <= end
+    return df[mask]
+
+
+@pytest.mark.parametrize('view', ['daily', 'weekly', 'monthly'])
+def test_index_selection_matches_boolean_masks(make_upload, view):
+    frames = dict(zip(['daily', 'weekly', 'monthly'], make_upload(employees=12, days=90, start=date(2025, 3, 3))))
+    index = build_result_indexes(frames['daily'], frames['weekly'], frames['monthly'])[view]
+    df = frames[view]
+
+    employees = sorted(df['Angajat'].astype(str).unique())
+    departments = sorted(df['Departament'].astype(str).unique())
+    days = pd.date_range('2025-02-20', '2025-06-10', freq='D')
+    rng = random.Random(40)
+    for _ in range(100):
+        selected_employees = rng.sample(employees, rng.randint(0, 3))
+        selected_departments = rng.sample(departments, rng.randint(0, 2))
+        start, end = sorted(rng.sample(list(days), 2))
+        start = start if rng.random() < 0.7 else None
+        end = end if rng.random() < 0.7 else None
+
+        selected = index.select(employees=selected_employees, departments=selected_departments, start=start, end=end)
+        expected = select_with_masks(view, df, selected_employees, selected_departments, start, end)
+        pd.testing.assert_frame_equal(selected, expected)
@@ -0,0 +1,60 @@
+import os
+from datetime import date, datetime, timedelta
+
+import ingest_ledger
+from api import ingest_upload
+from attendance import INGEST_LEDGER_PATH, LEGACY_HISTORY_PATH, load_historical_data, save_to_historical_data
+from benchmarks.generate_export import generate_export_csv
+from ingest_ledger import load_ingest_ledger, prune_file_entries, write_ingest_ledger
+
+LEDGER = {'files': {'a': {'imported_at': '2025-03-01T10:00:00'}}, 'blocks': {}}
+
+
+def test_loading_without_history_ignores_the_ledger_and_keeps_it():
+    write_ingest_ledger(LEDGER)
+    assert load_ingest_ledger() == {'files': {}, 'blocks': {}}
+    assert os.path.exists(INGEST_LEDGER_PATH)
+
+
+def test_loading_keeps_the_ledger_of_a_legacy_history():
+    write_ingest_ledger(LEDGER)
+    open(LEGACY_HISTORY_PATH, 'w').close()
+    assert load_ingest_ledger() == LEDGER
+
+
+def test_starting_a_new_history_removes_the_ledger(make_upload):
+    write_ingest_ledger(LEDGER)
+    save_to_historical_data(make_upload()[0])
+    assert not os.path.exists(INGEST_LEDGER_PATH)
+
+
+def test_file_entries_are_capped_and_aged_out(monkeypatch):
+    monkeypatch.setattr(ingest_ledger, 'MAX_INGEST_FILES', 3)
+    now = datetime(2025, 6, 1)
+    files = {f"f{index}": {'imported_at': (now - timedelta(days=index)).isoformat(timespec='seconds')} for index in range(5)}
+    files['old'] = {'imported_at': (now - timedelta(days=ingest_ledger.INGEST_FILE_RETENTION_DAYS + 1)).isoformat(timespec='seconds')}
+    assert list(prune_file_entries(files, now)) == ['f2', 'f1', 'f0']
+
+    monkeypatch.setattr(ingest_ledger, 'MAX_INGEST_FILES', 10)
+    assert list(prune_file_entries(files, now)) == ['f4', 'f3', 'f2', 'f1', 'f0']
+
+
+def test_a_report_is_imported_again_after_raw_events_overwrote_its_days():
+    report = generate_export_csv(4, 14, start=date(2025, 3, 3), seed=5).encode()
+    first = ingest_upload(report, 'report', None)
+    assert first.ingest.file_entry is None
+    imported = load_historical_data()
+
+    # Raw punches of one employee for days of the report, with other hours
+    employee_rows = imported[(imported['Angajat'] == imported['Angajat'].iloc[0]) & (imported['Durata (Ore)'] > 0)]
+    badge = employee_rows['ID Legitimație'].iloc[0]
+    punches = ''.join(f"{badge},{day:%Y-%m-%d} {clock},Intrare\n" for day in employee_rows['Data_Obiect'] for clock in ['06:00:00', '18:00:00'])
+    events = ingest_upload(('badge,timestamp,door\n' + punches).encode(), 'events', None)
+    assert events.error is None and events.history_error is None
+    assert (load_historical_data().set_index(['Angajat', 'Data_Obiect']).loc[employee_rows.set_index(['Angajat', 'Data_Obiect']).index, 'Durata (Ore)'] == 12).all()
+
+    again = ingest_upload(report, 'report', None)
+    assert again.ingest.file_entry is None
+    restored = load_historical_data().sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True)
+    expected = imported.sort_values(['Angajat', 'Data_Obiect']).reset_index(drop=True)
+    assert restored['Durata (Ore)'].tolist() == expected['Durata (Ore)'].tolist()
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from leave import LeaveCalendar, find_unmatched_employees
+
+RECORDS = pd.DataFrame({
+    'Angajat': ['  MARIA  popa 100 ', 'Nimeni Altcineva 999'],
+    'Început': pd.to_datetime(['2025-03-04', '2025-03-04']),
+    'Sfârșit': pd.to_datetime(['2025-03-06', '2025-03-05']),
+    'Tip': ['Concediu medical', 'Concediu'],
+})
+
+
+def test_leave_names_match_the_report_labels_regardless_of_spacing_and_case():
+    calendar = LeaveCalendar(RECORDS)
+    employees = pd.Series(['Maria Popa 100', 'Maria Popa 100', 'Maria Popa 100', 'Ion Popa 101'])
+    dates = pd.to_datetime(['2025-03-03', '2025-03-04', '2025-03-06', '2025-03-04'])
+    expected = ['', 'Concediu medical', 'Concediu medical', '']
+    assert list(calendar.lookup(employees, dates)) == expected
+    assert list(calendar.lookup(employees.astype('category'), dates)) == expected
+
+
+def test_unmatched_leave_employees_are_listed_as_written():
+    assert find_unmatched_employees(RECORDS, ['Maria Popa 100', 'Ion Popa 101']) == ['Nimeni Altcineva 999']
@@ -0,0 +1,43 @@
+import json
+from datetime import date
+
+import pandas as pd
+
+from attendance import load_historical_data, save_to_historical_data
+from periods import close_period
+from schedules import SCHEDULES_PATH
+
+
+def test_rows_of_a_month_closed_after_the_upload_check_are_not_saved(make_upload):
+    daily_df = make_upload(days=42, start=date(2025, 3, 3))[0]
+    save_to_historical_data(daily_df)
+    close_period(2025, 3)
+    closed_before = load_historical_data()
+    closed_before = closed_before[closed_before['Data_Obiect'].dt.month == 3].reset_index(drop=True)
+
+    # Saved directly, as a batch queued before the close would be
+    save_to_historical_data(daily_df.assign(**{'Durata (Ore)': daily_df['Durata (Ore)'] + 1}))
+
+    history_df = load_historical_data()
+    march = history_df['Data_Obiect'].dt.month == 3
+    pd.testing.assert_frame_equal(history_df[march].reset_index(drop=True), closed_before)
+    stored_april = history_df[~march].sort_values(['Angajat', 'Data_Obiect'])['Durata (Ore)'].to_numpy()
+    uploaded_april = daily_df[daily_df['Data_Obiect'].dt.month == 4].sort_values(['Angajat', 'Data_Obiect'])['Durata (Ore)'].to_numpy() + 1
+    assert (stored_april == uploaded_april).all()
+
+
+def test_manifest_keeps_the_schedule_of_every_department(make_upload):
+    policies = [
+        {'name': 'Program standard', 'shifts': {day: ['09:00', '17:00'] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']}},
+        {'name': 'Program IT', 'departments': ['IT'], 'shifts': {day: ['09:00', '17:00'] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']}},
+    ]
+    with open(SCHEDULES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(policies, f)
+    daily_df = make_upload(employees=10, days=31, start=date(2025, 3, 1))[0]
+    save_to_historical_data(daily_df)
+
+    departments = close_period(2025, 3)['departments']
+    assert sorted(departments) == sorted(daily_df['Departament'].astype(str).unique())
+    assert departments['IT'] == {'working_days': 26, 'standard_monthly_hours': 208.0}
+    other = next(schedule for department, schedule in departments.items() if department != 'IT')
+    assert other == {'working_days': 21, 'standard_monthly_hours': 168.0}
@@ -0,0 +1,73 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+from raw_events import MIN_PUNCH_SHIFT_GAP, get_punch_shift_gaps, read_punch_shifts, shifts_to_daily_rows
+from schedules import SCHEDULES_PATH
+
+DIRECTORY = pd.DataFrame(
+    {'Angajat': ['Ion Popescu 100', 'Ana Stan 101'], 'Departament': ['Paza', 'Vanzari']},
+    index=pd.Index(['100A10', '101B20']),
+)
+
+# Function to write a schedule file where the Paza department works 12-hour shifts
+@pytest.fixture
+def twelve_hour_schedule():
+    policies = [
+        {'name': 'Program standard', 'shifts': {day: ['08:30', '17:00'] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']}},
+        {'name': 'Ture 12 ore', 'departments': ['Paza'], 'shifts': {day: ['07:00', '19:00'] for day in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']}},
+    ]
+    with open(SCHEDULES_PATH, 'w', encoding='utf-8') as f:
+        json.dump(policies, f)
+
+# Function to turn (badge, timestamp) punches into daily rows
+def punches_to_days(punches, issues=None):
+    content = 'badge,timestamp,door\n' + ''.join(f"{badge},{moment},Intrare\n" for badge, moment in punches)
+    shifts, _ = read_punch_shifts(io.StringIO(content), directory=DIRECTORY, issues=issues)
+    return shifts_to_daily_rows(shifts, DIRECTORY, issues)
+
+
+def test_gap_follows_the_longest_scheduled_shift(twelve_hour_schedule):
+    gaps = get_punch_shift_gaps(['100A10', '101B20'], DIRECTORY)
+    assert gaps['100A10'] == pd.Timedelta(hours=14)
+    assert gaps['101B20'] == MIN_PUNCH_SHIFT_GAP
+
+
+def test_two_punch_twelve_hour_shift_is_one_day(twelve_hour_schedule):
+    days = punches_to_days([
+        ('100A10', '2025-03-03 07:00:00'), ('100A10', '2025-03-03 19:00:00'),
+        ('100A10', '2025-03-05 07:00:00'), ('100A10', '2025-03-05 19:00:00'),
+    ])
+    assert days['Data_Obiect'].dt.strftime('%Y-%m-%d').tolist() == ['2025-03-03', '2025-03-05']
+    assert days['Durata (Ore)'].tolist() == [12.0, 12.0]
+    assert days['Ora Plecare'].tolist() == ['19:00', '19:00']
+
+
+def test_twelve_hour_night_shift_counts_on_the_day_it_starts(twelve_hour_schedule):
+    days = punches_to_days([
+        ('100A10', '2025-03-03 19:00:00'), ('100A10', '2025-03-04 07:00:00'),
+        ('100A10', '2025-03-05 19:00:00'), ('100A10', '2025-03-06 07:00:00'),
+    ])
+    assert days['Data_Obiect'].dt.strftime('%Y-%m-%d').tolist() == ['2025-03-03', '2025-03-05']
+    assert days['Durata (Ore)'].tolist() == [12.0, 12.0]
+
+
+def test_office_days_stay_separate_under_the_default_schedule():
+    days = punches_to_days([
+        ('101B20', '2025-03-03 08:30:00'), ('101B20', '2025-03-03 17:00:00'),
+        ('101B20', '2025-03-04 08:30:00'), ('101B20', '2025-03-04 17:00:00'),
+    ])
+    assert len(days) == 2
+    assert days['Durata (Ore)'].tolist() == [8.5, 8.5]
+
+
+def test_unknown_badges_are_reported_and_left_out():
+    issues = []
+    days = punches_to_days([
+        ('101B20', '2025-03-03 08:30:00'), ('101B20', '2025-03-03 17:00:00'),
+        ('999Z99', '2025-03-03 08:00:00'), ('999Z99', '2025-03-03 16:00:00'),
+    ], issues)
+    assert days['ID Legitimație'].tolist() == ['101B20']
+    assert [issue['Angajat'] for issue in issues] == ['999Z99']
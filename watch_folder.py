@@ -0,0 +1,231 @@
+# Usage (from the repository root): python watch_folder.py INBOX [--kind report|events] [--interval 10] [--settle 60]
+#                                                             [--workers 2] [--warm-url http://127.0.0.1:8502] [--once]
+#
+# Watches a folder where the access-control system drops its exports and ingests every new or
+# changed CSV/Excel file through the same pipeline as a browser or API upload (parse, gap fill,
+# upsert into the history through the history queue). A file is ingested only once it has stopped
+# changing: its mtime is at least --settle seconds old and its size and mtime are the same as at the
+# previous scan (copies that keep the source mtime still grow between scans). Files of
+# one scan are ingested in parallel threads, and the history queue merges their rows into one
+# commit. Every ingested file is recorded in data/watch_ingested.json with its size and mtime and is
+# not read again until it changes; failed files are retried only after they change as well.
+# After each scan that ingested something the aggregates are warmed: the history file is read
+# into the OS page cache (the app and the API memory-map it), missing cube and ledger files are
+# built, and with --warm-url the API queries are run once so their responses are cached (with the
+# token in ATTENDANCE_API_TOKEN when the API requires one).
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from api import API_TOKEN_ENV, UPLOAD_KINDS, ingest_upload
+from attendance import HISTORY_PATH, get_history_version, load_balance_ledger, load_history_cube
+from history_queue import get_history_writer
+
+logger = logging.getLogger(__name__)
+
+# Files ingested (or rejected) by the watcher, by absolute path
+WATCH_LEDGER_PATH = 'data/watch_ingested.json'
+WATCH_EXTENSIONS = ('.csv', '.xlsx')
+# Hidden files and Excel lock files are never exports
+IGNORED_PREFIXES = ('.', '~$')
+
+DEFAULT_INTERVAL_SECONDS = 10
+DEFAULT_SETTLE_SECONDS = 60
+DEFAULT_WORKERS = 2
+# Pause between the two scans of --once
+ONCE_RECHECK_SECONDS = 1
+
+# API queries run after an ingest, so their responses for the new history version are cached
+WARM_QUERIES = ['/weekly', '/monthly', '/anomalies']
+WARM_TIMEOUT_SECONDS = 300
+
+# Function to load the record of watched files ({path: entry})
+def load_watch_ledger():
+    if not os.path.exists(WATCH_LEDGER_PATH):
+        return {}
+    try:
+        with open(WATCH_LEDGER_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Nu s-a putut încărca registrul folderului urmărit: %s", e)
+        return {}
+
+# Function to write the record of watched files atomically
+def write_watch_ledger(ledger):
+    os.makedirs(os.path.dirname(WATCH_LEDGER_PATH), exist_ok=True)
+    temporary_path = f"{WATCH_LEDGER_PATH}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(ledger, f, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, WATCH_LEDGER_PATH)
+
+# Function to return the (size, mtime) state of a file, which tells whether it changed
+def get_file_state(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Function to read a file through the OS page cache, so the next memory-mapped reads of it are served from memory
+def read_into_page_cache(path, block_size=1024 * 1024):
+    with open(path, 'rb') as f:
+        while f.read(block_size):
+            pass
+
+# Watcher of one folder. scan() is called every interval: it returns the files that stopped
+# changing (see above) and are not yet recorded in their current state.
+class FolderWatcher:
+    def __init__(self, directory, kind='report', settle_seconds=DEFAULT_SETTLE_SECONDS, workers=DEFAULT_WORKERS, warm_url=None):
+        if kind not in UPLOAD_KINDS:
+            raise ValueError(f"Tip de fișier necunoscut '{kind}' (acceptate: {', '.join(UPLOAD_KINDS)})")
+        self.directory = os.path.abspath(directory)
+        self.kind = kind
+        self.settle_seconds = settle_seconds
+        self.workers = workers
+        self.warm_url = warm_url.rstrip('/') if warm_url else None
+        self.ledger = load_watch_ledger()
+        self.ledger_lock = threading.Lock()
+        # State of every unrecorded file at the previous scan
+        self.candidates = {}
+
+    # Function to list the export files of the folder
+    def list_files(self):
+        paths = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.startswith(IGNORED_PREFIXES) or not name.lower().endswith(WATCH_EXTENSIONS) or not os.path.isfile(path):
+                continue
+            paths.append(path)
+        return paths
+
+    # Function to return the files ready to be ingested (debounced)
+    def scan(self):
+        now = time.time()
+        ready = []
+        seen = set()
+        for path in self.list_files():
+            try:
+                state = get_file_state(path)
+            except OSError:
+                # Removed or renamed between the listing and the stat
+                continue
+            seen.add(path)
+            recorded = self.ledger.get(path)
+            if recorded is not None and [recorded['size'], recorded['mtime_ns']] == state:
+                continue
+
+            if self.candidates.get(path) == state and now - state[1] / 1e9 >= self.settle_seconds:
+                ready.append(path)
+            self.candidates[path] = state
+
+        # Files that disappeared before settling are forgotten
+        for path in list(self.candidates):
+            if path not in seen:
+                del self.candidates[path]
+        return ready
+
+    # Function to ingest one file through the upload pipeline and record the outcome
+    def ingest_file(self, path):
+        state = self.candidates.pop(path)
+        entry = {'size': state[0], 'mtime_ns': state[1], 'ingested_at': datetime.now().isoformat(timespec='seconds')}
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            if [len(content), os.stat(path).st_mtime_ns] != state:
+                # Changed again while it was read; the next scans pick it up once it settles
+                logger.info("%s s-a modificat în timpul citirii; se reia după stabilizare", path)
+                return None
+
+            sheet_name = 0 if path.lower().endswith('.xlsx') else None
+            job = ingest_upload(content, self.kind, sheet_name)
+            if job.error is not None:
+                raise job.error
+            if job.history_error is not None:
+                raise job.history_error
+
+            daily_df, _, _, date_range, _ = job.result
+            entry.update(status='importat', date_range=date_range, daily_rows=len(daily_df),
+                         history_rows=job.history_rows, already_imported=job.ingest.file_entry is not None,
+                         blocks=job.ingest.counts(), issues=len(job.issues), seconds=round(job.seconds, 3))
+            logger.info("%s importat: %s, %d rânduri zilnice în %.2f s", os.path.basename(path), date_range, len(daily_df), job.seconds)
+        except Exception as e:
+            logger.error("%s nu a putut fi importat: %s", path, e)
+            entry.update(status='eroare', error=str(e))
+
+        with self.ledger_lock:
+            self.ledger[path] = entry
+            write_watch_ledger(self.ledger)
+        return entry
+
+    # Function to warm the aggregates of the new history version
+    def warm_caches(self):
+        start = time.perf_counter()
+        if os.path.exists(HISTORY_PATH):
+            read_into_page_cache(HISTORY_PATH)
+        # Built from the history only when missing
+        load_history_cube()
+        load_balance_ledger()
+
+        if self.warm_url:
+            queries = WARM_QUERIES + [f"/balance?as_of={date.today().isoformat()}"]
+            token = os.environ.get(API_TOKEN_ENV)
+            headers = {'Authorization': f"Bearer {token}"} if token else {}
+            for query in queries:
+                try:
+                    request = urllib.request.Request(self.warm_url + query, headers=headers)
+                    with urllib.request.urlopen(request, timeout=WARM_TIMEOUT_SECONDS) as response:
+                        response.read()
+                except OSError as e:
+                    logger.warning("Interogarea %s%s a eșuat: %s", self.warm_url, query, e)
+        logger.info("Agregate pregătite pentru versiunea %s în %.2f s", get_history_version(), time.perf_counter() - start)
+
+    # Function to run one scan: ingest the ready files in parallel, then warm the aggregates
+    def run_once(self):
+        ready = self.scan()
+        if not ready:
+            return []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='watch-ingest') as pool:
+            entries = [entry for entry in pool.map(self.ingest_file, ready) if entry is not None]
+        if any(entry['status'] == 'importat' for entry in entries):
+            self.warm_caches()
+        return entries
+
+    # Function to scan the folder every interval_seconds until interrupted
+    def run(self, interval_seconds=DEFAULT_INTERVAL_SECONDS):
+        logger.info("Se urmărește %s (fișiere stabile de %d s, verificare la %d s)", self.directory, self.settle_seconds, interval_seconds)
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Verificarea folderului %s a eșuat", self.directory)
+            time.sleep(interval_seconds)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Watch a folder and ingest new attendance exports into the history")
+    parser.add_argument('directory', help="folder where the exports are dropped")
+    parser.add_argument('--kind', choices=list(UPLOAD_KINDS), default='report', help="report (attendance report) or events (raw punch events)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL_SECONDS, help="seconds between scans")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, help="seconds a file must stay unchanged before it is ingested")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="files ingested in parallel")
+    parser.add_argument('--warm-url', help="base URL of the API (python api.py) whose query caches are warmed after an ingest")
+    parser.add_argument('--once', action='store_true', help="ingest the files that are already settled and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    # Uploads left in the history queue by a previous run are merged right away
+    get_history_writer()
+    watcher = FolderWatcher(args.directory, args.kind, args.settle, args.workers, args.warm_url)
+    if args.once:
+        watcher.scan()
+        time.sleep(ONCE_RECHECK_SECONDS)
+        watcher.run_once()
+    else:
+        try:
+            watcher.run(args.interval)
+        except KeyboardInterrupt:
+            pass